@@ -22,6 +22,8 @@ os.makedirs(DATA_DIR, exist_ok=True)
 
 # Set environment variable for main.py to use
 os.environ['SHIELD_ANALYSER_DATA_DIR'] = str(DATA_DIR)
+# Keep derived results on disk: Android kills background apps freely
+os.environ.setdefault('SHIELD_ANALYSER_DISK_CACHE', '1')
 
 # Copy static files if not exists
 STATIC_SRC = BASE_DIR / "static"
@@ -38,7 +40,7 @@ def start_server():
     """Start FastAPI server in background thread"""
     import uvicorn
     uvicorn.run(
-        "main:app",
+        "server:app",
         host="127.0.0.1",
         port=8000,
         log_level="warning",
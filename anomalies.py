@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Faraday Shield Analyser - Anomaly scanner
+Flags suspect measurement cells (loose connectors, saturated receivers) in
+the location columns of stored experiments. A cell is flagged when it sits
+far from the rolling median of its own sweep, measured in rolling MADs, and
+- when there are at least three locations - it is also out of line with
+what the other locations do at that frequency, so resonances the whole
+enclosure shares are not reported.
+
+Results are kept per experiment version in anomalies.json; a scan only
+rescans experiments that are new or changed since the last one.
+
+Usage: python anomalies.py scan [--full] [--data-dir DIR]
+"""
+import argparse
+import json
+import os
+import time
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from experiment_store import atomic_write
+from locking import InterProcessLock
+
+ANOMALIES_NAME = 'anomalies.json'
+DEFAULT_WINDOW = 15
+DEFAULT_THRESHOLD = 6.0
+# MAD floor (dB) so flat stretches of a sweep do not turn noise into outliers
+DEFAULT_MIN_MAD = 0.2
+# Flags reported per experiment, highest scores first
+MAX_FLAGS_PER_EXPERIMENT = 500
+MIN_CONSISTENCY_LOCATIONS = 3
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+# Window values rolling_median hands to one nanmedian call (8 bytes each)
+ROLLING_CHUNK_CELLS = 1024 * 1024
+# Scale factor making the MAD a consistent estimator of the standard deviation
+MAD_SCALE = 1.4826
+
+
+def rolling_median(block, window):
+    """Median of each row over a centred window, ignoring NaN; all-NaN windows give NaN
+
+    nanmedian copies every window it is given, so positions are taken a
+    chunk at a time: memory stays near ROLLING_CHUNK_CELLS floats whatever
+    the number of locations, rows or window size.
+    """
+    half = window // 2
+    padded = np.pad(block, ((0, 0), (half, half)), constant_values=np.nan)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, window, axis=1)
+    step = max(1, ROLLING_CHUNK_CELLS // (max(1, len(block)) * window))
+    result = np.empty(windows.shape[:2])
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for start in range(0, windows.shape[1], step):
+            result[:, start:start + step] = np.nanmedian(windows[:, start:start + step], axis=2)
+    return result
+
+
+def robust_scores(block, window, min_mad):
+    """(residual from the rolling median, residual in rolling MADs) for each cell"""
+    residual = block - rolling_median(block, window)
+    mad = MAD_SCALE * rolling_median(np.abs(residual), window)
+    return residual, np.abs(residual) / np.fmax(mad, min_mad)
+
+
+def scan_experiment(experiment, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD,
+                    min_mad=DEFAULT_MIN_MAD):
+    """Flag outlying cells of every location column
+
+    Returns (flags, total) where flags are at most MAX_FLAGS_PER_EXPERIMENT
+    dicts with location, row, frequency, value, expected, score,
+    cross_score (None with too few locations) and kind ('spike' or
+    'dropout'), highest score first, and total counts every flagged cell.
+    """
+    columns = experiment.location_columns
+    freq_col = experiment.frequency_column
+    if not columns or freq_col is None or experiment.n_rows < 3:
+        return [], 0
+
+    freqs = experiment.column(freq_col)
+    order = np.argsort(freqs, kind='stable')
+    block = np.vstack([experiment.column(col)[order] for col in columns])
+    residual, score = robust_scores(block, window, min_mad)
+    flagged = score > threshold
+
+    cross_score = None
+    if len(columns) >= MIN_CONSISTENCY_LOCATIONS:
+        # What every location does at a frequency is the enclosure, not a fault
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            shared = np.nanmedian(residual, axis=0)
+        _, cross_score = robust_scores(residual - shared[np.newaxis, :], window, min_mad)
+        flagged &= cross_score > threshold
+
+    loc_index, pos = np.nonzero(flagged)
+    total = len(pos)
+    top = np.argsort(-score[loc_index, pos], kind='stable')[:MAX_FLAGS_PER_EXPERIMENT]
+    flags = []
+    for i in top.tolist():
+        l, p = int(loc_index[i]), int(pos[i])
+        flags.append({
+            'location': columns[l],
+            'row': int(order[p]),
+            'frequency': float(freqs[order[p]]),
+            'value': float(block[l, p]),
+            'expected': float(block[l, p] - residual[l, p]),
+            'score': round(float(score[l, p]), 2),
+            'cross_score': None if cross_score is None else round(float(cross_score[l, p]), 2),
+            'kind': 'spike' if residual[l, p] > 0 else 'dropout',
+        })
+    return flags, total
+
+
+class AnomalyScanner:
+    """Incremental scans of the whole store, results persisted per experiment version
+
+    Results are kept in <data_dir>/anomalies.json together with the settings
+    they were computed with; changing the settings rescans everything.
+    """
+
+    def __init__(self, store, data_dir, window=DEFAULT_WINDOW, threshold=DEFAULT_THRESHOLD,
+                 min_mad=DEFAULT_MIN_MAD, workers=DEFAULT_WORKERS):
+        if window < 3 or window % 2 == 0:
+            raise ValueError('window must be an odd number of at least 3')
+        self.store = store
+        self.results_file = Path(data_dir) / ANOMALIES_NAME
+        self.settings = {'window': window, 'threshold': threshold, 'min_mad': min_mad}
+        self.workers = workers
+        # Other server workers scan into the same file
+        self._lock = InterProcessLock(Path(data_dir) / f'.{ANOMALIES_NAME}.lock')
+        self._results = {}
+        self._stamp = None
+        with self._lock:
+            self._sync()
+
+    def _file_stamp(self):
+        try:
+            stat = self.results_file.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+    def _sync(self):
+        """Re-read the results if another process has rewritten them (call under _lock)"""
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        self._results = {}
+        if stamp is not None:
+            with open(self.results_file) as f:
+                data = json.load(f)
+            if data.get('settings') == self.settings:
+                self._results = data.get('results', {})
+        self._stamp = stamp
+
+    def _save(self):
+        atomic_write(self.results_file,
+                     json.dumps({'settings': self.settings, 'results': self._results}))
+        self._stamp = self._file_stamp()
+
+    def _scan_one(self, entry):
+        experiment = self.store.load(entry['id'])
+        if experiment is None:
+            return None
+        flags, total = scan_experiment(experiment, **self.settings)
+        return {
+            'name': entry['name'],
+            'version': experiment.meta.get('version'),
+            'flagged': total,
+            'flags': flags,
+            'scanned_at': time.time(),
+        }
+
+    def scan(self, experiment_ids=None, full=False):
+        """Scan new or changed experiments (all of them when full)
+
+        experiment_ids limits the scan (default every experiment). Returns
+        {'scanned', 'reused', 'seconds', 'results': {id: {...}}} where
+        results only lists experiments with flagged cells.
+        """
+        start = time.perf_counter()
+        entries = self.store.list_experiments()
+        live = {e['id'] for e in entries}
+        if experiment_ids is not None:
+            wanted = set(experiment_ids)
+            entries = [e for e in entries if e['id'] in wanted]
+
+        with self._lock:
+            self._sync()
+            for experiment_id in [i for i in self._results if i not in live]:
+                del self._results[experiment_id]
+            todo = [e for e in entries if full
+                    or self._results.get(e['id'], {}).get('version') != e['version']]
+
+        with ThreadPoolExecutor(max_workers=self.workers,
+                                thread_name_prefix='anomalies') as pool:
+            scanned = list(zip(todo, pool.map(self._scan_one, todo)))
+
+        with self._lock:
+            self._sync()
+            for entry, result in scanned:
+                if result is not None:
+                    self._results[entry['id']] = result
+            if scanned:
+                self._save()
+            results = {e['id']: self._results[e['id']] for e in entries
+                       if self._results.get(e['id'], {}).get('flagged')}
+        return {
+            'scanned': len(scanned),
+            'reused': len(entries) - len(scanned),
+            'seconds': time.perf_counter() - start,
+            'results': results,
+        }
+
+    def results(self, experiment_id):
+        """Last scan result for one experiment, or None if it was never scanned"""
+        with self._lock:
+            self._sync()
+            result = self._results.get(experiment_id)
+            return dict(result) if result else None
+
+    def invalidate(self, experiment_id):
+        with self._lock:
+            self._sync()
+            if self._results.pop(experiment_id, None) is not None:
+                self._save()
+
+
+def main():
+    from experiment_store import open_store
+
+    parser = argparse.ArgumentParser(description='Scan stored experiments for outlying cells')
+    parser.add_argument('command', choices=['scan'])
+    parser.add_argument('--full', action='store_true', help='rescan unchanged experiments too')
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW, help='rolling window (rows)')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='flag cells this many MADs from the rolling median')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--data-dir', default=os.environ.get(
+        'SHIELD_ANALYSER_DATA_DIR', os.path.dirname(os.path.abspath(__file__))))
+    args = parser.parse_args()
+
+    scanner = AnomalyScanner(open_store(args.data_dir), args.data_dir, window=args.window,
+                             threshold=args.threshold, workers=args.workers)
+    report = scanner.scan(full=args.full)
+
+    for result in report['results'].values():
+        worst = result['flags'][0]
+        print(f"❌ {result['name']}: {result['flagged']} flagged, worst {worst['location']} "
+              f"at {worst['frequency']:.3f} MHz ({worst['score']:.1f} MADs)")
+    print(f"\n📊 {report['scanned']} scanned, {report['reused']} unchanged, "
+          f"{len(report['results'])} with anomalies in {report['seconds']:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -90,13 +90,13 @@ class ShieldAnalyserApp(App):
         """Run the FastAPI server"""
         try:
             import uvicorn
-            import main as app_main
             
             # Set up data directory
             from pathlib import Path
             app_dir = Path.home() / 'ShieldAnalyser'
             app_dir.mkdir(exist_ok=True)
             os.environ['SHIELD_ANALYSER_DATA_DIR'] = str(app_dir)
+            os.environ.setdefault('SHIELD_ANALYSER_DISK_CACHE', '1')
             
             # Initialize files
             import json
@@ -114,9 +114,10 @@ class ShieldAnalyserApp(App):
                 }
                 creds_file.write_text(json.dumps(default_creds, indent=2))
             
-            # Run server
+            # Run server (server reads SHIELD_ANALYSER_DATA_DIR on import)
+            import server
             uvicorn.run(
-                app_main.app,
+                server.app,
                 host="127.0.0.1",
                 port=8000,
                 log_level="error",
@@ -31,9 +31,14 @@ def get_app_data_dir():
     os.makedirs(app_dir, exist_ok=True)
     return app_dir
 
-def setup_data_directories():
-    """Setup data directories and initialize files"""
+def setup_data_directories(storage=None):
+    """Setup data directories and initialize files
+    
+    storage selects the experiment backend: 'files' (default) or 'sqlite'.
+    Falls back to the SHIELD_ANALYSER_STORAGE environment variable.
+    """
     app_dir = get_app_data_dir()
+    storage = storage or os.environ.get('SHIELD_ANALYSER_STORAGE', 'files')
     
     # Initialize experiments.json if it doesn't exist
     experiments_file = os.path.join(app_dir, 'experiments.json')
@@ -41,6 +46,9 @@ def setup_data_directories():
         with open(experiments_file, 'w') as f:
             json.dump({"experiments": []}, f, indent=2)
     
+    # SQLite backend: open_store() migrates experiments.json when it creates the database
+    os.environ['SHIELD_ANALYSER_STORAGE'] = storage
+    
     # Copy creds.json if it doesn't exist
     creds_file = os.path.join(app_dir, 'creds.json')
     if not os.path.exists(creds_file):
@@ -56,6 +64,7 @@ def setup_data_directories():
     print(f"📁 App data directory: {app_dir}")
     print(f"📊 Experiments file: {experiments_file}")
     print(f"🔐 Credentials file: {creds_file}")
+    print(f"🗄️  Storage backend: {storage}")
     
     return app_dir
 
@@ -87,13 +96,22 @@ def main():
     browser_thread.daemon = True
     browser_thread.start()
     
-    # Import and run the main application
+    # Worker processes share the data directory; 1 keeps everything in this process
+    workers = max(1, int(os.environ.get('SHIELD_ANALYSER_WORKERS', 1)))
+    
+    # Import and run the web service (reads SHIELD_ANALYSER_DATA_DIR on import)
     try:
-        import main as app_main
         import uvicorn
+        if workers > 1:
+            app = "server:app"  # each worker process imports the app itself
+        else:
+            import server
+            app = server.app
         
         print("\n✅ Server started successfully!")
         print("📍 Running at http://localhost:8000")
+        if workers > 1:
+            print(f"⚙️  {workers} worker processes")
         print("🔐 Default credentials: admin / admin123")
         print("\n⚠️  Press CTRL+C to stop the application")
         print("=" * 60)
@@ -101,7 +119,8 @@ def main():
         
         # Run the server
         uvicorn.run(
-            app_main.app,
+            app,
+            workers=workers,
             host="127.0.0.1",  # Only localhost for security
             port=8000,
             log_level="warning"  # Reduce log verbosity
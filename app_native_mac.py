@@ -55,14 +55,14 @@ def setup_data_directories():
 def start_server():
     """Start the FastAPI server in a separate thread"""
     import uvicorn
-    import main as app_main
     
-    # Set environment variable for data directory
+    # Set environment variable for data directory (read when server is imported)
     os.environ['SHIELD_ANALYSER_DATA_DIR'] = get_app_data_dir()
+    import server
     
     # Run the server
     uvicorn.run(
-        app_main.app,
+        server.app,
         host="127.0.0.1",
         port=8000,
         log_level="error",  # Reduce log verbosity
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Faraday Shield Analyser - Server throughput benchmark
+Starts the web service on a scratch data directory, then measures
+concurrent GET /api/experiments throughput and latency twice: with the
+server idle, and while large CSV uploads are parsed back to back.
+With --workers N the server runs as N uvicorn worker processes sharing the
+data directory, to compare read throughput against a single process.
+
+Usage: python benchmark_server.py [--clients N] [--seconds S] [--rows N] [--port P] [--workers N]
+"""
+import argparse
+import base64
+import http.client
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+import numpy as np
+
+AUTH = 'Basic ' + base64.b64encode(b'admin:admin123').decode()
+
+
+def request(port, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+    try:
+        conn.request(method, path, body=body, headers=dict(headers or {}, Authorization=AUTH))
+        response = conn.getresponse()
+        payload = response.read()
+        return response.status, payload
+    finally:
+        conn.close()
+
+
+def multipart(filename, payload):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; '
+            f'filename="{filename}"\r\nContent-Type: text/csv\r\n\r\n').encode()
+    body += payload + f'\r\n--{boundary}--\r\n'.encode()
+    return body, {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+
+def sweep_csv(rows, locations=4, seed=0):
+    rng = np.random.default_rng(seed)
+    freqs = np.linspace(30e6, 1e9, rows)
+    block = np.column_stack([freqs, rng.uniform(-20, -10, rows)]
+                            + [rng.uniform(-90, -40, rows) for _ in range(locations)])
+    header = ','.join(['Frequency (Hz)', 'Reference'] + [f'L{i + 1}' for i in range(locations)])
+    lines = '\n'.join(','.join(f'{v:.6g}' for v in row) for row in block)
+    return f'{header}\n{lines}\n'.encode()
+
+
+def start_server(port, workers=1):
+    """Serve in this process, or as a uvicorn subprocess with several workers
+
+    Returns the subprocess to terminate afterwards, or None.
+    """
+    if workers == 1:
+        import uvicorn
+        import server
+
+        config = uvicorn.Config(server.app, host='127.0.0.1', port=port, log_level='warning')
+        uv = uvicorn.Server(config)
+        threading.Thread(target=uv.run, daemon=True).start()
+        while not uv.started:
+            time.sleep(0.05)
+        return None
+
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'server:app', '--host', '127.0.0.1',
+         '--port', str(port), '--workers', str(workers), '--log-level', 'warning'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    while True:
+        try:
+            if request(port, 'GET', '/api/experiments')[0] == 200:
+                return process
+        except OSError:
+            time.sleep(0.2)
+
+
+def hammer(port, clients, seconds):
+    """GET /api/experiments from clients threads for seconds; returns sorted latencies"""
+    latencies, lock = [], threading.Lock()
+    deadline = time.perf_counter() + seconds
+
+    def client():
+        mine = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            status, _ = request(port, 'GET', '/api/experiments')
+            if status == 200:
+                mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sorted(latencies)
+
+
+def report(label, latencies, seconds):
+    if not latencies:
+        print(f'{label:>16}: no successful requests')
+        return
+    p50 = latencies[len(latencies) // 2] * 1000
+    p95 = latencies[int(len(latencies) * 0.95)] * 1000
+    print(f'{label:>16}: {len(latencies) / seconds:8.1f} req/s   p50 {p50:7.1f} ms   '
+          f'p95 {p95:7.1f} ms   max {latencies[-1] * 1000:7.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark concurrent reads during imports')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--rows', type=int, default=200000, help='rows per uploaded CSV')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn worker processes')
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='shield-bench-')
+    with open(os.path.join(data_dir, 'creds.json'), 'w') as f:
+        json.dump({'admin': 'admin123'}, f)
+    os.environ['SHIELD_ANALYSER_DATA_DIR'] = data_dir
+    process = start_server(args.port, args.workers)
+
+    for i in range(20):
+        body = json.dumps({'name': f'seed {i}', 'columns': ['Frequency (MHz)', 'Reference', 'L1'],
+                           'data': [{'Frequency (MHz)': f, 'Reference': 0, 'L1': -50}
+                                    for f in range(1, 101)]})
+        request(args.port, 'POST', '/api/experiments/create', body,
+                {'Content-Type': 'application/json'})
+
+    print(f'📊 {args.clients} clients, {args.workers} worker(s), {args.seconds:.0f}s per phase, '
+          f'{args.rows} rows per upload\n')
+    report('idle', hammer(args.port, args.clients, args.seconds), args.seconds)
+
+    # Distinct bytes per upload so the import cache cannot short-circuit parsing
+    csv_body = sweep_csv(args.rows)
+    stop, imports = threading.Event(), []
+
+    def importer():
+        n = 0
+        while not stop.is_set():
+            payload = csv_body + f'{1e9 + n + 1:.0f},-15,-50,-50,-50,-50\n'.encode()
+            body, headers = multipart(f'sweep_{n}.csv', payload)
+            start = time.perf_counter()
+            status, _ = request(args.port, 'POST', '/api/upload', body, headers)
+            if status == 200:
+                imports.append(time.perf_counter() - start)
+            n += 1
+
+    thread = threading.Thread(target=importer)
+    thread.start()
+    time.sleep(0.5)
+    report('during import', hammer(args.port, args.clients, args.seconds), args.seconds)
+    stop.set()
+    thread.join()
+    if imports:
+        print(f'\n📥 {len(imports)} uploads of {len(csv_body) / 1e6:.1f} MB, '
+              f'{sum(imports) / len(imports):.2f}s each on average')
+    if process is not None:
+        process.terminate()
+        process.wait()
+    shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Faraday Shield Analyser - Shielding benchmark
+Times the vectorized shielding paths that run today (with_shielding on
+import, DependencyGraph.recompute on save and edit) against the per-row
+loops they replaced (row dicts, one subtraction per cell).
+
+Usage: python benchmark_shielding.py [--rows N] [--locations N] [--repeat N]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from columnar import ColumnarExperiment
+from derived import DependencyGraph
+from shielding import with_shielding
+
+
+def legacy_import(columns, rows):
+    """The old main.py import: build row dicts and subtract cell by cell"""
+    data = []
+    for row in rows:
+        row_dict = {}
+        for i, col in enumerate(columns):
+            row_dict[col] = float(row[i]) if row[i] is not None else 0.0
+        for col in columns:
+            if col not in ['Frequency', 'Reference']:
+                row_dict[f'{col} - Shielding'] = row_dict.get('Reference', 0) - row_dict.get(col, 0)
+        data.append(row_dict)
+    return data
+
+
+def legacy_full_recompute(columns, data):
+    """The old save path: walk every row and shielding column"""
+    ref_col = next(c for c in columns if 'ref' in c.lower())
+    for row in data:
+        for col in columns:
+            if col.endswith(' - Shielding'):
+                location = col[:-len(' - Shielding')]
+                row[col] = (row.get(ref_col) or 0) - (row.get(location) or 0)
+
+
+def recompute(experiment, dirty):
+    """What the server does per save or edit: build the graph, recompute the stale cells"""
+    return DependencyGraph.for_experiment(experiment).recompute(experiment, dirty)
+
+
+def best_of(repeat, fn, *args):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark shielding computation')
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--locations', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    columns = ['Frequency', 'Reference'] + [f'L{i + 1}' for i in range(args.locations)]
+    matrix = rng.uniform(-90, -10, size=(len(columns), args.rows))
+    matrix[0] = np.linspace(1, 1000, args.rows)
+    rows = matrix.T.tolist()
+
+    print(f'{args.rows:,} rows x {args.locations} locations, best of {args.repeat}\n')
+
+    legacy = best_of(args.repeat, legacy_import, columns, rows)
+    vectorized = best_of(args.repeat, with_shielding, columns, matrix)
+    print(f'Import      per-row loop {legacy * 1000:9.1f} ms   '
+          f'vectorized {vectorized * 1000:8.2f} ms   x{legacy / vectorized:,.0f}')
+
+    data = legacy_import(columns, rows)
+    legacy_columns = list(data[0].keys())
+    experiment = ColumnarExperiment(*with_shielding(columns, matrix))
+    legacy = best_of(args.repeat, legacy_full_recompute, legacy_columns, data)
+    vectorized = best_of(args.repeat, recompute, experiment, {c: None for c in columns})
+    print(f'Recompute   per-row loop {legacy * 1000:9.1f} ms   '
+          f'vectorized {vectorized * 1000:8.2f} ms   x{legacy / vectorized:,.0f}')
+
+    edited = set(rng.integers(0, args.rows, size=100).tolist())
+    experiment.values[1, list(edited)] += 1.0
+    single = best_of(1, recompute, experiment, {'Reference': edited})
+    print(f'Edit of {len(edited)} rows (changed cells only)          vectorized {single * 1000:8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
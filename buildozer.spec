@@ -23,7 +23,7 @@ version = 1.0.0
 
 # (list) Application requirements
 # comma separated e.g. requirements = sqlite3,kivy
-requirements = python3,kivy==2.3.0,openpyxl,et-xmlfile
+requirements = python3,kivy==2.3.0,numpy,openpyxl,et-xmlfile
 
 # (str) Custom source folders for requirements
 # Sets custom source for any requirements with recipes
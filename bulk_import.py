@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Faraday Shield Analyser - Bulk import
+Parses every measurement file (workbooks, analyser CSV and Touchstone
+exports) in a directory or zip archive in a process pool and
+commits all resulting experiments to the store in one batched write.
+Files with identical bytes in one batch are parsed and stored only once.
+
+Usage: python bulk_import.py <directory-or-zip> [--user NAME] [--workers N]
+"""
+import argparse
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from import_cache import content_hash
+from importers import SUPPORTED_SUFFIXES, read_measurement_file
+
+
+def collect_files(directory):
+    """Return measurement file paths under directory, skipping Excel lock files"""
+    files = []
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            if name.lower().endswith(SUPPORTED_SUFFIXES) and not name.startswith('~$'):
+                files.append(Path(root) / name)
+    return sorted(files)
+
+
+def parse_file(path):
+    """Worker entry point: returns (path, experiment, seconds, error)"""
+    start = time.perf_counter()
+    try:
+        experiment = read_measurement_file(path)
+        return str(path), experiment, time.perf_counter() - start, None
+    except Exception as e:
+        return str(path), None, time.perf_counter() - start, f'{type(e).__name__}: {e}'
+
+
+def parser_pool(workers=None):
+    """A process pool for bulk_import's parsers
+
+    Workers are spawned, not forked: forking a process with other threads
+    running (the server) can copy a held lock into the child and hang it.
+    Long-lived callers create one and pass it to every bulk_import.
+    """
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def bulk_import(source, store, uploaded_by=None, workers=None, cache=None, pool=None):
+    """Import a directory or .zip of measurement files; returns a per-file report
+
+    With an ImportCache, files whose bytes were imported before are linked
+    to the existing experiment instead of being parsed again. pool is a
+    parser_pool() to reuse; without one a pool of workers is started for
+    this call.
+    """
+    start = time.perf_counter()
+    source = Path(source)
+    extract_dir = None
+    if source.is_file() and zipfile.is_zipfile(source):
+        extract_dir = tempfile.mkdtemp(prefix='shield_bulk_')
+        with zipfile.ZipFile(source) as archive:
+            archive.extractall(extract_dir)
+        root = Path(extract_dir)
+    elif source.is_dir():
+        root = source
+    else:
+        raise ValueError(f'Not a directory or zip archive: {source}')
+
+    try:
+        # Identical files in one batch are parsed (and stored) once
+        digests, originals, duplicates = {}, {}, []
+        for path in collect_files(root):
+            digests[path] = content_hash(path)
+            if digests[path] in originals:
+                duplicates.append(path)
+            else:
+                originals[digests[path]] = path
+        files = list(originals.values())
+        linked = []
+        if cache is not None:
+            for path in files:
+                entry = cache.lookup(digests[path])
+                if entry is None:
+                    continue
+                if entry['name'] != path.stem:
+                    entry = cache.link(entry['id'], name=path.stem, uploaded_by=uploaded_by)
+                    if entry is None:
+                        continue
+                    cache.remember(digests[path], entry)
+                linked.append((path, entry))
+            done = {path for path, _ in linked}
+            files = [path for path in files if path not in done]
+        if workers == 1 or len(files) < 2:
+            results = [parse_file(path) for path in files]
+        elif pool is not None:
+            results = list(pool.map(parse_file, files))
+        else:
+            with parser_pool(workers) as own_pool:
+                results = list(own_pool.map(parse_file, files))
+    finally:
+        if extract_dir:
+            shutil.rmtree(extract_dir, ignore_errors=True)
+
+    parsed = [(path, exp, secs) for path, exp, secs, error in results if error is None]
+    failed = [
+        {'file': os.path.relpath(path, root), 'seconds': round(secs, 3), 'error': error}
+        for path, _, secs, error in results if error is not None
+    ]
+
+    # One batched commit for everything that parsed
+    entries = store.create_many(
+        [exp for _, exp, _ in parsed],
+        uploaded_by=uploaded_by,
+        names=[Path(path).stem for path, _, _ in parsed],
+    ) if parsed else []
+
+    if cache is not None:
+        for (path, _, _), entry in zip(parsed, entries):
+            cache.remember(digests[Path(path)], entry)
+
+    # Copies share their original's experiment, or a link to it under their own name
+    by_digest = {digests[path]: entry for path, entry in linked}
+    by_digest.update((digests[Path(path)], entry) for (path, _, _), entry in zip(parsed, entries))
+    errors = {digests[Path(path)]: error for path, _, _, error in results if error is not None}
+    link = cache.link if cache is not None else store.link_experiment
+    copies = []
+    for path in duplicates:
+        entry = by_digest.get(digests[path])
+        if entry is not None and entry['name'] != path.stem:
+            entry = link(entry['id'], name=path.stem, uploaded_by=uploaded_by)
+        if entry is None:
+            failed.append({'file': os.path.relpath(path, root), 'seconds': 0.0,
+                           'error': errors.get(digests[path], 'Original experiment is gone')})
+            continue
+        copies.append((path, originals[digests[path]], entry))
+
+    imported = [
+        {'file': os.path.relpath(path, root), 'seconds': 0.0, 'cached': True,
+         'experiment_id': entry['id'], 'rows': entry['rows']}
+        for path, entry in linked
+    ] + [
+        {'file': os.path.relpath(path, root), 'seconds': round(secs, 3), 'cached': False,
+         'experiment_id': entry['id'], 'rows': entry['rows']}
+        for (path, _, secs), entry in zip(parsed, entries)
+    ] + [
+        {'file': os.path.relpath(path, root), 'seconds': 0.0, 'cached': True,
+         'duplicate_of': os.path.relpath(original, root),
+         'experiment_id': entry['id'], 'rows': entry['rows']}
+        for path, original, entry in copies
+    ]
+    return {
+        'imported': imported,
+        'failed': failed,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def main():
+    from experiment_store import open_store
+    from import_cache import ImportCache
+
+    parser = argparse.ArgumentParser(description='Bulk import measurement files')
+    parser.add_argument('source', help='directory or .zip of measurement files')
+    parser.add_argument('--user', default=None, help='recorded as uploaded_by')
+    parser.add_argument('--workers', type=int, default=None, help='parser processes')
+    parser.add_argument('--data-dir', default=os.environ.get(
+        'SHIELD_ANALYSER_DATA_DIR', os.path.dirname(os.path.abspath(__file__))))
+    args = parser.parse_args()
+
+    store = open_store(args.data_dir)
+    cache = ImportCache(store, args.data_dir)
+    report = bulk_import(args.source, store, uploaded_by=args.user, workers=args.workers,
+                         cache=cache)
+
+    for item in report['imported']:
+        if item.get('duplicate_of'):
+            print(f"♻️  {item['file']}: same bytes as {item['duplicate_of']}, linked {item['rows']} rows")
+        elif item['cached']:
+            print(f"♻️  {item['file']}: already imported, linked {item['rows']} rows")
+        else:
+            print(f"✅ {item['file']}: {item['rows']} rows in {item['seconds']:.2f}s")
+    for item in report['failed']:
+        print(f"❌ {item['file']}: {item['error']}")
+    print(f"\n📊 {len(report['imported'])} imported, {len(report['failed'])} failed "
+          f"in {report['seconds']:.2f}s")
+    store.compact()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Faraday Shield Analyser - Calibration tables
+Named frequency -> dB correction tables (antenna factor, cable loss, preamp
+gain, ...) attached to experiment columns. A table's correction is added to
+the measured values, so enter gains as negative dB.
+
+Calibrating a column keeps its measured values in <column>-Raw and makes the
+column a derived one (derived.calibration_rule): edits to the raw values or
+the frequencies re-derive the correction, and shielding follows the
+corrected values. Every revision of a table is kept; revising a table queues
+moving every experiment using it onto the new revision on a worker pool.
+
+Usage: python calibration.py recalibrate <table-name> [--data-dir DIR]
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from columnar import is_raw_column, raw_column
+from derived import DependencyGraph, table_correction
+from experiment_store import atomic_write
+from locking import InterProcessLock
+
+CALIBRATIONS_NAME = 'calibrations.json'
+# Finished jobs are kept this long so slow pollers still see the result
+JOB_RETENTION_SECONDS = 3600
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+
+
+class CalibrationTable:
+    """dB corrections at given frequencies (MHz), interpolated in log-frequency
+
+    Below the first and above the last point the end corrections are held.
+    """
+
+    def __init__(self, name, points, description=''):
+        points = sorted((float(f), float(db)) for f, db in points)
+        if not points:
+            raise ValueError('A calibration table needs at least one point')
+        if points[0][0] <= 0:
+            raise ValueError('Calibration frequencies must be positive')
+        self.name = name
+        self.points = points
+        self.description = description
+
+    @property
+    def revision(self):
+        """Changes whenever the correction curve changes"""
+        payload = json.dumps(self.points).encode('utf-8')
+        return hashlib.sha1(payload).hexdigest()[:12]
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'points': [list(p) for p in self.points],
+            'description': self.description,
+            'revision': self.revision,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['points'], data.get('description', ''))
+
+    def correction(self, freqs):
+        """Correction at each frequency; NaN where the frequency is blank or not positive"""
+        return table_correction(self.points, freqs)
+
+
+class CalibrationStore:
+    """Calibration tables, every past revision and the experiments using each
+
+    Persisted in <data_dir>/calibrations.json as {"tables": [{..., "history":
+    {revision: points}, "used_by": [experiment ids]}]}. used_by is only a
+    hint for finding experiments to recalibrate; experiment meta is the
+    record of what was applied.
+    """
+
+    def __init__(self, data_dir):
+        self.tables_file = Path(data_dir) / CALIBRATIONS_NAME
+        self._lock = InterProcessLock(Path(data_dir) / f'.{CALIBRATIONS_NAME}.lock')
+
+    def _read(self):
+        if not self.tables_file.exists():
+            return {}
+        with open(self.tables_file) as f:
+            return {t['name']: t for t in json.load(f).get('tables', [])}
+
+    def _write(self, tables):
+        atomic_write(self.tables_file, json.dumps({'tables': list(tables.values())}, indent=2))
+
+    def list_tables(self):
+        with self._lock:
+            return [CalibrationTable.from_dict(t) for t in self._read().values()]
+
+    def get(self, name, revision=None):
+        """The current table, or the given past revision of it"""
+        with self._lock:
+            data = self._read().get(name)
+        if data is None:
+            return None
+        if revision is None or revision == data['revision']:
+            return CalibrationTable.from_dict(data)
+        points = data.get('history', {}).get(revision)
+        return CalibrationTable(name, points, data.get('description', '')) if points else None
+
+    def used_by(self, name):
+        with self._lock:
+            return list(self._read().get(name, {}).get('used_by', []))
+
+    def save(self, table):
+        """Store table as the current revision; returns (table, revised)"""
+        with self._lock:
+            tables = self._read()
+            old = tables.get(table.name, {})
+            record = table.to_dict()
+            record['history'] = dict(old.get('history', {}), **{table.revision: record['points']})
+            record['used_by'] = old.get('used_by', [])
+            tables[table.name] = record
+            self._write(tables)
+        return table, bool(old) and old['revision'] != table.revision
+
+    def delete(self, name):
+        with self._lock:
+            tables = self._read()
+            if tables.pop(name, None) is None:
+                return False
+            self._write(tables)
+        return True
+
+    def set_usage(self, experiment_id, names):
+        """Record that experiment_id now uses exactly the tables in names"""
+        with self._lock:
+            tables = self._read()
+            for name, record in tables.items():
+                users = set(record.get('used_by', []))
+                if name in names:
+                    users.add(experiment_id)
+                else:
+                    users.discard(experiment_id)
+                record['used_by'] = sorted(users)
+            self._write(tables)
+
+    def copy_usage(self, source_id, experiment_id):
+        """Record that experiment_id (a link to source_id) uses the same tables"""
+        with self._lock:
+            tables = self._read()
+            changed = False
+            for record in tables.values():
+                users = record.get('used_by', [])
+                if source_id in users and experiment_id not in users:
+                    record['used_by'] = sorted(users + [experiment_id])
+                    changed = True
+            if changed:
+                self._write(tables)
+
+
+def applied_tables(experiment):
+    """{column: [{'table', 'revision', 'points'}, ...]} as recorded in the experiment meta"""
+    return experiment.meta.get('calibration') or {}
+
+
+def _raw_values(experiment, col, records, calibrations):
+    """The measured values of col, taking back out the corrections applied to them
+
+    Only needed for columns calibrated before raw values were kept.
+    """
+    values = experiment.column(col).copy()
+    delta = np.zeros(experiment.n_rows)
+    for record in records:
+        table = calibrations.get(record['table'], record['revision'])
+        if table is None:
+            raise ValueError(f"Revision {record['revision']} of {record['table']!r} is missing")
+        delta += table.correction(experiment.column(experiment.frequency_column))
+    known = np.isfinite(delta)
+    values[known] -= delta[known]
+    return values
+
+
+def apply_calibration(experiment, assignments, calibrations):
+    """Correct columns with the current revision of their tables, in place
+
+    assignments maps column -> table names and replaces whatever the column
+    had; a column left out keeps its tables. The first calibration copies a
+    column's measured values to <column>-Raw and every correction is derived
+    from those, so re-applying is idempotent; assigning no tables restores
+    the raw values and drops the copy. Rows without a usable frequency are
+    left uncorrected. Shielding is recomputed for every changed column.
+    Returns the changed columns.
+    """
+    applied = dict(applied_tables(experiment))
+    freq_col = experiment.frequency_column
+    if freq_col is None:
+        raise ValueError('The experiment has no frequency column')
+    graph = DependencyGraph.for_experiment(experiment)
+
+    changed = {}
+    for col, names in assignments.items():
+        if (not experiment.has_column(col) or col == freq_col or is_raw_column(col)
+                or (graph.is_derived(col) and col not in applied)):
+            raise ValueError(f'No measurement column {col!r}')
+        new = []
+        for name in names:
+            table = calibrations.get(name)
+            if table is None:
+                raise ValueError(f'No calibration table {name!r}')
+            new.append((name, table))
+        records = applied.get(col, [])
+        raw = raw_column(col)
+        if ([(r['table'], r['revision']) for r in records] == [(n, t.revision) for n, t in new]
+                and experiment.has_column(raw) == bool(new)):
+            continue
+
+        if not experiment.has_column(raw):
+            experiment.add_column(raw, _raw_values(experiment, col, records, calibrations),
+                                  position=experiment.columns.index(col) + 1)
+        if new:
+            applied[col] = [
+                {'table': n, 'revision': t.revision, 'points': [list(p) for p in t.points]}
+                for n, t in new
+            ]
+        else:
+            experiment.column(col)[:] = experiment.column(raw)
+            experiment.delete_column(raw)
+            applied.pop(col, None)
+        changed[col] = None
+
+    if changed:
+        experiment.meta['calibration'] = applied
+        DependencyGraph.for_experiment(experiment).recompute(experiment, changed)
+    return list(changed)
+
+
+def current_assignments(experiment):
+    """The experiment's table assignments, for re-applying current revisions"""
+    return {col: [r['table'] for r in records]
+            for col, records in applied_tables(experiment).items() if experiment.has_column(col)}
+
+
+def table_names(experiment):
+    return {r['table'] for records in applied_tables(experiment).values() for r in records}
+
+
+class RecalibrationQueue:
+    """Moves every experiment using a table onto its current revision, in parallel
+
+    Each job is a dict with id, table, revision, status (running/done),
+    total experiments, done, updated, skipped, failed, errors
+    ({experiment id: message}), submitted_at and finished_at.
+    """
+
+    def __init__(self, store, calibrations, lock=None, workers=DEFAULT_WORKERS, on_done=None,
+                 board=None):
+        self.store = store
+        self.calibrations = calibrations
+        # Taken around the version check + save, shared with other writers
+        self.write_lock = lock or threading.Lock()
+        # Called with the saved entry after each recalibrated experiment
+        self.on_done = on_done
+        # Optional import_jobs.JobBoard making jobs visible to other processes
+        self.board = board
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='calibration')
+
+    def submit(self, table_name):
+        """Queue every experiment using table_name and return a snapshot of the job"""
+        table = self.calibrations.get(table_name)
+        if table is None:
+            raise KeyError(table_name)
+        experiment_ids = self.calibrations.used_by(table_name)
+        job = {
+            'id': uuid.uuid4().hex,
+            'table': table_name,
+            'revision': table.revision,
+            'status': 'running' if experiment_ids else 'done',
+            'total': len(experiment_ids),
+            'done': 0,
+            'updated': 0,
+            'skipped': 0,
+            'failed': 0,
+            'errors': {},
+            'submitted_at': time.time(),
+            'finished_at': None if experiment_ids else time.time(),
+        }
+        with self._lock:
+            self._prune()
+            self._jobs[job['id']] = job
+            if self.board:
+                self.board.publish(job, force=True)
+        for experiment_id in experiment_ids:
+            self._pool.submit(self._run_one, job['id'], experiment_id, table_name)
+        return dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                return dict(job, errors=dict(job['errors']))
+        return self.board.get(job_id) if self.board else None
+
+    def list_jobs(self):
+        with self._lock:
+            jobs = {job_id: dict(job, errors=dict(job['errors']))
+                    for job_id, job in self._jobs.items()}
+        if self.board:
+            jobs = dict({job['id']: job for job in self.board.list_jobs()}, **jobs)
+        return list(jobs.values())
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def recalibrate(self, experiment_id, table_name):
+        """Re-apply current revisions to one experiment; returns the saved entry or None
+
+        The correction is computed outside the write lock and only saved if
+        nobody changed the experiment meanwhile; otherwise it starts again.
+        """
+        while True:
+            experiment = self.store.load(experiment_id)
+            if experiment is None or table_name not in table_names(experiment):
+                return None
+            version = experiment.meta.get('version')
+            if not apply_calibration(experiment, current_assignments(experiment), self.calibrations):
+                return None
+            with self.write_lock:
+                entry = self.store.get_entry(experiment_id)
+                if entry is None:
+                    return None
+                if entry['version'] == version:
+                    return self.store.save_experiment(experiment_id, experiment)
+
+    def _run_one(self, job_id, experiment_id, table_name):
+        outcome, error = 'skipped', None
+        try:
+            entry = self.recalibrate(experiment_id, table_name)
+            if entry is not None:
+                outcome = 'updated'
+                if self.on_done:
+                    self.on_done(entry)
+        except Exception as e:
+            outcome, error = 'failed', f'{type(e).__name__}: {e}'
+        with self._lock:
+            job = self._jobs[job_id]
+            job[outcome] += 1
+            job['done'] += 1
+            if error:
+                job['errors'][experiment_id] = error
+            if job['done'] == job['total']:
+                job['status'] = 'done'
+                job['finished_at'] = time.time()
+            if self.board:
+                self.board.publish(job, force=job['status'] == 'done')
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [j['id'] for j in self._jobs.values()
+                       if j['finished_at'] and j['finished_at'] < cutoff]:
+            del self._jobs[job_id]
+        if self.board:
+            self.board.prune(cutoff)
+
+
+def main():
+    from experiment_store import open_store
+
+    parser = argparse.ArgumentParser(description='Recalibrate experiments using a table')
+    parser.add_argument('command', choices=['recalibrate'])
+    parser.add_argument('table', help='name of a table in calibrations.json')
+    parser.add_argument('--data-dir', default=os.environ.get(
+        'SHIELD_ANALYSER_DATA_DIR', os.path.dirname(os.path.abspath(__file__))))
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    args = parser.parse_args()
+
+    calibrations = CalibrationStore(args.data_dir)
+    queue = RecalibrationQueue(open_store(args.data_dir), calibrations, workers=args.workers)
+    start = time.perf_counter()
+    try:
+        job = queue.submit(args.table)
+    except KeyError:
+        parser.error(f'No calibration table named {args.table!r}')
+    queue.shutdown(wait=True)
+    job = queue.get(job['id'])
+
+    for experiment_id, error in job['errors'].items():
+        print(f'❌ {experiment_id}: {error}')
+    print(f"\n♻️  {job['updated']} recalibrated, {job['skipped']} already current, "
+          f"{job['failed']} failed in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
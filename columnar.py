@@ -0,0 +1,286 @@
+"""
+Faraday Shield Analyser - Columnar experiment storage
+Keeps each experiment as float64 column arrays plus a small JSON header
+and converts to the row-dict shape used by the web frontend on demand.
+"""
+import json
+import struct
+
+import numpy as np
+
+MAGIC = b'SHLDCOL1'
+HEADER_LEN = struct.Struct('<I')
+SHIELDING_SUFFIXES = ('-Shielding', ' - Shielding')
+# As-measured copy of a calibrated column; the column itself holds the corrected values
+RAW_SUFFIX = '-Raw'
+
+# Keys of a legacy experiment dict that are measurement payload, not metadata
+PAYLOAD_KEYS = ('data', 'columns')
+
+
+def is_frequency_column(col):
+    """Return True for the frequency axis column"""
+    return 'freq' in str(col).lower()
+
+
+def is_reference_column(col):
+    """Return True for the reference (unshielded) measurement column"""
+    col = str(col)
+    return 'ref' in col.lower() and not is_shielding_column(col) and not is_raw_column(col)
+
+
+def is_shielding_column(col):
+    """Return True for a derived shielding effectiveness column"""
+    return str(col).endswith(SHIELDING_SUFFIXES)
+
+
+def is_raw_column(col):
+    """Return True for the uncorrected copy of a calibrated column"""
+    return str(col).endswith(RAW_SUFFIX)
+
+
+def raw_column(col):
+    """Name of the column keeping a calibrated column's measured values"""
+    return f'{col}{RAW_SUFFIX}'
+
+
+def location_for_shielding(col):
+    """Return the location column a shielding column is derived from"""
+    col = str(col)
+    for suffix in SHIELDING_SUFFIXES:
+        if col.endswith(suffix):
+            return col[:-len(suffix)]
+    return None
+
+
+def _to_float(value):
+    """Convert a cell value to float, using NaN for blanks and text"""
+    if value is None or value == '':
+        return np.nan
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class ColumnarExperiment:
+    """An experiment stored as one float64 vector per column"""
+
+    def __init__(self, columns, values, meta=None):
+        self.columns = [str(col) for col in columns]
+        self.values = np.asarray(values, dtype=np.float64).reshape(len(self.columns), -1)
+        self.meta = dict(meta or {})
+        self._index = {col: i for i, col in enumerate(self.columns)}
+
+    # ------------------------------------------------------------------
+    # Construction
+    # ------------------------------------------------------------------
+    @classmethod
+    def from_arrays(cls, arrays, meta=None):
+        """Build from an ordered mapping of column name -> sequence"""
+        columns = list(arrays.keys())
+        n_rows = len(next(iter(arrays.values()))) if arrays else 0
+        values = np.empty((len(columns), n_rows), dtype=np.float64)
+        for i, col in enumerate(columns):
+            values[i] = np.asarray(arrays[col], dtype=np.float64)
+        return cls(columns, values, meta)
+
+    @classmethod
+    def from_rows(cls, rows, columns=None, meta=None):
+        """Build from a list of row dicts"""
+        if columns is None:
+            columns = []
+            for row in rows[:1]:
+                columns.extend(row.keys())
+        columns = list(columns)
+        # Pick up keys that only appear in later rows so nothing is dropped
+        seen = set(columns)
+        for row in rows:
+            for key in row:
+                if key not in seen:
+                    seen.add(key)
+                    columns.append(key)
+
+        values = np.full((len(columns), len(rows)), np.nan, dtype=np.float64)
+        for i, col in enumerate(columns):
+            values[i] = [_to_float(row.get(col)) for row in rows]
+        return cls(columns, values, meta)
+
+    @classmethod
+    def from_experiment(cls, experiment):
+        """Build from a legacy experiments.json entry"""
+        meta = {k: v for k, v in experiment.items() if k not in PAYLOAD_KEYS}
+        return cls.from_rows(experiment.get('data', []), experiment.get('columns'), meta)
+
+    # ------------------------------------------------------------------
+    # Column access
+    # ------------------------------------------------------------------
+    @property
+    def n_rows(self):
+        return self.values.shape[1]
+
+    def has_column(self, col):
+        return col in self._index
+
+    def column(self, col):
+        """Return the vector for a column (a view, not a copy)"""
+        return self.values[self._index[col]]
+
+    @property
+    def frequency_column(self):
+        return next((c for c in self.columns if is_frequency_column(c)), None)
+
+    @property
+    def reference_column(self):
+        return next((c for c in self.columns if is_reference_column(c)), None)
+
+    @property
+    def shielding_columns(self):
+        return [c for c in self.columns if is_shielding_column(c)]
+
+    @property
+    def location_columns(self):
+        skip = {self.frequency_column, self.reference_column}
+        return [c for c in self.columns
+                if c not in skip and not is_shielding_column(c) and not is_raw_column(c)]
+
+    def frequency_range(self):
+        """Return (min, max) frequency or (None, None) when unknown"""
+        freq_col = self.frequency_column
+        if freq_col is None or not self.n_rows:
+            return None, None
+        freqs = self.column(freq_col)
+        if np.isnan(freqs).all():
+            return None, None
+        return float(np.nanmin(freqs)), float(np.nanmax(freqs))
+
+    # ------------------------------------------------------------------
+    # In-place edits (the operations recorded by the edit journal)
+    # ------------------------------------------------------------------
+    def _row_index(self, index, allow_end=False):
+        """index as an int, IndexError unless it names a row (or the end, if allowed)"""
+        index = int(index)
+        if not 0 <= index < self.n_rows + (1 if allow_end else 0):
+            raise IndexError(f'Row {index} out of range (0-{self.n_rows - (0 if allow_end else 1)})')
+        return index
+
+    def set_cells(self, cells):
+        """Apply [row, column, value] triples"""
+        for row, col, value in cells:
+            self.values[self._index[col], self._row_index(row)] = _to_float(value)
+
+    def add_row(self, values=None, index=None):
+        """Insert a row (defaults to the end); missing columns become 0"""
+        values = values or {}
+        row = np.array([_to_float(values.get(col, 0.0)) for col in self.columns])
+        index = self.n_rows if index is None else self._row_index(index, allow_end=True)
+        self.values = np.insert(self.values, index, row, axis=1)
+
+    def delete_row(self, index):
+        self.values = np.delete(self.values, self._row_index(index), axis=1)
+
+    def add_column(self, col, values=None, position=None):
+        """Insert a column (defaults to the end); values defaults to zeros"""
+        col = str(col)
+        if col in self._index:
+            raise ValueError(f'Column already exists: {col}')
+        if values is None:
+            values = np.zeros(self.n_rows)
+        vector = np.asarray([_to_float(v) for v in values], dtype=np.float64)
+        position = len(self.columns) if position is None else int(position)
+        self.values = np.insert(self.values, position, vector, axis=0)
+        self.columns.insert(position, col)
+        self._index = {c: i for i, c in enumerate(self.columns)}
+
+    def delete_column(self, col):
+        index = self._index[col]
+        self.values = np.delete(self.values, index, axis=0)
+        del self.columns[index]
+        self._index = {c: i for i, c in enumerate(self.columns)}
+
+    def rename_columns(self, mapping):
+        """Rename columns in place; mapping is {old: new}"""
+        self.columns = [mapping.get(c, c) for c in self.columns]
+        self._index = {c: i for i, c in enumerate(self.columns)}
+
+    # ------------------------------------------------------------------
+    # Row-dict conversion
+    # ------------------------------------------------------------------
+    def iter_rows(self):
+        """Yield row dicts in column order without materialising them all"""
+        columns = self.columns
+        # tolist() converts to Python floats in C, far faster than per-cell float()
+        for row in self.values.T.tolist():
+            yield {col: (None if v != v else v) for col, v in zip(columns, row)}
+
+    def to_rows(self):
+        return list(self.iter_rows())
+
+    def to_experiment(self):
+        """Return the legacy dict shape served by /api/experiments/{id}"""
+        experiment = dict(self.meta)
+        experiment['columns'] = list(self.columns)
+        experiment['data'] = self.to_rows()
+        return experiment
+
+    # ------------------------------------------------------------------
+    # Binary serialisation
+    # ------------------------------------------------------------------
+    def header(self):
+        return {
+            'meta': self.meta,
+            'columns': self.columns,
+            'n_rows': self.n_rows,
+            'dtype': '<f8',
+        }
+
+    def to_bytes(self):
+        header = json.dumps(self.header()).encode('utf-8')
+        # Pad so the float block starts on an 8-byte boundary
+        pad = (-(len(MAGIC) + HEADER_LEN.size + len(header))) % 8
+        header += b' ' * pad
+        return b''.join([
+            MAGIC,
+            HEADER_LEN.pack(len(header)),
+            header,
+            np.ascontiguousarray(self.values, dtype='<f8').tobytes(),
+        ])
+
+    @classmethod
+    def from_bytes(cls, blob):
+        header, offset = _parse_header(blob)
+        count = len(header['columns']) * header['n_rows']
+        values = np.frombuffer(blob, dtype='<f8', count=count, offset=offset).copy()
+        return cls(header['columns'], values.reshape(len(header['columns']), -1), header['meta'])
+
+    def save(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+    def copy(self):
+        return ColumnarExperiment(self.columns, self.values.copy(), dict(self.meta))
+
+
+def _parse_header(blob):
+    """Return (header dict, byte offset of the float block)"""
+    if blob[:len(MAGIC)] != MAGIC:
+        raise ValueError('Not a columnar experiment file')
+    start = len(MAGIC) + HEADER_LEN.size
+    (length,) = HEADER_LEN.unpack_from(blob, len(MAGIC))
+    header = json.loads(bytes(blob[start:start + length]).decode('utf-8'))
+    return header, start + length
+
+
+def load_header(path):
+    """Read only the JSON header of a columnar file"""
+    with open(path, 'rb') as f:
+        prefix = f.read(len(MAGIC) + HEADER_LEN.size)
+        if prefix[:len(MAGIC)] != MAGIC:
+            raise ValueError(f'Not a columnar experiment file: {path}')
+        (length,) = HEADER_LEN.unpack_from(prefix, len(MAGIC))
+        return json.loads(f.read(length).decode('utf-8'))
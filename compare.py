@@ -0,0 +1,124 @@
+"""
+Faraday Shield Analyser - Cross-experiment comparison
+Aligns the shielding columns of several experiments onto one frequency grid
+(linear interpolation in log-frequency) and returns per-location matrices of
+shielding and delta shielding against a baseline experiment.
+"""
+import numpy as np
+
+from columnar import location_for_shielding
+from result_cache import ResultCache
+
+DEFAULT_GRID_POINTS = 1001
+MAX_GRID_POINTS = 20001
+# Aligned experiments kept when no shared cache is given, keyed on (id, version, grid)
+ALIGNED_CACHE_SIZE = 1024
+
+
+class GridSpec:
+    """A log-spaced frequency grid in MHz"""
+
+    def __init__(self, freq_min, freq_max, points=DEFAULT_GRID_POINTS):
+        if not (freq_min > 0 and freq_max > freq_min):
+            raise ValueError('The grid needs 0 < freq_min < freq_max')
+        if not 2 <= points <= MAX_GRID_POINTS:
+            raise ValueError(f'points must be between 2 and {MAX_GRID_POINTS}')
+        self.freq_min = float(freq_min)
+        self.freq_max = float(freq_max)
+        self.points = int(points)
+
+    @property
+    def key(self):
+        return (self.freq_min, self.freq_max, self.points)
+
+    def frequencies(self):
+        return np.geomspace(self.freq_min, self.freq_max, self.points)
+
+    @classmethod
+    def overlap(cls, entries, points=DEFAULT_GRID_POINTS):
+        """Grid covering the frequency range every experiment measured"""
+        low = max(e['freq_min'] for e in entries if e['freq_min'] is not None)
+        high = min(e['freq_max'] for e in entries if e['freq_max'] is not None)
+        if not low < high:
+            raise ValueError('The experiments have no frequency range in common')
+        return cls(low, high, points)
+
+
+def align(experiment, grid):
+    """Interpolate every shielding column onto grid; returns {location: values}
+
+    All locations are interpolated together: one searchsorted on the log
+    frequencies, then a weighted blend of the neighbouring columns. Grid
+    points outside the measured range are NaN.
+    """
+    columns = experiment.shielding_columns
+    freq_col = experiment.frequency_column
+    if not columns or freq_col is None:
+        return {}
+
+    freqs = experiment.column(freq_col)
+    keep = np.isfinite(freqs) & (freqs > 0)
+    order = np.argsort(freqs[keep], kind='stable')
+    log_f = np.log10(freqs[keep][order])
+    block = np.vstack([experiment.column(col)[keep][order] for col in columns])
+    log_g = np.log10(grid.frequencies())
+
+    if len(log_f) < 2:
+        return {location_for_shielding(col): np.full(grid.points, np.nan) for col in columns}
+
+    upper = np.clip(np.searchsorted(log_f, log_g), 1, len(log_f) - 1)
+    lower = upper - 1
+    span = log_f[upper] - log_f[lower]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        weight = np.where(span > 0, (log_g - log_f[lower]) / span, 0.0)
+    aligned = block[:, lower] * (1 - weight) + block[:, upper] * weight
+    aligned[:, (log_g < log_f[0]) | (log_g > log_f[-1])] = np.nan
+    return {location_for_shielding(col): aligned[i] for i, col in enumerate(columns)}
+
+
+class AlignedCache:
+    """align() results cached in a ResultCache on (experiment id, version, grid)"""
+
+    def __init__(self, store, cache=None):
+        self.store = store
+        self.cache = cache or ResultCache(ALIGNED_CACHE_SIZE)
+
+    def get(self, entry, grid):
+        def compute():
+            experiment = self.store.load(entry['id'])
+            return align(experiment, grid) if experiment is not None else None
+
+        return self.cache.get(entry['id'], entry['version'], 'aligned', grid.key, compute)
+
+    def invalidate(self, experiment_id):
+        self.cache.invalidate(experiment_id)
+
+
+def compare(entries, aligned, grid, baseline=0):
+    """Stack aligned experiments into per-location matrices
+
+    entries are manifest entries and aligned the matching align() results.
+    Returns {'frequencies', 'experiments', 'baseline', 'locations'} where
+    each location has 'shielding' and 'delta' (shielding minus the baseline
+    experiment's) as (experiments, grid points) arrays; an experiment
+    without that location is a row of NaN.
+    """
+    locations = []
+    for result in aligned:
+        locations += [loc for loc in result if loc not in locations]
+    missing = np.full(grid.points, np.nan)
+
+    matrices = {}
+    for location in locations:
+        shielding = np.vstack([result.get(location, missing) for result in aligned])
+        matrices[location] = {
+            'shielding': shielding,
+            'delta': shielding - shielding[baseline],
+        }
+    return {
+        'frequencies': grid.frequencies(),
+        'experiments': [{'id': e['id'], 'name': e['name'], 'version': e['version']}
+                        for e in entries],
+        'baseline': entries[baseline]['id'],
+        'locations': matrices,
+    }
@@ -0,0 +1,130 @@
+"""
+Faraday Shield Analyser - Chart decimation
+Reduces each series of an experiment to a pixel budget before it is sent to
+the browser. 'minmax' keeps the lowest and highest point of every bucket, so
+narrow peaks and notches survive; 'lttb' (largest triangle three buckets)
+keeps the points that best preserve the visual shape.
+"""
+import numpy as np
+
+from columnar import is_raw_column, is_reference_column, is_shielding_column
+from result_cache import ResultCache
+
+METHODS = ('minmax', 'lttb')
+DEFAULT_CHART_POINTS = 1000
+MIN_CHART_POINTS = 10
+MAX_CHART_POINTS = 20000
+# Decimated charts kept when no shared cache is given
+CHART_CACHE_SIZE = 512
+
+
+def minmax(x, y, points):
+    """Indices of the min and max of y in each of points // 2 buckets, in x order"""
+    n = len(y)
+    if n <= points:
+        return np.arange(n)
+    buckets = max(points // 2, 1)
+    edges = np.linspace(0, n, buckets + 1).astype(int)
+    bucket = np.repeat(np.arange(buckets), np.diff(edges))
+    # Sorting by (bucket, y) puts each bucket's min first and its max last
+    order = np.lexsort((y, bucket))
+    starts = edges[:-1]
+    ends = edges[1:] - 1
+    return np.unique(np.concatenate([order[starts], order[ends]]))
+
+
+def lttb(x, y, points):
+    """Largest-triangle-three-buckets selection of points indices"""
+    n = len(y)
+    if n <= points or points < 3:
+        return np.arange(n) if n <= points else np.array([0, n - 1])
+    edges = np.linspace(1, n - 1, points - 1).astype(int)
+    selected = np.empty(points, dtype=int)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket (or the last point) is the third vertex
+        nxt_lo, nxt_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nxt_lo:nxt_hi].mean()
+        avg_y = y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+DECIMATORS = {'minmax': minmax, 'lttb': lttb}
+
+
+def series_kind(col):
+    if is_shielding_column(col):
+        return 'shielding'
+    if is_reference_column(col):
+        return 'reference'
+    if is_raw_column(col):
+        return 'raw'
+    return 'values'
+
+
+def chart_data(experiment, points=DEFAULT_CHART_POINTS, method='minmax'):
+    """Every non-frequency column as a decimated {x, y, kind} series
+
+    Rows are ordered by frequency and blank cells are dropped per series, so
+    each series is decimated over its own measured points.
+    """
+    if method not in DECIMATORS:
+        raise ValueError(f'method must be one of {METHODS}')
+    if not MIN_CHART_POINTS <= points <= MAX_CHART_POINTS:
+        raise ValueError(f'points must be between {MIN_CHART_POINTS} and {MAX_CHART_POINTS}')
+
+    freq_col = experiment.frequency_column
+    if freq_col is None:
+        x_all = np.arange(experiment.n_rows, dtype=np.float64)
+    else:
+        x_all = experiment.column(freq_col)
+    order = np.argsort(x_all, kind='stable')
+    x_all = x_all[order]
+
+    series = {}
+    for col in experiment.columns:
+        if col == freq_col:
+            continue
+        y = experiment.column(col)[order]
+        keep = ~(np.isnan(y) | np.isnan(x_all))
+        x, y = x_all[keep], y[keep]
+        index = DECIMATORS[method](x, y, points)
+        series[col] = {'kind': series_kind(col), 'x': x[index].tolist(), 'y': y[index].tolist()}
+    return {
+        'experiment_id': experiment.meta.get('id'),
+        'version': experiment.meta.get('version'),
+        'rows': experiment.n_rows,
+        'points': points,
+        'method': method,
+        'frequency_column': freq_col,
+        'series': series,
+    }
+
+
+class ChartCache:
+    """chart_data() results cached in a ResultCache on (experiment id, version, points, method)"""
+
+    def __init__(self, store, cache=None):
+        self.store = store
+        self.cache = cache or ResultCache(CHART_CACHE_SIZE)
+
+    def get(self, experiment_id, points=DEFAULT_CHART_POINTS, method='minmax'):
+        """Chart series for the current version, or None if the experiment does not exist"""
+        entry = self.store.get_entry(experiment_id)
+        if entry is None:
+            return None
+
+        def compute():
+            experiment = self.store.load(experiment_id)
+            return chart_data(experiment, points, method) if experiment is not None else None
+
+        return self.cache.get(experiment_id, entry['version'], 'chart', (points, method), compute,
+                              persist=True)
+
+    def invalidate(self, experiment_id):
+        self.cache.invalidate(experiment_id)
@@ -0,0 +1,203 @@
+"""
+Faraday Shield Analyser - Derived column dependencies
+Tracks which input columns each derived column is computed from, so a change
+can recompute just the derived cells that depend on it (recompute), or every
+derived column when stored values cannot be trusted (recompute_all).
+
+Derived columns are row-wise: row r of a derived column depends only on row
+r of its inputs. New kinds of derived metric are added by appending a rule
+to RULES; a rule maps an experiment's columns and meta to DerivedColumn
+definitions.
+
+Calibrated columns are derived too: <column>-Raw keeps the measured values
+and the column is the raw values plus the corrections recorded in
+meta['calibration'], so edits to either input re-derive it.
+"""
+from collections import defaultdict
+
+import numpy as np
+
+from columnar import (
+    is_frequency_column, is_reference_column, is_shielding_column, location_for_shielding,
+    raw_column
+)
+from shielding import canonical_column, shielding_effectiveness
+
+
+class DerivedColumn:
+    """A column computed row-wise from input columns by a vectorized function"""
+
+    def __init__(self, name, inputs, compute):
+        self.name = name
+        self.inputs = tuple(inputs)
+        self.compute = compute
+
+    def __repr__(self):
+        return f'DerivedColumn({self.name!r} <- {", ".join(self.inputs)})'
+
+
+def table_correction(points, freqs):
+    """Correction of a (frequency, dB) table, interpolated in log-frequency
+
+    End corrections are held outside the table; NaN where the frequency is
+    blank or not positive.
+    """
+    table_f = np.log10([p[0] for p in points])
+    table_db = np.array([p[1] for p in points])
+    freqs = np.asarray(freqs, dtype=np.float64)
+    valid = freqs > 0
+    correction = np.full(freqs.shape, np.nan)
+    correction[valid] = np.interp(np.log10(freqs[valid]), table_f, table_db)
+    return correction
+
+
+def calibrated(raw, freqs, tables):
+    """raw plus every table's correction; rows without a usable frequency stay as measured"""
+    total = np.zeros(np.shape(raw))
+    for points in tables:
+        total += table_correction(points, freqs)
+    return np.asarray(raw) + np.nan_to_num(total, nan=0.0)
+
+
+def calibration_rule(columns, meta=None):
+    """<column> = <column>-Raw + corrections of the tables in meta['calibration']"""
+    freq = next((c for c in columns if is_frequency_column(c)), None)
+    if freq is None:
+        return []
+    present = set(columns)
+    derived = []
+    for col, records in ((meta or {}).get('calibration') or {}).items():
+        # Records written before raw values were kept carry no points
+        tables = [r['points'] for r in records if r.get('points')]
+        if col in present and raw_column(col) in present and len(tables) == len(records):
+            derived.append(DerivedColumn(
+                col, (raw_column(col), freq),
+                lambda raw, freqs, tables=tables: calibrated(raw, freqs, tables)
+            ))
+    return derived
+
+
+def shielding_rule(columns, meta=None):
+    """<location>-Shielding = Reference - <location>"""
+    reference = next((c for c in columns if is_reference_column(c)), None)
+    if reference is None:
+        return []
+    present = set(columns)
+    derived = []
+    for col in columns:
+        location = location_for_shielding(col) if is_shielding_column(col) else None
+        if location in present:
+            derived.append(DerivedColumn(
+                col, (reference, location), lambda ref, loc: shielding_effectiveness(ref, loc)[0]
+            ))
+    return derived
+
+
+RULES = [calibration_rule, shielding_rule]
+
+
+class DependencyGraph:
+    """Input column -> derived column edges for one experiment's columns"""
+
+    def __init__(self, derived):
+        self.derived = {d.name: d for d in derived}
+        self._dependents = defaultdict(list)
+        for d in derived:
+            for col in d.inputs:
+                self._dependents[col].append(d.name)
+        self.order = self._topological_order()
+
+    @classmethod
+    def for_columns(cls, columns, meta=None, rules=RULES):
+        return cls([d for rule in rules for d in rule(columns, meta)])
+
+    @classmethod
+    def for_experiment(cls, experiment, rules=RULES):
+        return cls.for_columns(experiment.columns, experiment.meta, rules)
+
+    def _topological_order(self):
+        """Derived columns ordered so each comes after any derived column it reads"""
+        order, state = [], {}
+
+        def visit(name):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError(f'Derived column cycle through {name}')
+            state[name] = 'visiting'
+            for col in self.derived[name].inputs:
+                if col in self.derived:
+                    visit(col)
+            state[name] = 'done'
+            order.append(name)
+
+        for name in self.derived:
+            visit(name)
+        return order
+
+    def is_derived(self, col):
+        return col in self.derived
+
+    def dependents(self, col):
+        """Every derived column that (transitively) reads col"""
+        found, stack = set(), [col]
+        while stack:
+            for name in self._dependents.get(stack.pop(), []):
+                if name not in found:
+                    found.add(name)
+                    stack.append(name)
+        return found
+
+    def affected(self, dirty):
+        """Map {column: rows or None} of edited cells to the stale derived cells
+
+        None means every row. Returns {derived column: rows or None}.
+        """
+        stale = {}
+        for col, rows in dirty.items():
+            targets = self.dependents(col)
+            if col in self.derived:
+                targets.add(col)
+            for name in targets:
+                if rows is None or stale.get(name, set()) is None:
+                    stale[name] = None
+                else:
+                    stale[name] = stale.get(name, set()) | set(rows)
+        return stale
+
+    def recompute(self, experiment, dirty):
+        """Recompute only the derived cells depending on dirty, in place
+
+        Returns the cells whose value changed as [row, column, value] (None
+        for blanks), ready to pass to set_cells.
+        """
+        stale = self.affected(dirty)
+        cells = []
+        for name in self.order:
+            if name not in stale or not experiment.has_column(name):
+                continue
+            rows = stale[name]
+            row_index = (np.arange(experiment.n_rows) if rows is None
+                         else np.asarray(sorted(r for r in rows if 0 <= r < experiment.n_rows),
+                                         dtype=int))
+            if not len(row_index):
+                continue
+            d = self.derived[name]
+            target = experiment.column(name)
+            fresh = d.compute(*[experiment.column(col)[row_index] for col in d.inputs])
+            changed = ~np.isclose(fresh, target[row_index], equal_nan=True)
+            target[row_index] = fresh
+            for r, value in zip(row_index[changed].tolist(), fresh[changed].tolist()):
+                cells.append([r, name, None if value != value else value])
+        return cells
+
+    def recompute_all(self, experiment):
+        """recompute() of every derived column; also repairs values stored stale"""
+        return self.recompute(experiment, {name: None for name in self.derived})
+
+
+def normalize(experiment):
+    """Rename legacy shielding columns in place and recompute every derived column"""
+    experiment.rename_columns({c: canonical_column(c) for c in experiment.columns})
+    DependencyGraph.for_experiment(experiment).recompute_all(experiment)
+    return experiment
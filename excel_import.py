@@ -0,0 +1,89 @@
+"""
+Faraday Shield Analyser - Streaming Excel import
+Reads workbooks in openpyxl read-only/values-only mode, collects columns
+into float64 arrays chunk by chunk and adds every shielding column in one
+vectorized pass (see shielding.py).
+"""
+import numpy as np
+
+from columnar import ColumnarExperiment
+from shielding import with_shielding
+
+# Rows converted to floats per batch; bounds the Python-object overhead
+CHUNK_ROWS = 4096
+
+
+def _chunk_to_array(chunk, width):
+    """Convert a list of row tuples to a (rows, width) float64 array"""
+    if any(len(row) != width for row in chunk):
+        chunk = [tuple(row[:width]) + (None,) * (width - len(row)) for row in chunk]
+    try:
+        # Fast path: numbers and blanks only (None becomes NaN)
+        return np.array(chunk, dtype=np.float64)
+    except (TypeError, ValueError):
+        out = np.full((len(chunk), width), np.nan)
+        for r, row in enumerate(chunk):
+            for c, value in enumerate(row):
+                try:
+                    out[r, c] = float(value) if value is not None else np.nan
+                except (TypeError, ValueError):
+                    pass
+        return out
+
+
+def _header_names(header):
+    """Clean header cells, dropping trailing blanks and naming interior ones"""
+    header = list(header)
+    while header and header[-1] is None:
+        header.pop()
+    return [str(c).strip() if c is not None else f'Column {i + 1}' for i, c in enumerate(header)]
+
+
+def read_workbook(file_path, sheet=None, progress=None, chunk_rows=CHUNK_ROWS):
+    """Stream a workbook sheet into a ColumnarExperiment with shielding columns
+
+    progress, if given, is called with the number of data rows read so far.
+    """
+    import openpyxl
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet] if sheet else wb.active
+        rows = ws.iter_rows(values_only=True)
+        columns = _header_names(next(rows, ()))
+        if not columns:
+            raise ValueError('The sheet has no header row')
+        width = len(columns)
+
+        # Grow by doubling so each chunk is copied into place once
+        matrix = np.empty((width, chunk_rows))
+        n_rows = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) == chunk_rows:
+                matrix, n_rows = _append(matrix, n_rows, _chunk_to_array(chunk, width))
+                chunk = []
+                if progress:
+                    progress(n_rows)
+        if chunk:
+            matrix, n_rows = _append(matrix, n_rows, _chunk_to_array(chunk, width))
+        if progress:
+            progress(n_rows)
+    finally:
+        wb.close()
+
+    matrix = matrix[:, :n_rows]
+    # Drop rows with no values at all (formatted but empty rows at the end of a sheet)
+    matrix = matrix[:, ~np.isnan(matrix).all(axis=0)]
+    columns, matrix = with_shielding(columns, matrix)
+    return ColumnarExperiment(columns, matrix)
+
+
+def _append(matrix, n_rows, block):
+    needed = n_rows + block.shape[0]
+    if needed > matrix.shape[1]:
+        grown = np.empty((matrix.shape[0], max(needed, matrix.shape[1] * 2)))
+        grown[:, :n_rows] = matrix[:, :n_rows]
+        matrix = grown
+    matrix[:, n_rows:needed] = block.T
+    return matrix, needed
@@ -0,0 +1,480 @@
+"""
+Faraday Shield Analyser - Sharded experiment store
+One columnar file per experiment plus a small manifest used for listing.
+Changes since the last checkpoint live in an append-only edit journal that
+is replayed on load and folded into the shards by background compaction.
+
+Several server processes may share one data directory: writes hold a lock
+file, and every read first checks whether the manifest or journal changed
+on disk and, if so, catches up with the other processes' writes.
+"""
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from columnar import ColumnarExperiment
+from derived import normalize
+from journal import EditJournal
+from locking import InterProcessLock
+
+MANIFEST_NAME = 'manifest.json'
+JOURNAL_NAME = 'journal.log'
+SHARD_DIR_NAME = 'experiments'
+SHARD_SUFFIX = '.shd'
+LOCK_NAME = '.store.lock'
+LEGACY_NAME = 'experiments.json'
+
+# Compact once the journal grows past this many bytes
+JOURNAL_COMPACT_BYTES = 1024 * 1024
+# Number of decoded experiments kept in memory
+LOADED_CACHE_SIZE = 8
+
+# Environment variable choosing the storage backend: 'files' (default) or 'sqlite'
+BACKEND_ENV = 'SHIELD_ANALYSER_STORAGE'
+
+# Journal operations that edit measurements, mapped to ColumnarExperiment methods
+DATA_OPS = {
+    'set_cells': lambda e, a: e.set_cells(a['cells']),
+    'add_row': lambda e, a: e.add_row(a.get('values'), a.get('index')),
+    'delete_row': lambda e, a: e.delete_row(a['index']),
+    'add_column': lambda e, a: e.add_column(a['column'], a.get('values'), a.get('position')),
+}
+
+
+def _apply_batch(experiment, args):
+    for edit in args['ops']:
+        DATA_OPS[edit['op']](experiment, edit['args'])
+
+
+# Several edits journalled as one record, so they land (and replay) together
+DATA_OPS['batch'] = _apply_batch
+
+
+def atomic_write(path, payload):
+    """Write bytes or text to path via a temp file and rename"""
+    path = Path(path)
+    tmp = path.with_name(f'.{path.name}.{uuid.uuid4().hex}.tmp')
+    mode = 'wb' if isinstance(payload, bytes) else 'w'
+    with open(tmp, mode) as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def manifest_entry(experiment, shard):
+    """Build the manifest summary for a columnar experiment"""
+    meta = experiment.meta
+    freq_min, freq_max = experiment.frequency_range()
+    return {
+        'id': meta['id'],
+        'name': meta.get('name', ''),
+        'uploaded_by': meta.get('uploaded_by'),
+        'uploaded_at': meta.get('uploaded_at'),
+        'rows': experiment.n_rows,
+        'locations': len(experiment.location_columns),
+        'freq_min': freq_min,
+        'freq_max': freq_max,
+        'shard': shard,
+        'version': meta.get('version', 1),
+    }
+
+
+class ExperimentStore:
+    """Experiment shards under <data_dir>/experiments with a manifest index"""
+
+    def __init__(self, data_dir, compact_bytes=JOURNAL_COMPACT_BYTES):
+        self.data_dir = Path(data_dir)
+        self.shard_dir = self.data_dir / SHARD_DIR_NAME
+        self.manifest_file = self.data_dir / MANIFEST_NAME
+        self.journal = EditJournal(self.data_dir / JOURNAL_NAME)
+        self.compact_bytes = compact_bytes
+        # Held by writers across processes; always taken before _lock
+        self.lock = InterProcessLock(self.data_dir / LOCK_NAME)
+        self._lock = threading.RLock()
+        self._entries = None
+        # Journal records not yet folded into each experiment's shard
+        self._pending = {}
+        self._loaded = OrderedDict()
+        self._compacting = False
+        self._listeners = []
+        # Bumped whenever the manifest entries change, here or in another process
+        self._generation = 0
+
+        os.makedirs(self.shard_dir, exist_ok=True)
+        with self.lock:
+            if not self.manifest_file.exists():
+                self._migrate_legacy()
+            self._load_manifest()
+            self._seen = self._disk_state()
+
+    # ------------------------------------------------------------------
+    # Manifest and journal replay
+    # ------------------------------------------------------------------
+    def _load_manifest(self):
+        if self._entries is None:
+            with open(self.manifest_file) as f:
+                manifest = json.load(f)
+            self._entries = {e['id']: e for e in manifest.get('experiments', [])}
+            checkpoint = manifest.get('journal_seq', 0)
+            for record in self.journal.replay(after_seq=checkpoint):
+                self._replay(record)
+            self.journal.last_seq = max(self.journal.last_seq, checkpoint)
+        return self._entries
+
+    def _replay(self, record):
+        op, experiment_id = record['op'], record['id']
+        if op == 'delete':
+            self._entries.pop(experiment_id, None)
+            self._pending.pop(experiment_id, None)
+            return
+        if op in ('create', 'replace'):
+            # The record points at a freshly written shard holding the full data
+            self._pending[experiment_id] = []
+        else:
+            self._pending.setdefault(experiment_id, []).append(record)
+        self._entries[experiment_id] = record['entry']
+
+    # ------------------------------------------------------------------
+    # Other processes' writes
+    # ------------------------------------------------------------------
+    def add_listener(self, callback):
+        """Call callback(ids) with experiments another process changed or deleted"""
+        self._listeners.append(callback)
+
+    def _disk_state(self):
+        try:
+            stat = os.stat(self.manifest_file)
+            manifest = (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+        except FileNotFoundError:
+            manifest = None
+        return manifest, self.journal.size()
+
+    def _refresh_locked(self):
+        """Catch up with writes made by other processes; returns the changed ids"""
+        state = self._disk_state()
+        if state == self._seen:
+            return set()
+        before = {i: e.get('version') for i, e in self._entries.items()}
+        if state[0] != self._seen[0]:
+            # Compacted elsewhere: the manifest is a new checkpoint
+            self._entries = None
+            self._pending = {}
+            self._load_manifest()
+        else:
+            for record in self.journal.replay(after_seq=self.journal.last_seq):
+                self._replay(record)
+        self._seen = self._disk_state()
+        self._generation += 1
+        after = {i: e.get('version') for i, e in self._entries.items()}
+        changed = {i for i in before.keys() | after.keys() if before.get(i) != after.get(i)}
+        for experiment_id in changed:
+            self._loaded.pop(experiment_id, None)
+        return changed
+
+    def _notify(self, changed):
+        for callback in self._listeners if changed else ():
+            callback(changed)
+
+    def _refresh(self):
+        """Cheap stat check before a read; reloads only if another process wrote"""
+        if self._disk_state() == self._seen:
+            return
+        with self.lock, self._lock:
+            changed = self._refresh_locked()
+        self._notify(changed)
+
+    @contextmanager
+    def _writing(self):
+        """Hold the write locks on an up-to-date view of the store"""
+        with self.lock, self._lock:
+            self._notify(self._refresh_locked())
+            yield
+            self._seen = self._disk_state()
+            self._generation += 1
+
+    def _write_manifest(self, journal_seq):
+        manifest = {
+            'journal_seq': journal_seq,
+            'experiments': list(self._entries.values()),
+        }
+        atomic_write(self.manifest_file, json.dumps(manifest, indent=2))
+
+    def _migrate_legacy(self):
+        """Split a monolithic experiments.json into shards, once"""
+        legacy_file = self.data_dir / LEGACY_NAME
+        experiments = []
+        if legacy_file.exists():
+            with open(legacy_file) as f:
+                legacy = json.load(f)
+            # main.py wrote a bare list, the web server wrapped it in a dict
+            experiments = legacy.get('experiments', []) if isinstance(legacy, dict) else legacy
+
+        with self._lock:
+            self._entries = {}
+            for experiment in experiments:
+                columnar = normalize(ColumnarExperiment.from_experiment(experiment))
+                columnar.meta.setdefault('id', str(uuid.uuid4()))
+                entry = self._write_shard(columnar)
+                self._entries[entry['id']] = entry
+            self._write_manifest(self.journal.last_seq)
+            self._entries = None
+
+    def _shard_path(self, shard):
+        return self.shard_dir / shard
+
+    def _write_shard(self, experiment):
+        """Write a new versioned shard file and return its manifest entry"""
+        meta = experiment.meta
+        shard = f"{meta['id']}.v{meta.get('version', 1)}{SHARD_SUFFIX}"
+        atomic_write(self._shard_path(shard), experiment.to_bytes())
+        return manifest_entry(experiment, shard)
+
+    def _remove_shard(self, shard):
+        # Linked experiments share a shard; keep it while anyone references it
+        if any(e['shard'] == shard for e in self._entries.values()):
+            return
+        try:
+            os.remove(self._shard_path(shard))
+        except FileNotFoundError:
+            pass
+
+    def _remember(self, experiment):
+        self._loaded[experiment.meta['id']] = experiment
+        self._loaded.move_to_end(experiment.meta['id'])
+        while len(self._loaded) > LOADED_CACHE_SIZE:
+            self._loaded.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+    def list_experiments(self):
+        """Return manifest summaries without touching any shard"""
+        self._refresh()
+        with self._lock:
+            return [dict(e) for e in self._entries.values()]
+
+    def generation(self):
+        """Counter that moves whenever any manifest entry changes"""
+        self._refresh()
+        return self._generation
+
+    def snapshot(self):
+        """(generation, entries): every manifest summary as of one generation
+
+        The generation changes whenever any entry does, so callers can keep
+        derived indexes until it moves. The entries are shared; do not modify them.
+        """
+        self._refresh()
+        with self._lock:
+            return self._generation, list(self._entries.values())
+
+    def get_entry(self, experiment_id):
+        self._refresh()
+        with self._lock:
+            entry = self._entries.get(experiment_id)
+            return dict(entry) if entry else None
+
+    def _load_locked(self, experiment_id):
+        experiment = self._loaded.get(experiment_id)
+        if experiment is None:
+            entry = self._entries.get(experiment_id)
+            if entry is None:
+                return None
+            experiment = ColumnarExperiment.load(self._shard_path(entry['shard']))
+            # A linked shard carries its source's identity; the entry is authoritative
+            experiment.meta.update({k: entry.get(k) for k in ('id', 'name', 'uploaded_by', 'uploaded_at')})
+            for record in self._pending.get(experiment_id, []):
+                DATA_OPS[record['op']](experiment, record['args'])
+            experiment.meta['version'] = entry.get('version', 1)
+        self._remember(experiment)
+        return experiment
+
+    def load(self, experiment_id):
+        """Return a copy of the ColumnarExperiment for an id, or None"""
+        for retry in (False, True):
+            self._refresh()
+            with self._lock:
+                try:
+                    experiment = self._load_locked(experiment_id)
+                except FileNotFoundError:
+                    # Another process replaced the shard since our last refresh
+                    if retry:
+                        raise
+                    continue
+                return experiment.copy() if experiment is not None else None
+
+    def get_experiment(self, experiment_id):
+        """Return an experiment in the legacy row-dict shape, or None"""
+        experiment = self.load(experiment_id)
+        return experiment.to_experiment() if experiment is not None else None
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+    def _commit(self, *records):
+        """Append records to the journal and compact if it has grown too large"""
+        self.journal.append_many(list(records))
+        if self.journal.size() > self.compact_bytes and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self.compact, daemon=True).start()
+
+    @staticmethod
+    def _stamp(experiment, name=None, uploaded_by=None):
+        meta = experiment.meta
+        meta['id'] = str(uuid.uuid4())
+        meta['version'] = 1
+        if name is not None:
+            meta['name'] = name
+        if uploaded_by is not None:
+            meta['uploaded_by'] = uploaded_by
+        meta.setdefault('uploaded_at', datetime.now().isoformat())
+
+    def create_experiment(self, experiment, name=None, uploaded_by=None):
+        """Store a new ColumnarExperiment; writes its shard and one journal record"""
+        return self.create_many([experiment], uploaded_by=uploaded_by, names=[name])[0]
+
+    def create_many(self, experiments, uploaded_by=None, names=None):
+        """Store several new experiments with one journal write"""
+        names = names or [None] * len(experiments)
+        for experiment, name in zip(experiments, names):
+            # Whatever the caller computed, stored derived columns come from the graph
+            normalize(experiment)
+            self._stamp(experiment, name, uploaded_by)
+        with self._writing():
+            entries = [self._write_shard(experiment) for experiment in experiments]
+            for entry in entries:
+                self._entries[entry['id']] = entry
+                self._pending[entry['id']] = []
+            self._commit(*[{'op': 'create', 'id': e['id'], 'entry': e} for e in entries])
+        return [dict(entry) for entry in entries]
+
+    def link_experiment(self, source_id, name=None, uploaded_by=None):
+        """Create a new experiment sharing source_id's measurements
+
+        The new entry points at the source's shard, so no measurement data is
+        copied; whichever experiment is edited first writes its own shard.
+        Returns the new entry, or None if source_id does not exist.
+        """
+        with self._writing():
+            source = self._entries.get(source_id)
+            if source is None:
+                return None
+            if self._pending.get(source_id):
+                # The shard lags the journal; write the current state for the link
+                experiment = self._load_locked(source_id).copy()
+                self._stamp(experiment, name, uploaded_by)
+                experiment.meta['uploaded_at'] = datetime.now().isoformat()
+                return self.create_many([experiment])[0]
+            entry = dict(source, id=str(uuid.uuid4()), version=1,
+                         uploaded_at=datetime.now().isoformat())
+            if name is not None:
+                entry['name'] = name
+            if uploaded_by is not None:
+                entry['uploaded_by'] = uploaded_by
+            self._entries[entry['id']] = entry
+            self._pending[entry['id']] = []
+            self._commit({'op': 'create', 'id': entry['id'], 'entry': entry})
+        return dict(entry)
+
+    def save_experiment(self, experiment_id, experiment):
+        """Replace the measurements of an existing experiment"""
+        normalize(experiment)
+        with self._writing():
+            old = self._entries.get(experiment_id)
+            if old is None:
+                raise KeyError(experiment_id)
+            experiment.meta['id'] = experiment_id
+            experiment.meta['version'] = old.get('version', 1) + 1
+            entry = self._write_shard(experiment)
+            self._entries[experiment_id] = entry
+            self._pending[experiment_id] = []
+            self._loaded.pop(experiment_id, None)
+            self._commit({'op': 'replace', 'id': experiment_id, 'entry': entry})
+            self._remove_shard(old['shard'])
+        return dict(entry)
+
+    def apply(self, experiment_id, op, **args):
+        """Apply one journalled edit (set_cells, add_row, delete_row, add_column)"""
+        with self._writing():
+            experiment = self._load_locked(experiment_id)
+            if experiment is None:
+                raise KeyError(experiment_id)
+            try:
+                DATA_OPS[op](experiment, args)
+            except Exception:
+                # Drop the half-edited copy; the shard and journal are untouched
+                self._loaded.pop(experiment_id, None)
+                raise
+            experiment.meta['version'] += 1
+            entry = manifest_entry(experiment, self._entries[experiment_id]['shard'])
+            record = {'op': op, 'id': experiment_id, 'args': args, 'entry': entry}
+            self._entries[experiment_id] = entry
+            self._pending.setdefault(experiment_id, []).append(record)
+            self._commit(record)
+        return dict(entry)
+
+    def apply_many(self, experiment_id, ops):
+        """Apply [{'op': ..., 'args': {...}}, ...] all or nothing, as one new version"""
+        return self.apply(experiment_id, 'batch', ops=ops)
+
+    def delete_experiment(self, experiment_id):
+        with self._writing():
+            entry = self._entries.pop(experiment_id, None)
+            if entry is None:
+                return False
+            self._pending.pop(experiment_id, None)
+            self._loaded.pop(experiment_id, None)
+            self._commit({'op': 'delete', 'id': experiment_id})
+            self._remove_shard(entry['shard'])
+        return True
+
+    # ------------------------------------------------------------------
+    # Compaction
+    # ------------------------------------------------------------------
+    def compact(self):
+        """Fold journalled edits into new shards, checkpoint the manifest, reset the journal"""
+        with self._writing():
+            try:
+                stale = []
+                for experiment_id, records in list(self._pending.items()):
+                    if not records or experiment_id not in self._entries:
+                        continue
+                    experiment = self._load_locked(experiment_id)
+                    old_shard = self._entries[experiment_id]['shard']
+                    self._entries[experiment_id] = self._write_shard(experiment)
+                    stale.append(old_shard)
+                # Shards are written under new names, so a crash before this point
+                # leaves the old manifest and journal fully consistent
+                self._write_manifest(self.journal.last_seq)
+                self.journal.reset()
+                self._pending = {}
+                for shard in stale:
+                    self._remove_shard(shard)
+            finally:
+                self._compacting = False
+
+
+def open_store(data_dir, backend=None):
+    """Open the configured storage backend for a data directory"""
+    backend = backend or os.environ.get(BACKEND_ENV, 'files')
+    if backend == 'sqlite':
+        from sqlite_store import DB_NAME, SQLiteExperimentStore, migrate_json
+        legacy_file = Path(data_dir) / LEGACY_NAME
+        created = not (Path(data_dir) / DB_NAME).exists()
+        store = SQLiteExperimentStore(data_dir)
+        if created and legacy_file.exists():
+            # First open of the database, whichever launcher got here: bring the
+            # JSON experiments over once (unless another worker just did)
+            with store.lock:
+                if not store.list_experiments():
+                    migrate_json(legacy_file, data_dir, store)
+        return store
+    if backend != 'files':
+        raise ValueError(f'Unknown storage backend: {backend}')
+    return ExperimentStore(data_dir)
@@ -0,0 +1,161 @@
+"""
+Faraday Shield Analyser - Import deduplication
+Maps a hash of the uploaded bytes (plus sheet selection) to the experiments
+already imported from them, so re-importing the same file skips parsing and
+links to the stored measurements instead of saving another copy.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from pathlib import Path
+
+from calibration import CalibrationStore
+from experiment_store import atomic_write
+from locking import InterProcessLock
+from importers import read_measurement_file
+
+CACHE_NAME = 'import_cache.json'
+# Least recently used hashes beyond this are forgotten
+IMPORT_CACHE_SIZE = 256
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def content_hash(path, sheet=None):
+    """SHA-256 of a file's bytes and the selected sheet"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    digest.update(b'\0sheet:' + (sheet or '').encode('utf-8'))
+    return digest.hexdigest()
+
+
+class ImportCache:
+    """LRU map of content hash -> {experiment_id: version} persisted beside the store
+
+    An experiment only counts as a hit while it exists at the version it was
+    imported (or linked) at, so edited or deleted experiments are never
+    handed back for a fresh upload.
+    """
+
+    def __init__(self, store, data_dir, max_entries=IMPORT_CACHE_SIZE):
+        self.store = store
+        self.cache_file = Path(data_dir) / CACHE_NAME
+        self.max_entries = max_entries
+        # Shared with the other server workers using this data directory
+        self._lock = InterProcessLock(Path(data_dir) / f'.{CACHE_NAME}.lock')
+        self.calibrations = CalibrationStore(data_dir)
+        self._entries = OrderedDict()
+        self._stamp = None
+        with self._lock:
+            self._sync()
+
+    def _file_stamp(self):
+        try:
+            stat = self.cache_file.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_ino, stat.st_size
+
+    def _sync(self):
+        """Re-read the file if another process has rewritten it (call under _lock)"""
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        self._entries = OrderedDict()
+        if stamp is not None:
+            try:
+                with open(self.cache_file) as f:
+                    self._entries = OrderedDict(json.load(f))
+            except (OSError, ValueError):
+                # A damaged cache only costs re-parsing
+                self._entries = OrderedDict()
+        self._stamp = stamp
+
+    def _save(self):
+        atomic_write(self.cache_file, json.dumps(list(self._entries.items())))
+        self._stamp = self._file_stamp()
+
+    def lookup(self, digest):
+        """Return the entry of a still-unchanged experiment imported from digest, or None"""
+        with self._lock:
+            self._sync()
+            experiments = self._entries.get(digest)
+            if experiments is None:
+                return None
+            hit, stale = None, False
+            for experiment_id, version in list(experiments.items()):
+                entry = self.store.get_entry(experiment_id)
+                if entry is None or entry['version'] != version:
+                    del experiments[experiment_id]
+                    stale = True
+                elif hit is None:
+                    hit = entry
+            if experiments:
+                self._entries.move_to_end(digest)
+            else:
+                del self._entries[digest]
+            if stale:
+                self._save()
+            return hit
+
+    def remember(self, digest, entry):
+        with self._lock:
+            self._sync()
+            self._entries.setdefault(digest, {})[entry['id']] = entry['version']
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._save()
+
+    def link(self, source_id, name=None, uploaded_by=None):
+        """store.link_experiment(), also listing the link as a user of the source's tables
+
+        A link shares the source's calibrated values, so it has to be
+        recalibrated with it when one of the tables is revised.
+        """
+        entry = self.store.link_experiment(source_id, name=name, uploaded_by=uploaded_by)
+        if entry is not None:
+            self.calibrations.copy_usage(source_id, entry['id'])
+        return entry
+
+    def invalidate(self, experiment_id):
+        """Forget an experiment (call when it is deleted)"""
+        with self._lock:
+            self._sync()
+            changed = False
+            for digest, experiments in list(self._entries.items()):
+                if experiments.pop(experiment_id, None) is not None:
+                    changed = True
+                    if not experiments:
+                        del self._entries[digest]
+            if changed:
+                self._save()
+
+    def import_file(self, path, name=None, uploaded_by=None, progress=None, sheet=None,
+                    phase=None):
+        """Import path unless identical bytes were imported before
+
+        Returns (entry, cached). A repeat upload under the same name returns
+        the existing experiment; under a new name it is linked to the existing
+        measurements without parsing. phase, if given, is called with
+        'hashing', 'parsing' and 'saving' as the import advances.
+        """
+        phase = phase or (lambda _: None)
+        phase('hashing')
+        digest = content_hash(path, sheet)
+        hit = self.lookup(digest)
+        if hit is not None:
+            if name is None or name == hit['name']:
+                return hit, True
+            entry = self.link(hit['id'], name=name, uploaded_by=uploaded_by)
+            if entry is not None:
+                self.remember(digest, entry)
+                return entry, True
+
+        phase('parsing')
+        experiment = read_measurement_file(path, progress=progress, sheet=sheet)
+        phase('saving')
+        entry = self.store.create_experiment(experiment, name=name, uploaded_by=uploaded_by)
+        self.remember(digest, entry)
+        return entry, False
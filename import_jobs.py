@@ -0,0 +1,203 @@
+"""
+Faraday Shield Analyser - Background import jobs
+Submitting a file returns a job id immediately; a worker pool parses it and
+saves the experiment while callers poll the job for progress.
+
+With a JobBoard, job snapshots are also written to disk so that a poll
+answered by a different server worker still finds the job.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from experiment_store import atomic_write
+from importers import read_measurement_file
+
+# Finished jobs are kept this long so slow pollers still see the result
+JOB_RETENTION_SECONDS = 3600
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+JOB_DIR_NAME = 'jobs'
+# Progress-only updates are written to the board at most this often per job
+PUBLISH_INTERVAL_SECONDS = 0.5
+
+logger = logging.getLogger(__name__)
+
+
+class JobBoard:
+    """Job snapshots shared between processes as <job_dir>/<job id>.json"""
+
+    def __init__(self, job_dir):
+        self.job_dir = Path(job_dir)
+        self._published = {}
+        os.makedirs(self.job_dir, exist_ok=True)
+
+    @classmethod
+    def for_data_dir(cls, data_dir):
+        return cls(Path(data_dir) / JOB_DIR_NAME)
+
+    def _path(self, job_id):
+        return self.job_dir / f'{job_id}.json'
+
+    def publish(self, job, force=False):
+        """Write a snapshot of job; unforced writes are throttled per job"""
+        now = time.monotonic()
+        if not force and now - self._published.get(job['id'], 0) < PUBLISH_INTERVAL_SECONDS:
+            return
+        self._published[job['id']] = now
+        atomic_write(self._path(job['id']), json.dumps(job))
+        if job.get('finished_at'):
+            self._published.pop(job['id'], None)
+
+    def get(self, job_id):
+        # Job ids are uuid hex; anything else never names a file
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self._path(job_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list_jobs(self):
+        jobs = (self.get(path.stem) for path in self.job_dir.glob('*.json'))
+        return [job for job in jobs if job is not None]
+
+    def prune(self, cutoff):
+        """Remove snapshots of jobs that finished before cutoff"""
+        for job in self.list_jobs():
+            if job.get('finished_at') and job['finished_at'] < cutoff:
+                try:
+                    os.remove(self._path(job['id']))
+                except OSError:
+                    pass
+
+
+class ImportJobQueue:
+    """Runs measurement-file imports on a thread pool and tracks their progress
+
+    Each job is a dict with id, file, status (queued/running/done/failed),
+    phase (queued/hashing/parsing/saving/done/failed), rows processed so far,
+    experiment_id once saved, cached if an earlier import of the same bytes
+    was reused, and error if it failed.
+    """
+
+    def __init__(self, store, cache=None, workers=DEFAULT_WORKERS, on_done=None, board=None):
+        self.store = store
+        self.cache = cache
+        # Called with the saved entry after each successful import
+        self.on_done = on_done
+        # Optional JobBoard making jobs visible to other processes
+        self.board = board
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='import')
+
+    def submit(self, path, name=None, uploaded_by=None, remove_file=False):
+        """Queue path for import and return a snapshot of the new job
+
+        name is the file name shown for the job; the experiment is named after
+        its stem, like every other import path. remove_file deletes path once
+        the job finishes (used for uploads spooled to a temporary file).
+        """
+        job = {
+            'id': uuid.uuid4().hex,
+            'file': name or Path(path).name,
+            'status': 'queued',
+            'phase': 'queued',
+            'rows': 0,
+            'experiment_id': None,
+            'cached': False,
+            'error': None,
+            'submitted_at': time.time(),
+            'finished_at': None,
+        }
+        with self._lock:
+            self._prune()
+            self._jobs[job['id']] = job
+            snapshot = dict(job)
+        self._publish(snapshot, force=True)
+        self._pool.submit(self._run, job['id'], str(path), Path(job['file']).stem,
+                          uploaded_by, remove_file)
+        return dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                return dict(job)
+        return self.board.get(job_id) if self.board else None
+
+    def list_jobs(self):
+        with self._lock:
+            jobs = {job_id: dict(job) for job_id, job in self._jobs.items()}
+        if self.board:
+            jobs = dict({job['id']: job for job in self.board.list_jobs()}, **jobs)
+        return list(jobs.values())
+
+    def active(self):
+        """True while any job is queued or running"""
+        with self._lock:
+            return any(job['status'] in ('queued', 'running') for job in self._jobs.values())
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def _publish(self, job, force=False):
+        if self.board:
+            self.board.publish(job, force)
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields)
+            snapshot = dict(job)
+        # Published outside the lock so the fsync does not stall other jobs;
+        # only this job's worker updates it, so snapshots still land in order.
+        # Row counts tick constantly; only phase changes must be seen at once
+        self._publish(snapshot, force=set(fields) != {'rows'})
+
+    def _run(self, job_id, path, name, uploaded_by, remove_file):
+        self._update(job_id, status='running', phase='parsing')
+        progress = lambda rows: self._update(job_id, rows=rows)
+        try:
+            if self.cache is not None:
+                entry, cached = self.cache.import_file(
+                    path, name=name, uploaded_by=uploaded_by, progress=progress,
+                    phase=lambda phase: self._update(job_id, phase=phase)
+                )
+            else:
+                experiment = read_measurement_file(path, progress=progress)
+                self._update(job_id, phase='saving')
+                entry = self.store.create_experiment(experiment, name=name, uploaded_by=uploaded_by)
+                cached = False
+        except Exception as e:
+            self._update(job_id, status='failed', phase='failed',
+                         error=f'{type(e).__name__}: {e}', finished_at=time.time())
+            return
+        finally:
+            if remove_file:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self._update(job_id, status='done', phase='done', rows=entry['rows'], cached=cached,
+                     experiment_id=entry['id'], finished_at=time.time())
+        # The import succeeded whatever the callback does
+        if self.on_done:
+            try:
+                self.on_done(entry)
+            except Exception:
+                logger.exception('on_done failed for imported experiment %s', entry['id'])
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [j['id'] for j in self._jobs.values()
+                       if j['finished_at'] and j['finished_at'] < cutoff]:
+            del self._jobs[job_id]
+        if self.board:
+            self.board.prune(cutoff)
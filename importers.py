@@ -0,0 +1,54 @@
+"""
+Faraday Shield Analyser - Import dispatch
+Picks the parser for a measurement file from its extension.
+"""
+from pathlib import Path
+
+from columnar import ColumnarExperiment
+from excel_import import read_workbook
+from trace_import import FREQUENCY_COLUMN, read_csv, read_touchstone
+
+WORKBOOK_SUFFIXES = ('.xlsx', '.xlsm')
+TOUCHSTONE_SUFFIXES = ('.s1p', '.s2p')
+SUPPORTED_SUFFIXES = WORKBOOK_SUFFIXES + ('.csv',) + TOUCHSTONE_SUFFIXES
+
+# Only workbooks need openpyxl; CSV and Touchstone files parse without it
+try:
+    import openpyxl
+    EXCEL_SUPPORT = True
+except ImportError:
+    EXCEL_SUPPORT = False
+
+
+def readable_suffixes():
+    """The suffixes this install can import (no workbooks without openpyxl)"""
+    return tuple(s for s in SUPPORTED_SUFFIXES if EXCEL_SUPPORT or s not in WORKBOOK_SUFFIXES)
+
+
+def unsupported_reason(path):
+    """Why path cannot be imported here, or None if it can"""
+    suffix = Path(path).suffix.lower()
+    if suffix in WORKBOOK_SUFFIXES and not EXCEL_SUPPORT:
+        return 'Excel support not available (install openpyxl)'
+    if suffix not in SUPPORTED_SUFFIXES:
+        return f'Unsupported file type: {suffix}'
+    return None
+
+
+def read_measurement_file(path, progress=None, sheet=None):
+    """Parse any supported file into a ColumnarExperiment
+
+    sheet selects a worksheet by name and only applies to workbooks.
+    """
+    suffix = Path(path).suffix.lower()
+    if suffix in WORKBOOK_SUFFIXES:
+        return read_workbook(path, sheet=sheet, progress=progress)
+    if suffix == '.csv':
+        return read_csv(path, progress=progress)
+    if suffix in TOUCHSTONE_SUFFIXES:
+        # A lone Touchstone file has no reference; keep it as one location trace
+        freqs, values = read_touchstone(path, progress=progress)
+        return ColumnarExperiment.from_arrays({FREQUENCY_COLUMN: freqs, Path(path).stem: values})
+    if suffix == '.xls':
+        raise ValueError('Legacy .xls workbooks cannot be read; save the sheet as .xlsx and import that')
+    raise ValueError(f'Unsupported file type: {suffix}')
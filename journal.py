@@ -0,0 +1,70 @@
+"""
+Faraday Shield Analyser - Append-only edit journal
+Store operations are appended as JSON lines and replayed on load, so an
+edit costs one small append instead of a rewrite of the experiment.
+"""
+import json
+import os
+import threading
+
+
+class EditJournal:
+    """JSON-lines operation log with monotonically increasing sequence numbers"""
+
+    def __init__(self, path):
+        self.path = path
+        self.last_seq = 0
+        self._lock = threading.Lock()
+
+    def replay(self, after_seq=0):
+        """Return the records newer than after_seq, in order"""
+        records = []
+        if not os.path.exists(self.path):
+            return records
+        good = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-append; nothing after it is valid
+                    break
+                good += len(line)
+                self.last_seq = max(self.last_seq, record['seq'])
+                if record['seq'] > after_seq:
+                    records.append(record)
+        if good < os.path.getsize(self.path):
+            os.truncate(self.path, good)
+        return records
+
+    def append(self, record):
+        """Assign the next sequence number to record and persist it"""
+        return self.append_many([record])[0]
+
+    def append_many(self, records):
+        """Persist several records with a single write and fsync"""
+        with self._lock:
+            lines = []
+            for record in records:
+                self.last_seq += 1
+                record['seq'] = self.last_seq
+                lines.append(json.dumps(record, separators=(',', ':')) + '\n')
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(''.join(lines))
+                f.flush()
+                os.fsync(f.fileno())
+        return records
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def reset(self):
+        """Drop all records; sequence numbers keep increasing"""
+        with self._lock:
+            with open(self.path, 'w', encoding='utf-8'):
+                pass
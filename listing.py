@@ -0,0 +1,169 @@
+"""
+Faraday Shield Analyser - Experiment listing
+Pages through the store's summaries with keyset cursors, filters and field
+projection. Summaries are kept sorted in memory per sort field and only
+re-sorted when the store's generation moves, so a page costs a bisect and
+a short scan however many experiments there are.
+"""
+import base64
+import json
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+
+SORT_FIELDS = ('uploaded_at', 'name')
+ORDERS = ('asc', 'desc')
+# Returned unless fields asks for more
+SUMMARY_FIELDS = ('id', 'name', 'uploaded_by', 'uploaded_at', 'rows', 'version')
+ENTRY_FIELDS = SUMMARY_FIELDS + ('locations', 'freq_min', 'freq_max')
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+
+def sort_key(entry, sort):
+    """Total order for a sort field; the id breaks ties so cursors are exact"""
+    if sort == 'name':
+        return (entry.get('name') or '').casefold(), entry['id']
+    return entry.get('uploaded_at') or '', entry['id']
+
+
+def parse_fields(fields):
+    """Field names from 'a,b,c' or 'all'; SUMMARY_FIELDS when empty"""
+    if not fields:
+        return SUMMARY_FIELDS
+    if fields == 'all':
+        return ENTRY_FIELDS
+    names = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in names if f not in ENTRY_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown fields {unknown}; choose from {', '.join(ENTRY_FIELDS)}")
+    # Clients always need the id to address an experiment
+    return ('id',) + tuple(f for f in names if f != 'id')
+
+
+def project(entries, fields):
+    """Summaries reduced to fields (from parse_fields)"""
+    return [{f: e.get(f) for f in fields} for e in entries]
+
+
+def encode_cursor(sort, order, key):
+    raw = json.dumps([sort, order, list(key)], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(sort, order, key) from encode_cursor(); ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort, order, key = json.loads(raw)
+        return sort, order, tuple(str(k) for k in key)
+    except (ValueError, TypeError):
+        raise ValueError('invalid cursor')
+
+
+def _check_date(value, name):
+    if value:
+        try:
+            datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f'{name} must be an ISO date or date-time')
+
+
+def entry_filter(uploaded_by=None, name=None, since=None, until=None):
+    """Predicate over summaries, or None when nothing is filtered
+
+    name matches a case-insensitive substring; since and until are ISO
+    dates or date-times compared at their own precision, both inclusive.
+    """
+    _check_date(since, 'since')
+    _check_date(until, 'until')
+    needle = name.casefold() if name else None
+    if not (uploaded_by or needle or since or until):
+        return None
+
+    def match(entry):
+        if uploaded_by and entry.get('uploaded_by') != uploaded_by:
+            return False
+        if needle and needle not in (entry.get('name') or '').casefold():
+            return False
+        uploaded_at = entry.get('uploaded_at') or ''
+        if since and (not uploaded_at or uploaded_at[:len(since)] < since):
+            return False
+        if until and (not uploaded_at or uploaded_at[:len(until)] > until):
+            return False
+        return True
+
+    return match
+
+
+class ExperimentIndex:
+    """Sorted in-memory views of a store's summaries, rebuilt per store generation"""
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._generation = None
+        self._entries = []
+        # sort field -> (sort keys, entries) in ascending order
+        self._sorted = {}
+
+    def _ordered(self, sort):
+        generation = self.store.generation()
+        with self._lock:
+            if generation != self._generation:
+                self._generation, self._entries = self.store.snapshot()
+                self._sorted = {}
+            if sort not in self._sorted:
+                entries = sorted(self._entries, key=lambda e: sort_key(e, sort))
+                self._sorted[sort] = ([sort_key(e, sort) for e in entries], entries)
+            return self._sorted[sort]
+
+    def page(self, limit=DEFAULT_PAGE_SIZE, cursor=None, sort='uploaded_at', order='desc',
+             fields=None, uploaded_by=None, name=None, since=None, until=None):
+        """One page of summaries
+
+        Returns {'experiments': [...], 'next_cursor': str or None, 'total':
+        matches across all pages}. A cursor is only valid with the sort and
+        order it was issued for. Raises ValueError for bad arguments.
+        """
+        fields = parse_fields(fields)
+        entries, next_cursor, total = self.select(limit, cursor, sort, order, uploaded_by=uploaded_by,
+                                                  name=name, since=since, until=until)
+        return {'experiments': project(entries, fields), 'next_cursor': next_cursor, 'total': total}
+
+    def select(self, limit=DEFAULT_PAGE_SIZE, cursor=None, sort='uploaded_at', order='desc',
+               uploaded_by=None, name=None, since=None, until=None):
+        """(entries, next_cursor, total) for page(), with the full shared summaries"""
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_FIELDS)}")
+        if order not in ORDERS:
+            raise ValueError(f"order must be one of {', '.join(ORDERS)}")
+        if not 1 <= limit <= MAX_PAGE_SIZE:
+            raise ValueError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+        match = entry_filter(uploaded_by, name, since, until)
+        after = None
+        if cursor:
+            cursor_sort, cursor_order, after = decode_cursor(cursor)
+            if (cursor_sort, cursor_order) != (sort, order):
+                raise ValueError('cursor was issued for a different sort order')
+
+        keys, entries = self._ordered(sort)
+        if order == 'asc':
+            start = bisect_right(keys, after) if after else 0
+            positions = range(start, len(entries))
+        else:
+            end = bisect_left(keys, after) if after else len(entries)
+            positions = range(end - 1, -1, -1)
+
+        page = []
+        for i in positions:
+            if match is None or match(entries[i]):
+                if len(page) == limit:
+                    break
+                page.append(entries[i])
+        else:
+            i = None
+        # Only hand out a cursor when at least one more match follows
+        next_cursor = encode_cursor(sort, order, sort_key(page[-1], sort)) if i is not None else None
+        total = len(entries) if match is None else sum(1 for e in entries if match(e))
+        return page, next_cursor, total
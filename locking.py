@@ -0,0 +1,75 @@
+"""
+Faraday Shield Analyser - Cross-process locking
+An advisory file lock shared by every server worker using the same data
+directory, so read-modify-write cycles on the store and the JSON side files
+cannot interleave between processes.
+"""
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock_fd(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK gives up after ten one-second retries; keep waiting
+            time.sleep(0.1)
+
+
+def _unlock_fd(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class InterProcessLock:
+    """Exclusive lock across processes, reentrant for the thread holding it
+
+    Threads of one process queue on an RLock; only the outermost acquire
+    takes the file lock. Use as a context manager.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._rlock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._rlock.acquire()
+        if self._depth == 0:
+            try:
+                if self._fd is None:
+                    self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                _lock_fd(self._fd)
+            except BaseException:
+                self._rlock.release()
+                raise
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            _unlock_fd(self._fd)
+        self._rlock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
@@ -15,13 +15,18 @@ from kivy.uix.textinput import TextInput
 from kivy.uix.scrollview import ScrollView
 from kivy.uix.popup import Popup
 from kivy.uix.filechooser import FileChooserIconView
+from kivy.uix.progressbar import ProgressBar
+from kivy.clock import Clock
 from kivy.core.window import Window
 from kivy.utils import platform
-try:
-    import openpyxl
-    EXCEL_SUPPORT = True
-except ImportError:
-    EXCEL_SUPPORT = False
+import numpy as np
+from columnar import ColumnarExperiment
+from shielding import with_shielding
+from experiment_store import open_store
+from import_cache import ImportCache
+from importers import readable_suffixes, unsupported_reason
+from import_jobs import ImportJobQueue
+from listing import ExperimentIndex
 
 # Set up data directory based on platform
 if platform == 'android':
@@ -30,15 +35,20 @@ if platform == 'android':
 else:
     DATA_DIR = Path(__file__).parent
 
-EXPERIMENTS_FILE = DATA_DIR / "experiments.json"
 CREDS_FILE = DATA_DIR / "creds.json"
 
 # Ensure data files exist
 os.makedirs(DATA_DIR, exist_ok=True)
 if not CREDS_FILE.exists():
     CREDS_FILE.write_text(json.dumps({"admin": "admin123"}))
-if not EXPERIMENTS_FILE.exists():
-    EXPERIMENTS_FILE.write_text(json.dumps([]))
+
+# Sharded files (default) or SQLite, chosen by SHIELD_ANALYSER_STORAGE
+store = open_store(DATA_DIR)
+# Imports are parsed off the UI thread; the popup polls the job
+import_jobs = ImportJobQueue(store, cache=ImportCache(store, DATA_DIR))
+# Summaries in pages, newest first; the list grows with "Load more"
+experiment_index = ExperimentIndex(store)
+PAGE_SIZE = 50
 
 
 class LoginScreen(Screen):
@@ -104,6 +114,7 @@ class LoginScreen(Screen):
                 creds = json.load(f)
             
             if username in creds and creds[username] == password:
+                App.get_running_app().current_user = username
                 self.manager.current = 'main'
                 self.username_input.text = ''
                 self.password_input.text = ''
@@ -171,32 +182,46 @@ class ExperimentListScreen(Screen):
     def on_enter(self):
         self.load_experiments()
     
-    def load_experiments(self):
-        self.exp_list.clear_widgets()
+    def load_experiments(self, cursor=None):
+        if cursor is None:
+            self.exp_list.clear_widgets()
         
         try:
-            with open(EXPERIMENTS_FILE) as f:
-                experiments = json.load(f)
+            page = experiment_index.page(limit=PAGE_SIZE, cursor=cursor)
+            experiments = page['experiments']
             
-            if not experiments:
+            if not experiments and cursor is None:
                 self.exp_list.add_widget(
                     Label(text='No experiments yet. Create one!', size_hint_y=None, height=40)
                 )
             else:
                 for exp in experiments:
                     exp_btn = Button(
-                        text=f"{exp['name']} ({len(exp.get('data', []))} rows)",
+                        text=f"{exp['name']} ({exp['rows']} rows)",
                         size_hint_y=None,
                         height=60,
                         background_color=(0.3, 0.3, 0.3, 1)
                     )
                     exp_btn.bind(on_press=lambda x, e=exp: self.open_experiment(e))
                     self.exp_list.add_widget(exp_btn)
+            if page['next_cursor']:
+                more_btn = Button(
+                    text=f"Load more ({page['total'] - len(self.exp_list.children)} left)",
+                    size_hint_y=None,
+                    height=50,
+                    background_color=(0.2, 0.6, 1, 1)
+                )
+                more_btn.bind(on_press=lambda x, c=page['next_cursor']: self.load_more(x, c))
+                self.exp_list.add_widget(more_btn)
         except Exception as e:
             self.exp_list.add_widget(
                 Label(text=f'Error loading: {str(e)}', size_hint_y=None, height=40)
             )
     
+    def load_more(self, button, cursor):
+        self.exp_list.remove_widget(button)
+        self.load_experiments(cursor)
+    
     def do_logout(self, instance):
         self.manager.current = 'login'
     
@@ -227,30 +252,17 @@ class ExperimentListScreen(Screen):
                 if not name:
                     return
                 
-                # Create experiment structure
-                columns = ['Frequency', 'Reference']
-                for i in range(num_locations):
-                    columns.append(f'L{i+1}')
-                    columns.append(f'L{i+1} - Shielding')
-                
-                data = []
-                for i in range(num_frequencies):
-                    row = {col: 0.0 for col in columns}
-                    row['Frequency'] = 0.0
-                    data.append(row)
-                
-                # Save experiment
-                with open(EXPERIMENTS_FILE) as f:
-                    experiments = json.load(f)
-                
-                experiments.append({
-                    'name': name,
-                    'columns': columns,
-                    'data': data
-                })
+                # Create experiment structure; shielding columns are derived
+                columns = ['Frequency', 'Reference'] + [f'L{i+1}' for i in range(num_locations)]
+                experiment = ColumnarExperiment(
+                    *with_shielding(columns, np.zeros((len(columns), num_frequencies)))
+                )
                 
-                with open(EXPERIMENTS_FILE, 'w') as f:
-                    json.dump(experiments, f)
+                # Save experiment (writes only its shard and the manifest)
+                store.create_experiment(
+                    experiment, name=name,
+                    uploaded_by=App.get_running_app().current_user
+                )
                 
                 popup.dismiss()
                 self.load_experiments()
@@ -273,77 +285,34 @@ class ExperimentListScreen(Screen):
     def import_excel(self, instance):
         # File chooser popup
         content = BoxLayout(orientation='vertical')
-        filechooser = FileChooserIconView(filters=['*.xlsx', '*.xls'])
+        # No '*.xls': openpyxl only reads .xlsx/.xlsm workbooks
+        filechooser = FileChooserIconView(
+            filters=[f'*{suffix}' for suffix in readable_suffixes()]
+        )
         
         btn_box = BoxLayout(size_hint=(1, 0.1), spacing=10)
         select_btn = Button(text='Import')
         cancel_btn = Button(text='Cancel')
         
         popup = Popup(
-            title='Select Excel File',
+            title='Select Measurement File',
             content=content,
             size_hint=(0.9, 0.9)
         )
         
         def do_import(instance):
             if filechooser.selection:
-                try:
-                    if not EXCEL_SUPPORT:
-                        print("Excel support not available")
-                        popup.dismiss()
-                        return
-                    
-                    file_path = filechooser.selection[0]
-                    
-                    # Read Excel using openpyxl directly
-                    wb = openpyxl.load_workbook(file_path)
-                    ws = wb.active
-                    
-                    # Get columns from first row
-                    columns = [cell.value for cell in ws[1]]
-                    
-                    # Add shielding columns
-                    new_columns = []
-                    for col in columns:
-                        new_columns.append(col)
-                        if col not in ['Frequency', 'Reference'] and not str(col).endswith('- Shielding'):
-                            new_columns.append(f'{col} - Shielding')
-                    
-                    # Read data rows
-                    data = []
-                    for row in ws.iter_rows(min_row=2, values_only=True):
-                        row_dict = {}
-                        for i, col in enumerate(columns):
-                            if i < len(row):
-                                row_dict[col] = float(row[i]) if row[i] is not None else 0.0
-                        
-                        # Calculate shielding
-                        for col in columns:
-                            if col not in ['Frequency', 'Reference']:
-                                shielding_col = f'{col} - Shielding'
-                                row_dict[shielding_col] = row_dict.get('Reference', 0) - row_dict.get(col, 0)
-                        
-                        data.append(row_dict)
-                    
-                    # Save
-                    exp_name = Path(file_path).stem
-                    
-                    with open(EXPERIMENTS_FILE) as f:
-                        experiments = json.load(f)
-                    
-                    experiments.append({
-                        'name': exp_name,
-                        'columns': new_columns,
-                        'data': data
-                    })
-                    
-                    with open(EXPERIMENTS_FILE, 'w') as f:
-                        json.dump(experiments, f)
-                    
+                file_path = filechooser.selection[0]
+                reason = unsupported_reason(file_path)
+                if reason:
+                    print(reason)
                     popup.dismiss()
-                    self.load_experiments()
-                except Exception as e:
-                    print(f"Import error: {e}")
+                    return
+                job = import_jobs.submit(
+                    file_path, uploaded_by=App.get_running_app().current_user
+                )
+                popup.dismiss()
+                self.show_import_progress(job)
         
         select_btn.bind(on_press=do_import)
         cancel_btn.bind(on_press=popup.dismiss)
@@ -356,12 +325,46 @@ class ExperimentListScreen(Screen):
         
         popup.open()
     
+    def show_import_progress(self, job):
+        phases = ['queued', 'hashing', 'parsing', 'saving', 'done']
+        content = BoxLayout(orientation='vertical', padding=10, spacing=10)
+        status = Label(text=f"{job['file']}: queued")
+        bar = ProgressBar(max=len(phases) - 1, value=0)
+        close_btn = Button(text='Run in background', size_hint=(1, 0.3))
+        content.add_widget(status)
+        content.add_widget(bar)
+        content.add_widget(close_btn)
+        
+        popup = Popup(title='Importing', content=content, size_hint=(0.8, 0.4))
+        close_btn.bind(on_press=popup.dismiss)
+        
+        def poll(dt):
+            current = import_jobs.get(job['id'])
+            if current['status'] == 'failed':
+                status.text = f"Import failed: {current['error']}"
+                close_btn.text = 'Close'
+                return False
+            bar.value = phases.index(current['phase'])
+            if current['status'] == 'done':
+                verb = 'Already imported' if current['cached'] else 'Imported'
+                status.text = (f"{verb} {current['rows']:,} rows\n"
+                               f"Experiment {current['experiment_id']}")
+                close_btn.text = 'Close'
+                self.load_experiments()
+                return False
+            status.text = f"{current['file']}: {current['phase']} ({current['rows']:,} rows)"
+        
+        Clock.schedule_interval(poll, 0.25)
+        popup.open()
+    
     def open_experiment(self, experiment):
         # TODO: Navigate to experiment view
         print(f"Opening experiment: {experiment['name']}")
 
 
 class FaradayShieldApp(App):
+    current_user = None
+    
     def build(self):
         Window.clearcolor = (0.95, 0.95, 0.95, 1)
         
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Faraday Shield Analyser - Compliance masks
+Named shielding-effectiveness limit masks (piecewise-linear minimum dB
+against frequency) and a batch evaluator that checks every location of every
+selected experiment against a mask, one vectorized pass per experiment.
+
+Usage: python masks.py evaluate <mask-name> [--data-dir DIR]
+"""
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+from columnar import location_for_shielding
+from experiment_store import atomic_write
+from locking import InterProcessLock
+from result_cache import ResultCache
+
+MASKS_NAME = 'masks.json'
+# Evaluations kept when no shared cache is given
+MASK_RESULTS_CACHE_SIZE = 4096
+SCALES = ('log', 'linear')
+
+
+class Mask:
+    """Minimum shielding (dB) at given frequencies (MHz), interpolated between points
+
+    scale 'log' interpolates linearly in log-frequency, as masks are drawn on
+    a log axis; 'linear' interpolates in frequency. There is no limit
+    outside the first and last point.
+    """
+
+    def __init__(self, name, points, scale='log', description=''):
+        points = sorted((float(f), float(db)) for f, db in points)
+        if len(points) < 2:
+            raise ValueError('A mask needs at least two points')
+        if scale not in SCALES:
+            raise ValueError(f'scale must be one of {SCALES}')
+        if scale == 'log' and points[0][0] <= 0:
+            raise ValueError('Log-scale mask frequencies must be positive')
+        self.name = name
+        self.points = points
+        self.scale = scale
+        self.description = description
+
+    @property
+    def revision(self):
+        """Changes whenever the limit curve changes"""
+        payload = json.dumps([self.points, self.scale]).encode('utf-8')
+        return hashlib.sha1(payload).hexdigest()[:12]
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'points': [list(p) for p in self.points],
+            'scale': self.scale,
+            'description': self.description,
+            'revision': self.revision,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['points'], data.get('scale', 'log'),
+                   data.get('description', ''))
+
+    def limit(self, freqs):
+        """Limit at each frequency; NaN outside the mask"""
+        mask_f = np.array([p[0] for p in self.points])
+        mask_db = np.array([p[1] for p in self.points])
+        freqs = np.asarray(freqs, dtype=np.float64)
+        inside = (freqs >= mask_f[0]) & (freqs <= mask_f[-1])
+        limit = np.full(freqs.shape, np.nan)
+        if self.scale == 'log':
+            limit[inside] = np.interp(np.log10(freqs[inside]), np.log10(mask_f), mask_db)
+        else:
+            limit[inside] = np.interp(freqs[inside], mask_f, mask_db)
+        return limit
+
+
+def evaluate(experiment, mask):
+    """Check every shielding column against mask
+
+    Returns {location: {'pass', 'worst_margin', 'worst_frequency', 'checked',
+    'failing'}}; margin is shielding minus limit, so negative fails. A
+    location with no point inside the mask is reported with pass None.
+    """
+    columns = experiment.shielding_columns
+    freq_col = experiment.frequency_column
+    if not columns or freq_col is None:
+        return {}
+
+    freqs = experiment.column(freq_col)
+    block = np.vstack([experiment.column(col) for col in columns])
+    margins = block - mask.limit(freqs)[np.newaxis, :]
+    valid = ~np.isnan(margins)
+    checked = valid.sum(axis=1)
+    failing = (margins < 0).sum(axis=1)
+    worst = np.argmin(np.where(valid, margins, np.inf), axis=1)
+
+    results = {}
+    for i, col in enumerate(columns):
+        has_points = bool(checked[i])
+        results[location_for_shielding(col)] = {
+            'pass': bool(failing[i] == 0) if has_points else None,
+            'worst_margin': float(margins[i, worst[i]]) if has_points else None,
+            'worst_frequency': float(freqs[worst[i]]) if has_points else None,
+            'checked': int(checked[i]),
+            'failing': int(failing[i]),
+        }
+    return results
+
+
+def experiment_verdict(locations):
+    """False if any location fails, True if any passes, None if nothing was checked"""
+    verdicts = [r['pass'] for r in locations.values() if r['pass'] is not None]
+    if not verdicts:
+        return None
+    return all(verdicts)
+
+
+class MaskStore:
+    """Named masks persisted in <data_dir>/masks.json"""
+
+    def __init__(self, data_dir):
+        self.masks_file = Path(data_dir) / MASKS_NAME
+        self._lock = InterProcessLock(Path(data_dir) / f'.{MASKS_NAME}.lock')
+
+    def _read(self):
+        if not self.masks_file.exists():
+            return {}
+        with open(self.masks_file) as f:
+            return {m['name']: m for m in json.load(f).get('masks', [])}
+
+    def list_masks(self):
+        with self._lock:
+            return [Mask.from_dict(m) for m in self._read().values()]
+
+    def get(self, name):
+        with self._lock:
+            data = self._read().get(name)
+        return Mask.from_dict(data) if data else None
+
+    def save(self, mask):
+        with self._lock:
+            masks = self._read()
+            masks[mask.name] = mask.to_dict()
+            atomic_write(self.masks_file, json.dumps({'masks': list(masks.values())}, indent=2))
+        return mask
+
+    def delete(self, name):
+        with self._lock:
+            masks = self._read()
+            if masks.pop(name, None) is None:
+                return False
+            atomic_write(self.masks_file, json.dumps({'masks': list(masks.values())}, indent=2))
+        return True
+
+
+class MaskEvaluator:
+    """Batch evaluation with results cached on (experiment version, mask revision)"""
+
+    def __init__(self, store, cache=None):
+        self.store = store
+        self.cache = cache or ResultCache(MASK_RESULTS_CACHE_SIZE)
+
+    def _evaluate_one(self, entry, mask):
+        def compute():
+            experiment = self.store.load(entry['id'])
+            return evaluate(experiment, mask) if experiment is not None else None
+
+        return self.cache.get(entry['id'], entry['version'], 'mask', mask.revision, compute,
+                              persist=True)
+
+    def run(self, mask, experiment_ids=None):
+        """Evaluate mask over the given experiments (default all)
+
+        Returns {'mask', 'results': {id: {...}}, 'summary': {...}}.
+        """
+        if experiment_ids is None:
+            entries = self.store.list_experiments()
+        else:
+            entries = [e for e in map(self.store.get_entry, experiment_ids) if e is not None]
+
+        results, summary = {}, {'experiments': 0, 'passed': 0, 'failed': 0, 'not_covered': 0}
+        for entry in entries:
+            locations = self._evaluate_one(entry, mask)
+            if locations is None:
+                continue
+            verdict = experiment_verdict(locations)
+            results[entry['id']] = {
+                'name': entry['name'],
+                'version': entry['version'],
+                'pass': verdict,
+                'locations': locations,
+            }
+            summary['experiments'] += 1
+            if verdict is None:
+                summary['not_covered'] += 1
+            else:
+                summary['passed' if verdict else 'failed'] += 1
+        return {'mask': mask.to_dict(), 'results': results, 'summary': summary}
+
+    def invalidate(self, experiment_id):
+        self.cache.invalidate(experiment_id)
+
+
+def main():
+    import time
+    from experiment_store import open_store
+
+    parser = argparse.ArgumentParser(description='Evaluate a compliance mask')
+    parser.add_argument('command', choices=['evaluate'])
+    parser.add_argument('mask', help='name of a mask in masks.json')
+    parser.add_argument('--data-dir', default=os.environ.get(
+        'SHIELD_ANALYSER_DATA_DIR', os.path.dirname(os.path.abspath(__file__))))
+    args = parser.parse_args()
+
+    mask = MaskStore(args.data_dir).get(args.mask)
+    if mask is None:
+        parser.error(f'No mask named {args.mask!r}')
+    start = time.perf_counter()
+    report = MaskEvaluator(open_store(args.data_dir)).run(mask)
+
+    for result in report['results'].values():
+        if result['pass'] is None:
+            print(f"➖ {result['name']}: outside the mask range")
+            continue
+        worst = min((r for r in result['locations'].values() if r['pass'] is not None),
+                    key=lambda r: r['worst_margin'])
+        icon = '✅' if result['pass'] else '❌'
+        print(f"{icon} {result['name']}: worst margin {worst['worst_margin']:.1f} dB "
+              f"at {worst['worst_frequency']:.3f} MHz")
+    summary = report['summary']
+    print(f"\n📊 {summary['passed']} passed, {summary['failed']} failed, "
+          f"{summary['not_covered']} not covered in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
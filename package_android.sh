@@ -14,7 +14,11 @@ echo "📦 Copying files..."
 
 # Copy necessary files
 cp app_launcher.py "$PACKAGE_DIR/"
-cp main.py "$PACKAGE_DIR/"
+# The web service and the modules it imports
+cp server.py anomalies.py bulk_import.py calibration.py columnar.py compare.py decimate.py \
+   derived.py excel_import.py experiment_store.py import_cache.py import_jobs.py importers.py \
+   journal.py listing.py locking.py masks.py result_cache.py shielding.py sqlite_store.py stats.py \
+   streaming.py sweep_groups.py trace_import.py "$PACKAGE_DIR/"
 cp creds.json "$PACKAGE_DIR/"
 cp sample_experiment.xlsx "$PACKAGE_DIR/"
 cp requirements.txt "$PACKAGE_DIR/"
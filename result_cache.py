@@ -0,0 +1,185 @@
+"""
+Faraday Shield Analyser - Derived-results cache
+One process-wide LRU for everything computed from an experiment (summaries,
+aligned grids, chart series, mask results, exports), keyed on
+(experiment id, version, kind, params). A new version is a new key, so a
+stale result is never served; invalidate() frees an experiment's entries as
+soon as it is written or deleted. Memory is bounded by an estimate of the
+bytes held (exports, grids and series vary by orders of magnitude), with an
+entry count as a second limit.
+
+With a disk directory, results computed with persist=True are also pickled
+to <disk_dir>/<experiment id>/ so a restarted app (e.g. on Android, where
+the process is killed freely) starts warm.
+"""
+import hashlib
+import os
+import pickle
+import shutil
+import sys
+import threading
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from experiment_store import atomic_write
+
+# Results kept in memory across all experiments and kinds
+RESULT_CACHE_SIZE = 4096
+# Estimated bytes those results may hold
+RESULT_CACHE_BYTES = 64 * 1024 * 1024
+CACHE_DIR_NAME = 'cache'
+
+
+def result_size(value):
+    """Approximate bytes held by a cached result
+
+    Exact for bytes and numpy arrays, which carry the bulk of exports and
+    grids; containers add up their items; anything else counts its own size.
+    """
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(result_size(k) + result_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(result_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache:
+    """LRU of derived results bounded by estimated bytes and entry count
+
+    A result larger than max_bytes on its own is returned but not kept.
+    Hit/miss counters are kept per kind.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, disk_dir=None, max_bytes=RESULT_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # key -> result_size() of its value, and their total
+        self._sizes = {}
+        self.bytes = 0
+        self._counters = defaultdict(lambda: {'hits': 0, 'disk_hits': 0, 'misses': 0})
+        self.evictions = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @classmethod
+    def for_data_dir(cls, data_dir, disk=False, max_entries=RESULT_CACHE_SIZE,
+                     max_bytes=RESULT_CACHE_BYTES):
+        """A cache whose disk tier, when enabled, lives under <data_dir>/cache"""
+        return cls(max_entries, Path(data_dir) / CACHE_DIR_NAME if disk else None, max_bytes)
+
+    def _disk_path(self, key):
+        experiment_id, version, kind, params = key
+        digest = hashlib.sha1(repr(params).encode('utf-8')).hexdigest()[:16]
+        return self.disk_dir / str(experiment_id) / f'{kind}.v{version}.{digest}.pkl'
+
+    def _read_disk(self, key):
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError):
+            # A torn or foreign file is just a miss
+            return None
+
+    def _write_disk(self, key, value):
+        path = self._disk_path(key)
+        os.makedirs(path.parent, exist_ok=True)
+        # Older versions of this experiment will never be asked for again
+        for old in path.parent.glob('*.pkl'):
+            if old.name.split('.')[1] != f'v{key[1]}':
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+        atomic_write(path, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def _forget(self, key):
+        del self._entries[key]
+        self.bytes -= self._sizes.pop(key)
+
+    def _remember(self, key, value):
+        size = result_size(value)
+        if key in self._entries:
+            self._forget(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = value
+        self._sizes[key] = size
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._forget(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get(self, experiment_id, version, kind, params, compute, persist=False):
+        """Cached result for the key, calling compute() on a miss
+
+        params must be hashable with a stable repr. compute may return None
+        (e.g. the experiment vanished), which is passed on but not cached.
+        """
+        key = (experiment_id, version, kind, params)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._counters[kind]['hits'] += 1
+                return self._entries[key]
+
+        if persist and self.disk_dir:
+            value = self._read_disk(key)
+            if value is not None:
+                with self._lock:
+                    self._counters[kind]['disk_hits'] += 1
+                    self._remember(key, value)
+                return value
+
+        value = compute()
+        with self._lock:
+            self._counters[kind]['misses'] += 1
+            if value is not None:
+                self._remember(key, value)
+        if value is not None and persist and self.disk_dir:
+            self._write_disk(key, value)
+        return value
+
+    def invalidate(self, experiment_id):
+        """Drop every cached result of an experiment, in memory and on disk"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == experiment_id]:
+                self._forget(key)
+        if self.disk_dir:
+            shutil.rmtree(self.disk_dir / str(experiment_id), ignore_errors=True)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+            self.bytes = 0
+        if self.disk_dir:
+            shutil.rmtree(self.disk_dir, ignore_errors=True)
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def stats(self):
+        """Entry count, estimated bytes, evictions and hit/miss counters per kind"""
+        with self._lock:
+            kinds = {kind: dict(c) for kind, c in self._counters.items()}
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self.bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'disk': str(self.disk_dir) if self.disk_dir else None,
+                'hits': sum(c['hits'] + c['disk_hits'] for c in kinds.values()),
+                'misses': sum(c['misses'] for c in kinds.values()),
+                'kinds': kinds,
+            }
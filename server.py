@@ -0,0 +1,849 @@
+"""
+Faraday Shield Analyser - Web API
+FastAPI application serving static/index.html and the /api routes it calls.
+
+Routes are coroutines whose blocking work runs on one of two bounded thread
+pools: parsing uploads and batch analysis on a small parse pool, store reads
+and edits on the I/O pool. A slow import therefore only queues behind other
+imports; listing and editing keep their own threads. The launchers run this
+module's app (uvicorn server:app).
+
+Several workers may serve one data directory (SHIELD_ANALYSER_WORKERS):
+writes are serialised by the store's lock file, stale writes are rejected
+with 409, and each worker drops its cached results for experiments that
+another worker changed.
+"""
+import asyncio
+import base64
+import functools
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+import numpy as np
+from fastapi import Depends, FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from fastapi.staticfiles import StaticFiles
+
+from columnar import (
+    ColumnarExperiment, is_frequency_column, is_raw_column, is_reference_column, is_shielding_column
+)
+from anomalies import AnomalyScanner
+from bulk_import import bulk_import, parser_pool
+from calibration import CalibrationStore, CalibrationTable, RecalibrationQueue, apply_calibration, table_names
+from compare import DEFAULT_GRID_POINTS, AlignedCache, GridSpec, compare
+from decimate import DEFAULT_CHART_POINTS, ChartCache
+from experiment_store import DATA_OPS, open_store
+from import_cache import ImportCache
+from import_jobs import ImportJobQueue, JobBoard
+from importers import read_measurement_file
+from listing import DEFAULT_PAGE_SIZE, ExperimentIndex, parse_fields, project
+from masks import Mask, MaskEvaluator, MaskStore
+from result_cache import RESULT_CACHE_BYTES, ResultCache
+from derived import DependencyGraph, normalize
+from shielding import canonical_column, shielding_column
+from stats import StatsCache, parse_bands
+from streaming import FORMATS, accepts_gzip, gzip_chunks, iter_experiment_json
+from sweep_groups import FREQUENCY_COLUMN, SweepGroupStore
+from trace_import import read_trace_set
+
+BASE_DIR = Path(__file__).parent
+DATA_DIR = Path(os.environ.get('SHIELD_ANALYSER_DATA_DIR', BASE_DIR))
+CREDS_FILE = DATA_DIR / 'creds.json'
+STATIC_DIR = DATA_DIR / 'static' if (DATA_DIR / 'static').exists() else BASE_DIR / 'static'
+
+# Uploads and batch analysis queue on the parse pool; everything else uses the I/O pool
+PARSE_WORKERS = int(os.environ.get('SHIELD_ANALYSER_PARSE_WORKERS', 2))
+IO_WORKERS = int(os.environ.get('SHIELD_ANALYSER_IO_WORKERS', 8))
+parse_pool = ThreadPoolExecutor(max_workers=PARSE_WORKERS, thread_name_prefix='parse')
+io_pool = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix='io')
+# Bulk imports parse in worker processes that live as long as the server
+bulk_pool = parser_pool(PARSE_WORKERS)
+
+store = open_store(DATA_DIR)
+# Serialises version check + apply so two PATCHes cannot both pass the same base,
+# across every worker process sharing the data directory
+patch_lock = store.lock
+# Parses uploads off the request thread; clients poll /api/import-jobs/{id}
+# Re-uploads of identical bytes link to the existing measurements
+import_cache = ImportCache(store, DATA_DIR)
+# Everything derived from an experiment, keyed on (id, version, kind, params);
+# SHIELD_ANALYSER_DISK_CACHE=1 keeps results under <data dir>/cache across restarts;
+# SHIELD_ANALYSER_RESULT_CACHE_MB bounds what stays in memory
+result_cache = ResultCache.for_data_dir(
+    DATA_DIR, disk=os.environ.get('SHIELD_ANALYSER_DISK_CACHE') == '1',
+    max_bytes=int(os.environ.get('SHIELD_ANALYSER_RESULT_CACHE_MB', RESULT_CACHE_BYTES // 2 ** 20)) * 2 ** 20
+)
+# Sorted summaries for paging the experiment list, rebuilt when the store changes
+experiment_index = ExperimentIndex(store)
+# Experiments interpolated onto comparison grids
+aligned_cache = AlignedCache(store, result_cache)
+# Compliance masks and their results, keyed on mask revision
+mask_store = MaskStore(DATA_DIR)
+mask_evaluator = MaskEvaluator(store, result_cache)
+# Repeated sweeps folded into running statistics
+sweep_groups = SweepGroupStore(DATA_DIR)
+# Summary statistics, warmed after every write
+stats_cache = StatsCache(store, result_cache)
+# Chart series decimated to a point budget, keyed on budget and method
+chart_cache = ChartCache(store, result_cache)
+# Job snapshots on disk, so a poll answered by another worker still finds the job
+job_board = JobBoard.for_data_dir(DATA_DIR)
+import_jobs = ImportJobQueue(store, cache=import_cache, board=job_board,
+                             on_done=lambda entry: experiment_changed(entry['id']))
+# Outlier flags per experiment version; scans only revisit new or changed experiments
+anomaly_scanner = AnomalyScanner(store, DATA_DIR)
+# Calibration tables; revising one recalibrates its experiments on a worker pool
+calibrations = CalibrationStore(DATA_DIR)
+recalibration = RecalibrationQueue(store, calibrations, lock=patch_lock, board=job_board,
+                                   on_done=lambda entry: experiment_changed(entry['id']))
+# Writes made by other workers only reach this process through the store
+store.add_listener(lambda ids: [result_cache.invalidate(i) for i in ids])
+
+app = FastAPI(title='Faraday Shield Analyser')
+app.mount('/static', StaticFiles(directory=STATIC_DIR), name='static')
+
+
+# ----------------------------------------------------------------------
+# Offloading
+# ----------------------------------------------------------------------
+def offload(pool):
+    """Turn a blocking route into a coroutine that runs it on pool
+
+    The wrapper keeps the route's signature, so FastAPI still resolves its
+    parameters and dependencies.
+    """
+    def decorator(route):
+        @functools.wraps(route)
+        async def run(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(pool, functools.partial(route, *args, **kwargs))
+        return run
+    return decorator
+
+
+async def stream_on(pool, chunks):
+    """Iterate a blocking chunk iterator on pool, one chunk at a time"""
+    loop = asyncio.get_running_loop()
+    done = object()
+    while True:
+        chunk = await loop.run_in_executor(pool, next, chunks, done)
+        if chunk is done:
+            return
+        yield chunk
+
+
+# ----------------------------------------------------------------------
+# Authentication
+# ----------------------------------------------------------------------
+def load_users():
+    """Return {username: password} from creds.json (either layout)"""
+    with open(CREDS_FILE) as f:
+        creds = json.load(f)
+    if 'users' in creds:
+        return {u['username']: u['password'] for u in creds['users']}
+    return creds
+
+
+def check_credentials(username, password):
+    return load_users().get(username) == password
+
+
+def current_user(request: Request):
+    """Resolve the Basic auth header (or ?auth= for downloads) to a username"""
+    token = request.headers.get('Authorization', '')
+    if token.startswith('Basic '):
+        token = token[len('Basic '):]
+    else:
+        token = request.query_params.get('auth', '')
+    try:
+        username, password = base64.b64decode(token).decode('utf-8').split(':', 1)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=401, detail='Not authenticated')
+    if not check_credentials(username, password):
+        raise HTTPException(status_code=401, detail='Invalid credentials')
+    return username
+
+
+# ----------------------------------------------------------------------
+# Helpers
+# ----------------------------------------------------------------------
+def json_array(values):
+    """numpy array -> nested lists with NaN as None"""
+    values = np.asarray(values, dtype=object)
+    values[values != values] = None
+    return values.tolist()
+
+
+def experiment_changed(experiment_id):
+    """Drop results derived from earlier versions and precompute the summary"""
+    result_cache.invalidate(experiment_id)
+    stats_cache.warm(experiment_id)
+
+
+# Clients may keep responses but must revalidate them (If-None-Match) before use
+REVALIDATE = 'private, no-cache'
+
+
+def experiment_etag(experiment_id, version, kind='json'):
+    """Strong ETag of one representation of an experiment version
+
+    Ids are never reused and every content change bumps the version, so
+    the tag is known from the manifest without loading the experiment.
+    """
+    return f'"{experiment_id}.v{version}.{kind}"'
+
+
+def etag_matches(request, etag):
+    """True if the request's If-None-Match already names etag"""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    # If-None-Match uses the weak comparison: W/ prefixes are ignored
+    return any(tag.strip().removeprefix('W/') == etag for tag in header.split(','))
+
+
+def not_modified(etag):
+    return Response(status_code=304, headers={'ETag': etag, 'Cache-Control': REVALIDATE})
+
+
+def experiment_or_404(experiment_id):
+    experiment = store.load(experiment_id)
+    if experiment is None:
+        raise HTTPException(status_code=404, detail='Experiment not found')
+    return experiment
+
+
+# ----------------------------------------------------------------------
+# Routes
+# ----------------------------------------------------------------------
+@app.get('/')
+async def index():
+    return FileResponse(STATIC_DIR / 'index.html')
+
+
+@app.post('/api/login')
+@offload(io_pool)
+def login(credentials: dict):
+    if not check_credentials(credentials.get('username'), credentials.get('password')):
+        raise HTTPException(status_code=401, detail='Invalid credentials')
+    return {'username': credentials['username']}
+
+
+@app.get('/api/experiments')
+@offload(io_pool)
+def list_experiments(request: Request, response: Response, limit: int = DEFAULT_PAGE_SIZE,
+                     cursor: str = None, sort: str = 'uploaded_at', order: str = 'desc',
+                     fields: str = None, uploaded_by: str = None, name: str = None,
+                     since: str = None, until: str = None, user: str = Depends(current_user)):
+    """One page of experiment summaries
+
+    fields is a comma separated list (or "all"); name filters on a
+    substring, since/until on the upload date. Pass next_cursor back as
+    cursor, with the same sort and order, for the following page.
+    """
+    try:
+        fields = parse_fields(fields)
+        entries, next_cursor, total = experiment_index.select(
+            limit, cursor, sort, order, uploaded_by=uploaded_by, name=name, since=since, until=until
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Summaries only change with their version, so the page is named by the
+    # query and the (id, version) pairs on it
+    digest = hashlib.sha1(json.dumps([
+        str(request.query_params), total, next_cursor, [(e['id'], e['version']) for e in entries],
+    ]).encode('utf-8')).hexdigest()[:20]
+    etag = f'"list.{digest}"'
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = REVALIDATE
+    return {'experiments': project(entries, fields), 'next_cursor': next_cursor, 'total': total}
+
+
+def bands_or_400(bands):
+    try:
+        return parse_bands(bands)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f'Invalid bands: {e}')
+
+
+@app.get('/api/stats')
+@offload(io_pool)
+def experiments_stats(ids: str = None, bands: str = None, user: str = Depends(current_user)):
+    """Summary statistics for many experiments (all when ids is omitted)
+
+    ids is a comma separated list; bands is "low-high,..." in MHz.
+    """
+    bands = bands_or_400(bands)
+    if ids:
+        experiment_ids = [i for i in ids.split(',') if i]
+    else:
+        experiment_ids = [e['id'] for e in store.list_experiments()]
+    stats = {}
+    for experiment_id in experiment_ids:
+        summary = stats_cache.get(experiment_id, bands)
+        if summary is not None:
+            stats[experiment_id] = summary
+    return {'stats': stats}
+
+
+@app.post('/api/compare')
+@offload(parse_pool)
+def compare_experiments(payload: dict, user: str = Depends(current_user)):
+    """Align experiments onto one log-frequency grid and diff them against a baseline
+
+    Body: {"ids": [...], "baseline": id (default first),
+    "grid": {"freq_min": MHz, "freq_max": MHz, "points": n}} where grid
+    defaults to the range all experiments cover.
+    """
+    ids = payload.get('ids') or []
+    if len(ids) < 2:
+        raise HTTPException(status_code=400, detail='Compare needs at least two experiments')
+    entries = [store.get_entry(experiment_id) for experiment_id in ids]
+    if None in entries:
+        missing = [i for i, e in zip(ids, entries) if e is None]
+        raise HTTPException(status_code=404, detail=f'Experiments not found: {missing}')
+    baseline = payload.get('baseline') or ids[0]
+    if baseline not in ids:
+        raise HTTPException(status_code=400, detail='The baseline must be one of ids')
+
+    spec = payload.get('grid') or {}
+    try:
+        if 'freq_min' in spec and 'freq_max' in spec:
+            grid = GridSpec(spec['freq_min'], spec['freq_max'], spec.get('points', DEFAULT_GRID_POINTS))
+        else:
+            grid = GridSpec.overlap(entries, spec.get('points', DEFAULT_GRID_POINTS))
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    aligned = [aligned_cache.get(entry, grid) or {} for entry in entries]
+    result = compare(entries, aligned, grid, baseline=ids.index(baseline))
+    return {
+        'frequencies': result['frequencies'].tolist(),
+        'experiments': result['experiments'],
+        'baseline': result['baseline'],
+        'locations': {
+            location: {key: json_array(matrix) for key, matrix in matrices.items()}
+            for location, matrices in result['locations'].items()
+        },
+    }
+
+
+@app.get('/api/masks')
+@offload(io_pool)
+def list_masks(user: str = Depends(current_user)):
+    return {'masks': [mask.to_dict() for mask in mask_store.list_masks()]}
+
+
+@app.put('/api/masks/{name}')
+@offload(io_pool)
+def save_mask(name: str, payload: dict, user: str = Depends(current_user)):
+    """Body: {"points": [[MHz, dB], ...], "scale": "log"|"linear", "description": "..."}"""
+    try:
+        mask = Mask(name, payload.get('points') or [], payload.get('scale', 'log'),
+                    payload.get('description', ''))
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f'Invalid mask: {e}')
+    return {'mask': mask_store.save(mask).to_dict()}
+
+
+@app.delete('/api/masks/{name}')
+@offload(io_pool)
+def delete_mask(name: str, user: str = Depends(current_user)):
+    if not mask_store.delete(name):
+        raise HTTPException(status_code=404, detail='Mask not found')
+    return {'message': 'Mask deleted'}
+
+
+@app.post('/api/masks/{name}/evaluate')
+@offload(parse_pool)
+def evaluate_mask(name: str, payload: dict = None, user: str = Depends(current_user)):
+    """Check experiments against a mask; body {"ids": [...]} or empty for all"""
+    mask = mask_store.get(name)
+    if mask is None:
+        raise HTTPException(status_code=404, detail='Mask not found')
+    return mask_evaluator.run(mask, (payload or {}).get('ids'))
+
+
+@app.get('/api/calibrations')
+@offload(io_pool)
+def list_calibrations(user: str = Depends(current_user)):
+    return {'tables': [table.to_dict() for table in calibrations.list_tables()]}
+
+
+@app.put('/api/calibrations/{name}')
+@offload(io_pool)
+def save_calibration(name: str, payload: dict, user: str = Depends(current_user)):
+    """Body: {"points": [[MHz, dB], ...], "description": "..."}
+
+    Revising a table in use queues a recalibration job for its experiments.
+    """
+    try:
+        table = CalibrationTable(name, payload.get('points') or [], payload.get('description', ''))
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f'Invalid calibration table: {e}')
+    table, revised = calibrations.save(table)
+    job = recalibration.submit(name) if revised else None
+    return {'table': table.to_dict(), 'job': job}
+
+
+@app.delete('/api/calibrations/{name}')
+@offload(io_pool)
+def delete_calibration(name: str, user: str = Depends(current_user)):
+    if calibrations.get(name) is None:
+        raise HTTPException(status_code=404, detail='Calibration table not found')
+    users = [i for i in calibrations.used_by(name) if store.get_entry(i) is not None]
+    if users:
+        raise HTTPException(status_code=409, detail={
+            'message': 'Calibration table is in use', 'experiments': users
+        })
+    calibrations.delete(name)
+    return {'message': 'Calibration table deleted'}
+
+
+@app.get('/api/calibration-jobs')
+@offload(io_pool)
+def list_calibration_jobs(user: str = Depends(current_user)):
+    return {'jobs': recalibration.list_jobs()}
+
+
+@app.get('/api/calibration-jobs/{job_id}')
+@offload(io_pool)
+def get_calibration_job(job_id: str, user: str = Depends(current_user)):
+    job = recalibration.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail='Calibration job not found')
+    return {'job': job}
+
+
+@app.post('/api/anomalies/scan')
+@offload(parse_pool)
+def scan_anomalies(payload: dict = None, user: str = Depends(current_user)):
+    """Flag outlying cells; body {"ids": [...], "full": false}, default all experiments
+
+    Only experiments that are new or changed since the last scan are
+    rescanned unless full is set.
+    """
+    payload = payload or {}
+    return anomaly_scanner.scan(payload.get('ids'), full=bool(payload.get('full')))
+
+
+@app.get('/api/sweep-groups')
+@offload(io_pool)
+def list_sweep_groups(user: str = Depends(current_user)):
+    return {'groups': sweep_groups.list_groups()}
+
+
+@app.post('/api/sweep-groups')
+@offload(io_pool)
+def create_sweep_group(payload: dict, user: str = Depends(current_user)):
+    name = (payload.get('name') or '').strip()
+    if not name:
+        raise HTTPException(status_code=400, detail='Group name is required')
+    return {'group': sweep_groups.create(name, created_by=user).info()}
+
+
+@app.get('/api/sweep-groups/{group_id}')
+@offload(io_pool)
+def get_sweep_group(group_id: str, k: float = 2.0, user: str = Depends(current_user)):
+    """The group's mean sweep in experiment shape plus its mean +/- k*sigma envelope"""
+    group = sweep_groups.get(group_id)
+    if group is None:
+        raise HTTPException(status_code=404, detail='Sweep group not found')
+    envelope = group.envelope(k)
+    mean = ColumnarExperiment.from_arrays(
+        dict([(FREQUENCY_COLUMN, group.freqs)] + [(n, envelope[n]['mean']) for n in group.series])
+    )
+    return dict(
+        group.info(),
+        columns=mean.columns,
+        data=mean.to_rows(),
+        k=k,
+        envelope={
+            name: {key: json_array(values) for key, values in stats.items() if key != 'mean'}
+            for name, stats in envelope.items()
+        },
+    )
+
+
+@app.post('/api/sweep-groups/{group_id}/sweeps')
+@offload(parse_pool)
+def add_sweep(group_id: str, file: UploadFile = File(None), experiment_id: str = Form(None),
+              user: str = Depends(current_user)):
+    """Fold an uploaded sweep file (or an existing experiment) into the group"""
+    if file is not None:
+        suffix = Path(file.filename).suffix
+        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+            shutil.copyfileobj(file.file, tmp)
+        try:
+            sweep = read_measurement_file(tmp.name)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f'Could not parse file: {e}')
+        finally:
+            os.remove(tmp.name)
+    elif experiment_id:
+        sweep = experiment_or_404(experiment_id)
+    else:
+        raise HTTPException(status_code=400, detail='Send a file or an experiment_id')
+    try:
+        group = sweep_groups.add_sweep(group_id, sweep)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if group is None:
+        raise HTTPException(status_code=404, detail='Sweep group not found')
+    return {'group': group.info()}
+
+
+@app.delete('/api/sweep-groups/{group_id}')
+@offload(io_pool)
+def delete_sweep_group(group_id: str, user: str = Depends(current_user)):
+    if not sweep_groups.delete(group_id):
+        raise HTTPException(status_code=404, detail='Sweep group not found')
+    return {'message': 'Sweep group deleted'}
+
+
+@app.get('/api/experiments/{experiment_id}')
+@offload(io_pool)
+def get_experiment(experiment_id: str, request: Request, format: str = 'rows',
+                   user: str = Depends(current_user)):
+    """The experiment as rows, or with format=columns as one array per column
+
+    The JSON is streamed in slices and gzipped when the client accepts it.
+    If-None-Match with the current ETag answers 304 without loading anything.
+    """
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    entry = store.get_entry(experiment_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail='Experiment not found')
+    gzip = accepts_gzip(request.headers.get('Accept-Encoding'))
+    # Each format and encoding is its own representation with its own strong tag
+    kind = ('json' if format == 'rows' else format) + ('.gz' if gzip else '')
+    etag = experiment_etag(experiment_id, entry['version'], kind)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    experiment = experiment_or_404(experiment_id)
+    chunks = iter_experiment_json(experiment, format)
+    headers = {
+        # Tag what is actually sent, which may be newer than the entry read above
+        'ETag': experiment_etag(experiment_id, experiment.meta.get('version'), kind),
+        'Cache-Control': REVALIDATE,
+        'Vary': 'Accept-Encoding',
+    }
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    return StreamingResponse(stream_on(io_pool, chunks), media_type='application/json',
+                             headers=headers)
+
+
+@app.get('/api/experiments/{experiment_id}/stats')
+@offload(io_pool)
+def experiment_stats(experiment_id: str, bands: str = None, user: str = Depends(current_user)):
+    summary = stats_cache.get(experiment_id, bands_or_400(bands))
+    if summary is None:
+        raise HTTPException(status_code=404, detail='Experiment not found')
+    return summary
+
+
+@app.get('/api/experiments/{experiment_id}/chart')
+@offload(io_pool)
+def experiment_chart(experiment_id: str, points: int = DEFAULT_CHART_POINTS,
+                     method: str = 'minmax', user: str = Depends(current_user)):
+    """Chart series decimated to about points per series (method minmax or lttb)"""
+    try:
+        chart = chart_cache.get(experiment_id, points, method)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if chart is None:
+        raise HTTPException(status_code=404, detail='Experiment not found')
+    return chart
+
+
+@app.get('/api/experiments/{experiment_id}/anomalies')
+@offload(io_pool)
+def experiment_anomalies(experiment_id: str, user: str = Depends(current_user)):
+    """Flags for the current version, scanning the experiment first if it changed"""
+    if store.get_entry(experiment_id) is None:
+        raise HTTPException(status_code=404, detail='Experiment not found')
+    anomaly_scanner.scan([experiment_id])
+    return anomaly_scanner.results(experiment_id) or {'flagged': 0, 'flags': []}
+
+
+@app.put('/api/experiments/{experiment_id}/calibration')
+@offload(io_pool)
+def calibrate_experiment(experiment_id: str, payload: dict, user: str = Depends(current_user)):
+    """Attach calibration tables to columns and correct their values
+
+    Body: {"columns": {column: [table, ...], ...}}; an empty list removes a
+    column's corrections. The measured values are kept in <column>-Raw and
+    the column becomes read-only, derived from them; shielding is recomputed
+    from the corrected values.
+    """
+    assignments = payload.get('columns') or {}
+    with patch_lock:
+        experiment = experiment_or_404(experiment_id)
+        try:
+            changed = apply_calibration(experiment, assignments, calibrations)
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=f'Invalid calibration: {e}')
+        entry = store.save_experiment(experiment_id, experiment) if changed else store.get_entry(experiment_id)
+        calibrations.set_usage(experiment_id, table_names(experiment))
+    experiment_changed(experiment_id)
+    return {'version': entry['version'], 'columns': changed,
+            'calibration': experiment.meta.get('calibration') or {}}
+
+
+@app.post('/api/experiments/create')
+@offload(io_pool)
+def create_experiment(payload: dict, user: str = Depends(current_user)):
+    name = (payload.get('name') or '').strip()
+    if not name:
+        raise HTTPException(status_code=400, detail='Experiment name is required')
+    # Derived columns are the server's: canonical names, values computed here
+    experiment = normalize(ColumnarExperiment.from_rows(payload.get('data', []), payload.get('columns')))
+    entry = store.create_experiment(experiment, name=name, uploaded_by=user)
+    experiment_changed(entry['id'])
+    return {'message': 'Experiment created', 'experiment': entry}
+
+
+@app.post('/api/upload')
+@offload(parse_pool)
+def upload(file: UploadFile = File(...), sheet: str = Form(None),
+           user: str = Depends(current_user)):
+    suffix = Path(file.filename).suffix
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        shutil.copyfileobj(file.file, tmp)
+    try:
+        entry, cached = import_cache.import_file(
+            tmp.name, name=Path(file.filename).stem, uploaded_by=user, sheet=sheet
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f'Could not parse file: {e}')
+    finally:
+        os.remove(tmp.name)
+    experiment_changed(entry['id'])
+    return {'message': 'File uploaded', 'experiment': entry, 'cached': cached}
+
+
+@app.post('/api/import-jobs', status_code=202)
+@offload(io_pool)
+def submit_import(file: UploadFile = File(...), user: str = Depends(current_user)):
+    """Queue a file for background import and return its job right away"""
+    suffix = Path(file.filename).suffix
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as tmp:
+        shutil.copyfileobj(file.file, tmp)
+    job = import_jobs.submit(tmp.name, name=file.filename, uploaded_by=user, remove_file=True)
+    return {'job': job}
+
+
+@app.get('/api/import-jobs')
+@offload(io_pool)
+def list_import_jobs(user: str = Depends(current_user)):
+    return {'jobs': import_jobs.list_jobs()}
+
+
+@app.get('/api/import-jobs/{job_id}')
+@offload(io_pool)
+def get_import_job(job_id: str, user: str = Depends(current_user)):
+    job = import_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail='Import job not found')
+    return {'job': job}
+
+
+@app.post('/api/upload-traces')
+@offload(parse_pool)
+def upload_traces(files: List[UploadFile] = File(...), name: str = Form(None),
+                  user: str = Depends(current_user)):
+    """Combine one analyser trace per file; the file named *ref* is the Reference"""
+    tmp_dir = tempfile.mkdtemp(prefix='shield_traces_')
+    try:
+        paths = []
+        for upload in files:
+            path = Path(tmp_dir) / Path(upload.filename).name
+            with open(path, 'wb') as f:
+                shutil.copyfileobj(upload.file, f)
+            paths.append(path)
+        experiment = read_trace_set(paths)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f'Could not parse traces: {e}')
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    name = name or ', '.join(p.stem for p in paths if not p.stem.lower().startswith('ref'))
+    entry = store.create_experiment(experiment, name=name, uploaded_by=user)
+    experiment_changed(entry['id'])
+    return {'message': 'Traces uploaded', 'experiment': entry}
+
+
+@app.post('/api/bulk-import')
+@offload(parse_pool)
+def bulk_upload(file: UploadFile = File(...), user: str = Depends(current_user)):
+    """Import a .zip of workbooks; returns per-file timings and failures"""
+    with tempfile.NamedTemporaryFile(suffix='.zip', delete=False) as tmp:
+        shutil.copyfileobj(file.file, tmp)
+    try:
+        report = bulk_import(tmp.name, store, uploaded_by=user, cache=import_cache, pool=bulk_pool)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        os.remove(tmp.name)
+    for item in report['imported']:
+        experiment_changed(item['experiment_id'])
+    return report
+
+
+@app.put('/api/experiments/{experiment_id}')
+@offload(io_pool)
+def replace_experiment(experiment_id: str, payload: dict, user: str = Depends(current_user)):
+    """Replace every row; an optional base_version rejects the write with 409 if stale"""
+    experiment = ColumnarExperiment.from_rows(payload.get('data', []), payload.get('columns'))
+    experiment.rename_columns({c: canonical_column(c) for c in experiment.columns})
+    with patch_lock:
+        old = experiment_or_404(experiment_id)
+        base_version = payload.get('base_version')
+        if base_version is not None and base_version != old.meta.get('version'):
+            raise HTTPException(status_code=409, detail={
+                'message': 'Experiment was changed by someone else', 'version': old.meta.get('version')
+            })
+        experiment.meta = dict(old.meta, modified_by=user)
+
+        # Derived cells come from the server: start from the stored values and
+        # recompute whole columns, so the response lists only what changed and
+        # values stored stale (never normalized) are repaired too
+        graph = DependencyGraph.for_experiment(experiment)
+        if old.n_rows == experiment.n_rows:
+            for col in graph.order:
+                if old.has_column(col):
+                    experiment.column(col)[:] = old.column(col)
+        cells = graph.recompute_all(experiment)
+
+        entry = store.save_experiment(experiment_id, experiment)
+    experiment_changed(experiment_id)
+    return {'message': 'Experiment updated', 'columns': experiment.columns,
+            'version': entry['version'], 'cells': cells}
+
+
+@app.patch('/api/experiments/{experiment_id}')
+@offload(io_pool)
+def patch_experiment(experiment_id: str, payload: dict, user: str = Depends(current_user)):
+    """Apply a batch of cell/row/column operations against a base version
+
+    Body: {"base_version": n, "ops": [{"op": "set_cells", "cells": [[row, col, value], ...]},
+    {"op": "add_row", "values": {...}, "index": i}, {"op": "delete_row", "index": i},
+    {"op": "add_column", "column": name, "position": i}]}
+    Returns the new version and only the derived cells the server recomputed,
+    as [row, column, value] with row indexes after every op has been applied.
+    """
+    with patch_lock:
+        entry = store.get_entry(experiment_id)
+        if entry is None:
+            raise HTTPException(status_code=404, detail='Experiment not found')
+        if payload.get('base_version') != entry['version']:
+            raise HTTPException(status_code=409, detail={
+                'message': 'Experiment was changed by someone else', 'version': entry['version']
+            })
+
+        # Every op is applied to one copy first; the store only sees the batch
+        # once all of it is valid, as a single new version
+        experiment = experiment_or_404(experiment_id)
+        edits = []
+
+        def stage(kind, args):
+            DATA_OPS[kind](experiment, args)
+            edits.append({'op': kind, 'args': args})
+
+        for op in payload.get('ops', []):
+            kind = op.get('op')
+            args = {k: v for k, v in op.items() if k != 'op'}
+            try:
+                if kind == 'set_cells':
+                    # Clients may not overwrite derived cells
+                    graph = DependencyGraph.for_experiment(experiment)
+                    args['cells'] = [c for c in args['cells'] if not graph.is_derived(c[1])]
+                    stage(kind, args)
+                elif kind in ('add_row', 'delete_row'):
+                    stage(kind, args)
+                elif kind == 'add_column':
+                    column = args['column']
+                    stage(kind, args)
+                    if not is_shielding_column(column) and not is_reference_column(column) \
+                            and not is_frequency_column(column) and not is_raw_column(column):
+                        stage(kind, {'column': shielding_column(column)})
+                else:
+                    raise HTTPException(status_code=400, detail=f'Unknown operation: {kind}')
+            except (KeyError, IndexError, ValueError) as e:
+                raise HTTPException(status_code=400, detail=f'Invalid {kind} operation: {e}')
+
+        # Derived columns are recomputed whole, once, from the final rows: stale
+        # stored values are repaired and the returned cells use final row indexes
+        changed = DependencyGraph.for_experiment(experiment).recompute_all(experiment) \
+            if edits else []
+        if changed:
+            stage('set_cells', {'cells': changed})
+        if edits:
+            entry = store.apply_many(experiment_id, edits)
+    experiment_changed(experiment_id)
+    return {'version': entry['version'], 'rows': entry['rows'], 'cells': changed}
+
+
+@app.delete('/api/experiments/{experiment_id}')
+@offload(io_pool)
+def delete_experiment(experiment_id: str, user: str = Depends(current_user)):
+    if not store.delete_experiment(experiment_id):
+        raise HTTPException(status_code=404, detail='Experiment not found')
+    import_cache.invalidate(experiment_id)
+    result_cache.invalidate(experiment_id)
+    calibrations.set_usage(experiment_id, ())
+    anomaly_scanner.invalidate(experiment_id)
+    return {'message': 'Experiment deleted'}
+
+
+def excel_export(experiment):
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet('Measurements')
+    ws.append(experiment.columns)
+    for row in experiment.values.T.tolist():
+        ws.append([None if v != v else v for v in row])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+@app.get('/api/experiments/{experiment_id}/download')
+@offload(parse_pool)
+def download_experiment(experiment_id: str, request: Request, user: str = Depends(current_user)):
+    entry = store.get_entry(experiment_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail='Experiment not found')
+    etag = experiment_etag(experiment_id, entry['version'], 'xlsx')
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    payload = result_cache.get(experiment_id, entry['version'], 'xlsx', (),
+                               lambda: excel_export(experiment_or_404(experiment_id)),
+                               persist=True)
+    name = Path(entry.get('name') or 'experiment').stem
+    return Response(
+        payload,
+        media_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        headers={'Content-Disposition': f'attachment; filename="{name}_results.xlsx"',
+                 'ETag': etag, 'Cache-Control': REVALIDATE}
+    )
+
+
+@app.get('/api/cache/stats')
+@offload(io_pool)
+def cache_stats(user: str = Depends(current_user)):
+    """Derived-results cache size, evictions and hit/miss counters per kind"""
+    return result_cache.stats()
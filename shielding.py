@@ -0,0 +1,69 @@
+"""
+Faraday Shield Analyser - Shielding effectiveness
+The one place that derives <location>-Shielding columns (Reference minus
+location, in dB). Everything works on whole arrays: imports compute every
+shielding column in one broadcast; edits recompute only the touched rows
+through derived.DependencyGraph, which uses the same formula.
+"""
+import numpy as np
+
+from columnar import (
+    is_frequency_column, is_raw_column, is_reference_column, is_shielding_column,
+    location_for_shielding
+)
+
+SHIELDING_SUFFIX = '-Shielding'
+
+
+def shielding_column(location):
+    """Name of the shielding column derived from a location column"""
+    return f'{location}{SHIELDING_SUFFIX}'
+
+
+def canonical_column(col):
+    """Rename legacy "<location> - Shielding" columns to the canonical form"""
+    location = location_for_shielding(col)
+    return shielding_column(location) if location is not None else col
+
+
+def split_columns(columns):
+    """Return (frequency, reference, location) column lists; shielding and raw columns are skipped"""
+    freq_cols = [c for c in columns if is_frequency_column(c)]
+    ref_cols = [c for c in columns if is_reference_column(c)]
+    locations = [c for c in columns if c not in freq_cols and c not in ref_cols
+                 and not is_shielding_column(c) and not is_raw_column(c)]
+    return freq_cols, ref_cols, locations
+
+
+def shielding_effectiveness(reference, locations):
+    """Reference minus each location: (rows,) and (n_locations, rows) -> (n_locations, rows)"""
+    return np.asarray(reference)[np.newaxis, :] - np.atleast_2d(locations)
+
+
+def with_shielding(columns, matrix):
+    """Add a <location>-Shielding column after each location and compute them
+
+    matrix is (len(columns), rows). Columns keep their order, each location
+    followed by its shielding column as in the original Excel import.
+    Shielding columns already in the input (under either naming) are
+    dropped and recomputed. Returns (columns, matrix).
+    """
+    _, ref_cols, locations = split_columns(columns)
+    index = {c: i for i, c in enumerate(columns)}
+    kept = [c for c in columns if not is_shielding_column(c)]
+    if not ref_cols or not locations:
+        return kept, matrix[[index[c] for c in kept]]
+
+    measured = set(locations)
+    ordered = []
+    for c in kept:
+        ordered.append(c)
+        if c in measured:
+            ordered.append(shielding_column(c))
+    position = {c: i for i, c in enumerate(ordered)}
+    values = np.empty((len(ordered), matrix.shape[1]), dtype=matrix.dtype)
+    values[[position[c] for c in kept]] = matrix[[index[c] for c in kept]]
+    values[[position[shielding_column(c)] for c in locations]] = shielding_effectiveness(
+        matrix[index[ref_cols[0]]], matrix[[index[c] for c in locations]]
+    )
+    return ordered, values
@@ -0,0 +1,489 @@
+"""
+Faraday Shield Analyser - SQLite experiment store
+Optional backend keeping every measurement as an indexed
+(experiment, location, row, frequency, value) record so frequency-range and
+cross-experiment queries run in SQL. Exposes the same interface as
+experiment_store.ExperimentStore.
+
+Usage: python sqlite_store.py migrate <data_dir>
+"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from columnar import (
+    ColumnarExperiment, is_frequency_column, is_raw_column, is_reference_column, is_shielding_column
+)
+from derived import normalize
+from locking import InterProcessLock
+
+DB_NAME = 'experiments.db'
+LOCK_NAME = '.store.lock'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    uploaded_by TEXT,
+    uploaded_at TEXT,
+    version INTEGER NOT NULL DEFAULT 1,
+    n_rows INTEGER NOT NULL DEFAULT 0,
+    n_locations INTEGER NOT NULL DEFAULT 0,
+    freq_min REAL,
+    freq_max REAL,
+    meta TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS locations (
+    experiment_id TEXT NOT NULL REFERENCES experiments(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (experiment_id, name)
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    experiment_id TEXT NOT NULL REFERENCES experiments(id) ON DELETE CASCADE,
+    location TEXT NOT NULL,
+    row INTEGER NOT NULL,
+    frequency REAL,
+    value REAL,
+    PRIMARY KEY (experiment_id, location, row)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_measurements_frequency
+    ON measurements (frequency, experiment_id, location);
+CREATE INDEX IF NOT EXISTS idx_measurements_location_frequency
+    ON measurements (location, frequency);
+CREATE INDEX IF NOT EXISTS idx_experiments_uploaded_at ON experiments (uploaded_at);
+CREATE TABLE IF NOT EXISTS store_state (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    generation INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO store_state VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS experiments_inserted AFTER INSERT ON experiments
+    BEGIN UPDATE store_state SET generation = generation + 1; END;
+CREATE TRIGGER IF NOT EXISTS experiments_updated AFTER UPDATE ON experiments
+    BEGIN UPDATE store_state SET generation = generation + 1; END;
+CREATE TRIGGER IF NOT EXISTS experiments_deleted AFTER DELETE ON experiments
+    BEGIN UPDATE store_state SET generation = generation + 1; END;
+"""
+
+
+def column_kind(col):
+    if is_frequency_column(col):
+        return 'frequency'
+    if is_reference_column(col):
+        return 'reference'
+    if is_shielding_column(col):
+        return 'shielding'
+    if is_raw_column(col):
+        return 'raw'
+    return 'location'
+
+
+def _nullable(value):
+    """SQLite has no NaN; store blanks as NULL"""
+    return None if value is None or value != value else float(value)
+
+
+class SQLiteExperimentStore:
+    """Experiments, locations and measurements in a WAL-mode SQLite database"""
+
+    def __init__(self, data_dir):
+        self.data_dir = Path(data_dir)
+        self.db_file = self.data_dir / DB_NAME
+        self._local = threading.local()
+        # SQLite serialises commits itself; the lock keeps the server's
+        # read-check-write sequences atomic across worker processes
+        self.lock = InterProcessLock(self.data_dir / LOCK_NAME)
+        os.makedirs(self.data_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        """Return this thread's connection (sqlite3 connections are per-thread)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_file, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # WAL lets readers proceed while a writer is committing
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('PRAGMA foreign_keys=ON')
+            self._local.conn = conn
+        return conn
+
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+    @staticmethod
+    def _entry(row):
+        return {
+            'id': row['id'],
+            'name': row['name'],
+            'uploaded_by': row['uploaded_by'],
+            'uploaded_at': row['uploaded_at'],
+            'rows': row['n_rows'],
+            'locations': row['n_locations'],
+            'freq_min': row['freq_min'],
+            'freq_max': row['freq_max'],
+            'version': row['version'],
+        }
+
+    def list_experiments(self):
+        rows = self._connect().execute('SELECT * FROM experiments ORDER BY uploaded_at')
+        return [self._entry(row) for row in rows]
+
+    def generation(self):
+        """Bumped by triggers on every change to the experiments table"""
+        return self._connect().execute('SELECT generation FROM store_state').fetchone()[0]
+
+    def snapshot(self):
+        """(generation, entries), see ExperimentStore.snapshot"""
+        # Read first: a write landing in between only makes the entries newer
+        generation = self.generation()
+        return generation, self.list_experiments()
+
+    def get_entry(self, experiment_id):
+        row = self._connect().execute(
+            'SELECT * FROM experiments WHERE id = ?', (experiment_id,)
+        ).fetchone()
+        return self._entry(row) if row else None
+
+    def load(self, experiment_id):
+        """Return the ColumnarExperiment for an id, or None"""
+        conn = self._connect()
+        row = conn.execute('SELECT * FROM experiments WHERE id = ?', (experiment_id,)).fetchone()
+        if row is None:
+            return None
+        columns = [r['name'] for r in conn.execute(
+            'SELECT name FROM locations WHERE experiment_id = ? ORDER BY position',
+            (experiment_id,)
+        )]
+        index = {col: i for i, col in enumerate(columns)}
+        values = np.full((len(columns), row['n_rows']), np.nan)
+        cells = conn.execute(
+            'SELECT location, row, value FROM measurements WHERE experiment_id = ?',
+            (experiment_id,)
+        ).fetchall()
+        if cells:
+            cols = np.fromiter((index[c[0]] for c in cells), dtype=np.intp, count=len(cells))
+            rows = np.fromiter((c[1] for c in cells), dtype=np.intp, count=len(cells))
+            vals = np.array([c[2] for c in cells], dtype=np.float64)
+            values[cols, rows] = vals
+        meta = json.loads(row['meta'])
+        meta.update(id=row['id'], name=row['name'], uploaded_by=row['uploaded_by'],
+                    uploaded_at=row['uploaded_at'], version=row['version'])
+        return ColumnarExperiment(columns, values, meta)
+
+    def get_experiment(self, experiment_id):
+        experiment = self.load(experiment_id)
+        return experiment.to_experiment() if experiment is not None else None
+
+    def query_range(self, freq_min, freq_max, experiment_ids=None, locations=None):
+        """Return (experiment_id, location, frequency, value) tuples in a frequency band"""
+        sql = ('SELECT experiment_id, location, frequency, value FROM measurements '
+               'WHERE frequency BETWEEN ? AND ?')
+        params = [freq_min, freq_max]
+        if experiment_ids:
+            sql += f" AND experiment_id IN ({','.join('?' * len(experiment_ids))})"
+            params.extend(experiment_ids)
+        if locations:
+            sql += f" AND location IN ({','.join('?' * len(locations))})"
+            params.extend(locations)
+        sql += ' ORDER BY experiment_id, location, frequency'
+        return [tuple(r) for r in self._connect().execute(sql, params)]
+
+    def location_across_experiments(self, location, freq_min=None, freq_max=None):
+        """Return {experiment_id: [(frequency, value), ...]} for one location"""
+        sql = 'SELECT experiment_id, frequency, value FROM measurements WHERE location = ?'
+        params = [location]
+        if freq_min is not None:
+            sql += ' AND frequency >= ?'
+            params.append(freq_min)
+        if freq_max is not None:
+            sql += ' AND frequency <= ?'
+            params.append(freq_max)
+        result = {}
+        for experiment_id, frequency, value in self._connect().execute(
+                sql + ' ORDER BY experiment_id, frequency', params):
+            result.setdefault(experiment_id, []).append((frequency, value))
+        return result
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+    def _insert_columns(self, conn, experiment_id, experiment, columns, start_position):
+        freq_col = experiment.frequency_column
+        freqs = experiment.column(freq_col) if freq_col else np.full(experiment.n_rows, np.nan)
+        freqs = [_nullable(f) for f in freqs.tolist()]
+        conn.executemany(
+            'INSERT INTO locations (experiment_id, name, kind, position) VALUES (?, ?, ?, ?)',
+            [(experiment_id, col, column_kind(col), start_position + i)
+             for i, col in enumerate(columns)]
+        )
+        for col in columns:
+            conn.executemany(
+                'INSERT INTO measurements (experiment_id, location, row, frequency, value) '
+                'VALUES (?, ?, ?, ?, ?)',
+                ((experiment_id, col, r, freqs[r], _nullable(v))
+                 for r, v in enumerate(experiment.column(col).tolist()))
+            )
+
+    def _insert(self, conn, experiment):
+        meta = experiment.meta
+        payload = {k: v for k, v in meta.items()
+                   if k not in ('id', 'name', 'uploaded_by', 'uploaded_at', 'version')}
+        conn.execute(
+            'INSERT INTO experiments (id, name, uploaded_by, uploaded_at, version, meta) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (meta['id'], meta.get('name', ''), meta.get('uploaded_by'),
+             meta.get('uploaded_at'), meta.get('version', 1), json.dumps(payload))
+        )
+        self._insert_columns(conn, meta['id'], experiment, experiment.columns, 0)
+        self._refresh_summary(conn, meta['id'])
+
+    def _refresh_summary(self, conn, experiment_id, bump_version=False):
+        conn.execute(
+            """UPDATE experiments SET
+                n_rows = (SELECT COALESCE(MAX(row) + 1, 0) FROM measurements WHERE experiment_id = :id),
+                n_locations = (SELECT COUNT(*) FROM locations
+                               WHERE experiment_id = :id AND kind = 'location'),
+                freq_min = (SELECT MIN(frequency) FROM measurements WHERE experiment_id = :id),
+                freq_max = (SELECT MAX(frequency) FROM measurements WHERE experiment_id = :id),
+                version = version + :bump
+               WHERE id = :id""",
+            {'id': experiment_id, 'bump': 1 if bump_version else 0}
+        )
+
+    def create_experiment(self, experiment, name=None, uploaded_by=None):
+        return self.create_many([experiment], uploaded_by=uploaded_by, names=[name])[0]
+
+    def create_many(self, experiments, uploaded_by=None, names=None):
+        """Insert several new experiments in one transaction"""
+        names = names or [None] * len(experiments)
+        for experiment, name in zip(experiments, names):
+            # Whatever the caller computed, stored derived columns come from the graph
+            normalize(experiment)
+            meta = experiment.meta
+            meta['id'] = str(uuid.uuid4())
+            meta['version'] = 1
+            if name is not None:
+                meta['name'] = name
+            if uploaded_by is not None:
+                meta['uploaded_by'] = uploaded_by
+            meta.setdefault('uploaded_at', datetime.now().isoformat())
+        with self.lock, self._connect() as conn:
+            for experiment in experiments:
+                self._insert(conn, experiment)
+        return [self.get_entry(e.meta['id']) for e in experiments]
+
+    def link_experiment(self, source_id, name=None, uploaded_by=None):
+        """Create a new experiment with source_id's measurements
+
+        Rows are copied inside SQLite (INSERT ... SELECT), so nothing is
+        parsed or sent through Python. Returns None if source_id does not exist.
+        """
+        new_id = str(uuid.uuid4())
+        with self.lock, self._connect() as conn:
+            cursor = conn.execute(
+                """INSERT INTO experiments (id, name, uploaded_by, uploaded_at, version, n_rows,
+                                            n_locations, freq_min, freq_max, meta)
+                   SELECT ?, COALESCE(?, name), COALESCE(?, uploaded_by), ?, 1, n_rows,
+                          n_locations, freq_min, freq_max, meta
+                   FROM experiments WHERE id = ?""",
+                (new_id, name, uploaded_by, datetime.now().isoformat(), source_id)
+            )
+            if cursor.rowcount == 0:
+                return None
+            conn.execute(
+                'INSERT INTO locations (experiment_id, name, kind, position) '
+                'SELECT ?, name, kind, position FROM locations WHERE experiment_id = ?',
+                (new_id, source_id)
+            )
+            conn.execute(
+                'INSERT INTO measurements (experiment_id, location, row, frequency, value) '
+                'SELECT ?, location, row, frequency, value FROM measurements WHERE experiment_id = ?',
+                (new_id, source_id)
+            )
+        return self.get_entry(new_id)
+
+    def save_experiment(self, experiment_id, experiment):
+        normalize(experiment)
+        with self.lock, self._connect() as conn:
+            old = conn.execute('SELECT * FROM experiments WHERE id = ?', (experiment_id,)).fetchone()
+            if old is None:
+                raise KeyError(experiment_id)
+            experiment.meta.update(id=experiment_id, version=old['version'] + 1)
+            conn.execute('DELETE FROM experiments WHERE id = ?', (experiment_id,))
+            self._insert(conn, experiment)
+        return self.get_entry(experiment_id)
+
+    def _shift_rows(self, conn, experiment_id, first_row, delta):
+        """Renumber rows >= first_row by delta without tripping the primary key"""
+        conn.execute(
+            'UPDATE measurements SET row = -row - 1 WHERE experiment_id = ? AND row >= ?',
+            (experiment_id, first_row)
+        )
+        conn.execute(
+            'UPDATE measurements SET row = -row - 1 + ? WHERE experiment_id = ? AND row < 0',
+            (delta, experiment_id)
+        )
+
+    @staticmethod
+    def _row_index(index, n_rows, allow_end=False):
+        """Same bounds as ColumnarExperiment: IndexError unless index names a row"""
+        index = int(index)
+        if not 0 <= index < n_rows + (1 if allow_end else 0):
+            raise IndexError(f'Row {index} out of range (0-{n_rows - (0 if allow_end else 1)})')
+        return index
+
+    def apply(self, experiment_id, op, **args):
+        """Apply one edit (set_cells, add_row, delete_row, add_column) in SQL"""
+        return self.apply_many(experiment_id, [{'op': op, 'args': args}])
+
+    def apply_many(self, experiment_id, ops):
+        """Apply [{'op': ..., 'args': {...}}, ...] in one transaction, as one new version"""
+        with self.lock, self._connect() as conn:
+            if conn.execute('SELECT 1 FROM experiments WHERE id = ?', (experiment_id,)).fetchone() is None:
+                raise KeyError(experiment_id)
+            n_rows = conn.execute(
+                'SELECT n_rows FROM experiments WHERE id = ?', (experiment_id,)
+            ).fetchone()['n_rows']
+            stale = False
+            for edit in ops:
+                n_rows, changed = self._apply_op(conn, experiment_id, edit['op'], edit['args'],
+                                                 n_rows)
+                stale = stale or changed
+            # The summary scans every cell, so it is refreshed once per batch and
+            # only when rows, columns or frequencies changed
+            if stale:
+                self._refresh_summary(conn, experiment_id, bump_version=True)
+            else:
+                conn.execute('UPDATE experiments SET version = version + 1 WHERE id = ?',
+                             (experiment_id,))
+        return self.get_entry(experiment_id)
+
+    def _apply_op(self, conn, experiment_id, op, args, n_rows):
+        """One edit inside apply_many's transaction; raising rolls the batch back
+
+        n_rows is the row count before the edit. Returns the row count after
+        it and whether the experiment summary needs refreshing.
+        """
+        columns = {r['name']: r['kind'] for r in conn.execute(
+            'SELECT name, kind FROM locations WHERE experiment_id = ?', (experiment_id,)
+        )}
+
+        if op == 'set_cells':
+            frequency_changed = False
+            # Raising rolls the whole transaction back
+            for row, col, value in args['cells']:
+                row = self._row_index(row, n_rows)
+                if col not in columns:
+                    raise KeyError(col)
+                conn.execute(
+                    'UPDATE measurements SET value = ? '
+                    'WHERE experiment_id = ? AND location = ? AND row = ?',
+                    (_nullable(value), experiment_id, col, row)
+                )
+                if columns[col] == 'frequency':
+                    frequency_changed = True
+                    conn.execute(
+                        'UPDATE measurements SET frequency = ? WHERE experiment_id = ? AND row = ?',
+                        (_nullable(value), experiment_id, row)
+                    )
+            return n_rows, frequency_changed
+        if op == 'add_row':
+            values = args.get('values') or {}
+            index = n_rows if args.get('index') is None else \
+                self._row_index(args['index'], n_rows, allow_end=True)
+            self._shift_rows(conn, experiment_id, index, 1)
+            freq_col = next((c for c, k in columns.items() if k == 'frequency'), None)
+            freq = _nullable(values.get(freq_col, 0.0)) if freq_col else None
+            conn.executemany(
+                'INSERT INTO measurements (experiment_id, location, row, frequency, value) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [(experiment_id, col, index, freq, _nullable(values.get(col, 0.0)))
+                 for col in columns]
+            )
+            return n_rows + 1, True
+        if op == 'delete_row':
+            index = self._row_index(args['index'], n_rows)
+            conn.execute('DELETE FROM measurements WHERE experiment_id = ? AND row = ?',
+                         (experiment_id, index))
+            self._shift_rows(conn, experiment_id, index + 1, -1)
+            return n_rows - 1, True
+        if op == 'add_column':
+            col = str(args['column'])
+            if col in columns:
+                raise ValueError(f'Column already exists: {col}')
+            values = args.get('values')
+            values = [0.0] * n_rows if values is None else list(values)
+            if len(values) != n_rows:
+                raise ValueError(f'Column {col} needs {n_rows} values, got {len(values)}')
+            position = args.get('position')
+            position = len(columns) if position is None else int(position)
+            # Read inside the transaction, so rows added earlier in the batch count
+            rows = [{col: v} for v in values]
+            freq_col = next((c for c, k in columns.items() if k == 'frequency'), None)
+            if freq_col:
+                for row, stored in zip(rows, conn.execute(
+                        'SELECT value FROM measurements WHERE experiment_id = ? AND location = ? '
+                        'ORDER BY row', (experiment_id, freq_col))):
+                    row[freq_col] = stored['value']
+            column = ColumnarExperiment.from_rows(rows, [freq_col, col] if freq_col else [col])
+            conn.execute(
+                'UPDATE locations SET position = position + 1 '
+                'WHERE experiment_id = ? AND position >= ?',
+                (experiment_id, position)
+            )
+            self._insert_columns(conn, experiment_id, column, [col], position)
+            return n_rows, True
+        raise ValueError(f'Unknown operation: {op}')
+
+    def delete_experiment(self, experiment_id):
+        with self.lock, self._connect() as conn:
+            cursor = conn.execute('DELETE FROM experiments WHERE id = ?', (experiment_id,))
+        return cursor.rowcount > 0
+
+    def add_listener(self, callback):
+        """Versions are read from the database on every call; nothing to announce"""
+
+    def compact(self):
+        """SQLite checkpoints its own WAL; nothing to fold"""
+        self._connect().execute('PRAGMA wal_checkpoint(PASSIVE)')
+
+
+def migrate_json(json_file, data_dir, store=None):
+    """One-shot import of a legacy experiments.json into experiments.db
+
+    store is an already open SQLiteExperimentStore for data_dir, if any.
+    """
+    with open(json_file) as f:
+        legacy = json.load(f)
+    experiments = legacy.get('experiments', []) if isinstance(legacy, dict) else legacy
+
+    store = store or SQLiteExperimentStore(data_dir)
+    with store.lock, store._connect() as conn:
+        for experiment in experiments:
+            columnar = normalize(ColumnarExperiment.from_experiment(experiment))
+            columnar.meta.setdefault('id', str(uuid.uuid4()))
+            columnar.meta.setdefault('version', 1)
+            # Re-running the migration replaces rather than duplicates
+            conn.execute('DELETE FROM experiments WHERE id = ?', (columnar.meta['id'],))
+            store._insert(conn, columnar)
+    return len(experiments)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != 'migrate':
+        print(__doc__)
+        sys.exit(1)
+    data_dir = Path(sys.argv[2])
+    count = migrate_json(data_dir / 'experiments.json', data_dir)
+    print(f"✅ Migrated {count} experiments into {data_dir / DB_NAME}")
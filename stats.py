@@ -0,0 +1,120 @@
+"""
+Faraday Shield Analyser - Summary statistics
+Min/max/mean/median/5th/95th percentile shielding per location, overall and
+per frequency band, computed in one vectorized pass and cached by
+experiment version so repeat requests never touch the measurements.
+"""
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from columnar import location_for_shielding
+from result_cache import ResultCache
+
+# Summaries kept when no shared cache is given (one per experiment version and band set)
+STATS_CACHE_SIZE = 2048
+PERCENTILES = (5, 50, 95)
+
+
+def parse_bands(text):
+    """Parse "30-230,230-1000" (MHz) into ((30.0, 230.0), (230.0, 1000.0))"""
+    if not text:
+        return ()
+    bands = []
+    for part in text.split(','):
+        low, _, high = part.strip().partition('-')
+        low, high = float(low), float(high)
+        if high <= low:
+            raise ValueError(f'Empty frequency band: {part}')
+        bands.append((low, high))
+    return tuple(bands)
+
+
+def _summaries(names, block):
+    """Per-row stats of a (locations, samples) block as {name: {...}}"""
+    if not names:
+        return {}
+    with warnings.catch_warnings():
+        # All-blank locations give NaN, reported as None
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if block.shape[1]:
+            p5, median, p95 = np.nanpercentile(block, PERCENTILES, axis=1)
+            table = {
+                'min': np.nanmin(block, axis=1),
+                'max': np.nanmax(block, axis=1),
+                'mean': np.nanmean(block, axis=1),
+                'median': median,
+                'p5': p5,
+                'p95': p95,
+            }
+        else:
+            empty = np.full(len(names), np.nan)
+            table = dict.fromkeys(('min', 'max', 'mean', 'median', 'p5', 'p95'), empty)
+    counts = (~np.isnan(block)).sum(axis=1)
+    result = {}
+    for i, name in enumerate(names):
+        result[name] = {key: (None if np.isnan(v[i]) else float(v[i])) for key, v in table.items()}
+        result[name]['count'] = int(counts[i])
+    return result
+
+
+def summarize(experiment, bands=()):
+    """Shielding statistics per location, overall and for each (low, high) MHz band"""
+    columns = experiment.shielding_columns
+    names = [location_for_shielding(col) for col in columns]
+    block = (np.vstack([experiment.column(col) for col in columns]) if columns
+             else np.empty((0, experiment.n_rows)))
+
+    summary = {
+        'experiment_id': experiment.meta.get('id'),
+        'version': experiment.meta.get('version'),
+        'rows': experiment.n_rows,
+        'locations': _summaries(names, block),
+        'bands': [],
+    }
+    freq_col = experiment.frequency_column
+    if bands and freq_col is not None:
+        freqs = experiment.column(freq_col)
+        for low, high in bands:
+            mask = (freqs >= low) & (freqs < high)
+            summary['bands'].append({
+                'freq_min': low,
+                'freq_max': high,
+                'locations': _summaries(names, block[:, mask]),
+            })
+    return summary
+
+
+class StatsCache:
+    """Summaries cached in a ResultCache on (experiment id, version, bands)
+
+    A new version is a new key, so edits never serve stale stats; old
+    versions simply age out. warm() precomputes after a write so the next
+    read is a hit.
+    """
+
+    def __init__(self, store, cache=None):
+        self.store = store
+        self.cache = cache or ResultCache(STATS_CACHE_SIZE)
+        self._warmer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='stats')
+
+    def warm(self, experiment_id, bands=()):
+        """Compute the current version's summary in the background"""
+        self._warmer.submit(self.get, experiment_id, bands)
+
+    def get(self, experiment_id, bands=()):
+        """Summary for the experiment's current version, or None if it does not exist"""
+        entry = self.store.get_entry(experiment_id)
+        if entry is None:
+            return None
+
+        def compute():
+            experiment = self.store.load(experiment_id)
+            return summarize(experiment, bands) if experiment is not None else None
+
+        return self.cache.get(experiment_id, entry['version'], 'stats', bands, compute,
+                              persist=True)
+
+    def invalidate(self, experiment_id):
+        self.cache.invalidate(experiment_id)
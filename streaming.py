@@ -0,0 +1,103 @@
+"""
+Faraday Shield Analyser - Streamed experiment JSON
+Serialises an experiment a slice of rows at a time, optionally gzipped on
+the fly, so a large sweep's first bytes leave before the rest has been
+serialised and a request never holds more than one slice as text.
+
+Two shapes are produced:
+  'rows'    - the legacy {meta..., "columns": [...], "data": [{column: value}, ...]}
+  'columns' - {meta..., "columns": [...], "rows": n, "values": [[...], ...]}, one
+              array per column in column order, so names are sent only once
+"""
+import json
+import zlib
+
+FORMATS = ('rows', 'columns')
+# Rows (or column cells) serialised per chunk
+CHUNK_ROWS = 2000
+GZIP_LEVEL = 6
+
+
+def _dumps(value):
+    # Same settings as FastAPI's JSONResponse, so both paths emit the same bytes
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+
+def _cells(values):
+    """numpy slice -> list with NaN as None"""
+    return [None if v != v else v for v in values.tolist()]
+
+
+def _head(experiment, **extra):
+    """The opening of the JSON object: meta, columns and extra, left open"""
+    head = dict(experiment.meta)
+    head.pop('data', None)
+    head.pop('values', None)
+    head['columns'] = list(experiment.columns)
+    head.update(extra)
+    return _dumps(head)[:-1]
+
+
+def iter_rows_json(experiment, chunk_rows=CHUNK_ROWS):
+    """Yield the 'rows' shape as UTF-8 chunks"""
+    yield (_head(experiment) + ',"data":[').encode('utf-8')
+    columns = experiment.columns
+    for start in range(0, experiment.n_rows, chunk_rows):
+        block = experiment.values[:, start:start + chunk_rows].T.tolist()
+        rows = [{col: (None if v != v else v) for col, v in zip(columns, row)} for row in block]
+        yield ((',' if start else '') + _dumps(rows)[1:-1]).encode('utf-8')
+    yield b']}'
+
+
+def iter_columns_json(experiment, chunk_rows=CHUNK_ROWS):
+    """Yield the 'columns' shape as UTF-8 chunks"""
+    n_rows = experiment.n_rows
+    yield (_head(experiment, rows=n_rows) + ',"values":[').encode('utf-8')
+    for index, col in enumerate(experiment.columns):
+        values = experiment.column(col)
+        parts = [',[' if index else '[']
+        for start in range(0, n_rows, chunk_rows):
+            parts.append((',' if start else '') + _dumps(_cells(values[start:start + chunk_rows]))[1:-1])
+            if start + chunk_rows < n_rows:
+                yield ''.join(parts).encode('utf-8')
+                parts = []
+        parts.append(']')
+        yield ''.join(parts).encode('utf-8')
+    yield b']}'
+
+
+def iter_experiment_json(experiment, fmt='rows', chunk_rows=CHUNK_ROWS):
+    """UTF-8 chunks of experiment in one of FORMATS; ValueError for others"""
+    if fmt == 'rows':
+        return iter_rows_json(experiment, chunk_rows)
+    if fmt == 'columns':
+        return iter_columns_json(experiment, chunk_rows)
+    raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+
+
+def accepts_gzip(accept_encoding):
+    """True if an Accept-Encoding header value allows gzip (q > 0)"""
+    weights = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.partition(';')
+        weight = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if name.strip():
+            weights[name.strip().lower()] = weight
+    return weights.get('gzip', weights.get('x-gzip', weights.get('*', 0.0))) > 0
+
+
+def gzip_chunks(chunks, level=GZIP_LEVEL):
+    """gzip a chunk stream, flushing after every chunk so nothing waits for the end"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,201 @@
+"""
+Faraday Shield Analyser - Sweep groups
+Repeated sweeps of the same setup folded into running statistics. Each
+group keeps, per (series, frequency), a count, mean, sum of squared
+deviations (Welford), min and max; raw repeats are never stored, so a
+group's size depends only on its frequency grid and series.
+"""
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from columnar import ColumnarExperiment, load_header
+from experiment_store import atomic_write
+from locking import InterProcessLock
+
+SWEEP_DIR_NAME = 'sweep_groups'
+GROUP_SUFFIX = '.grp'
+FREQUENCY_COLUMN = 'Frequency (MHz)'
+STATS = ('count', 'mean', 'm2', 'min', 'max')
+
+
+class SweepGroup:
+    """Streaming mean/variance/min/max of repeated sweeps on a fixed frequency grid"""
+
+    def __init__(self, meta, freqs=None, series=(), arrays=None):
+        self.meta = dict(meta)
+        self.freqs = np.empty(0) if freqs is None else np.asarray(freqs, dtype=np.float64)
+        self.series = list(series)
+        shape = (len(self.series), len(self.freqs))
+        arrays = arrays or {}
+        self.count = arrays.get('count', np.zeros(shape))
+        self.mean = arrays.get('mean', np.zeros(shape))
+        self.m2 = arrays.get('m2', np.zeros(shape))
+        self.min = arrays.get('min', np.full(shape, np.nan))
+        self.max = arrays.get('max', np.full(shape, np.nan))
+
+    @property
+    def sweeps(self):
+        return self.meta.get('sweeps', 0)
+
+    def _add_series(self, names):
+        """Start accumulators for series first seen in a later sweep"""
+        extra = len(names)
+        points = len(self.freqs)
+        self.series += names
+        self.count = np.vstack([self.count, np.zeros((extra, points))])
+        self.mean = np.vstack([self.mean, np.zeros((extra, points))])
+        self.m2 = np.vstack([self.m2, np.zeros((extra, points))])
+        self.min = np.vstack([self.min, np.full((extra, points), np.nan)])
+        self.max = np.vstack([self.max, np.full((extra, points), np.nan)])
+
+    def _sweep_block(self, experiment):
+        """The sweep's series as a (series, points) block on this group's grid"""
+        freq_col = experiment.frequency_column
+        if freq_col is None:
+            raise ValueError('The sweep has no frequency column')
+        freqs = experiment.column(freq_col)
+        names = [c for c in experiment.columns if c != freq_col]
+
+        if not len(self.freqs):
+            # The first sweep defines the grid
+            self.freqs = freqs.copy()
+            self.series = []
+            empty = np.empty((0, len(self.freqs)))
+            self.count, self.mean, self.m2, self.min, self.max = (empty.copy() for _ in STATS)
+            self._add_series(names)
+        else:
+            new = [n for n in names if n not in self.series]
+            if new:
+                self._add_series(new)
+
+        same_grid = len(freqs) == len(self.freqs) and np.allclose(freqs, self.freqs, equal_nan=True)
+        order = np.argsort(freqs)
+        block = np.full((len(self.series), len(self.freqs)), np.nan)
+        for name in names:
+            values = experiment.column(name)
+            if not same_grid:
+                values = np.interp(self.freqs, freqs[order], values[order],
+                                   left=np.nan, right=np.nan)
+            block[self.series.index(name)] = values
+        return block
+
+    def add(self, experiment):
+        """Fold one sweep (a ColumnarExperiment) into the running statistics, O(points)"""
+        x = self._sweep_block(experiment)
+        valid = ~np.isnan(x)
+        self.count += valid
+        delta = np.where(valid, x - self.mean, 0.0)
+        self.mean += np.where(valid, delta / np.maximum(self.count, 1), 0.0)
+        self.m2 += np.where(valid, delta * (np.where(valid, x, 0.0) - self.mean), 0.0)
+        self.min = np.fmin(self.min, x)
+        self.max = np.fmax(self.max, x)
+        self.meta['sweeps'] = self.sweeps + 1
+        self.meta['updated_at'] = datetime.now().isoformat()
+
+    def std(self):
+        """Sample standard deviation; NaN where fewer than two sweeps contributed"""
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.count > 1, np.sqrt(self.m2 / (self.count - 1)), np.nan)
+
+    def envelope(self, k=2.0):
+        """Per series mean, std, mean +/- k*std, min, max and count on the grid"""
+        std = self.std()
+        mean = np.where(self.count > 0, self.mean, np.nan)
+        return {
+            name: {
+                'mean': mean[i],
+                'std': std[i],
+                'lower': mean[i] - k * std[i],
+                'upper': mean[i] + k * std[i],
+                'min': self.min[i],
+                'max': self.max[i],
+                'count': self.count[i],
+            }
+            for i, name in enumerate(self.series)
+        }
+
+    def info(self):
+        return dict(self.meta, points=len(self.freqs), series=list(self.series))
+
+    def to_columnar(self):
+        columns = [FREQUENCY_COLUMN]
+        blocks = [self.freqs[np.newaxis, :]]
+        for stat in STATS:
+            columns += [f'{stat}:{name}' for name in self.series]
+            blocks.append(getattr(self, stat))
+        meta = dict(self.meta, series=self.series)
+        return ColumnarExperiment(columns, np.vstack(blocks), meta)
+
+    @classmethod
+    def from_columnar(cls, columnar):
+        meta = dict(columnar.meta)
+        series = meta.pop('series', [])
+        arrays = {
+            stat: np.vstack([columnar.column(f'{stat}:{name}') for name in series])
+            if series else np.empty((0, columnar.n_rows))
+            for stat in STATS
+        }
+        return cls(meta, columnar.column(FREQUENCY_COLUMN).copy(), series, arrays)
+
+
+class SweepGroupStore:
+    """One file per group under <data_dir>/sweep_groups"""
+
+    def __init__(self, data_dir):
+        self.group_dir = Path(data_dir) / SWEEP_DIR_NAME
+        os.makedirs(self.group_dir, exist_ok=True)
+        self._lock = InterProcessLock(self.group_dir / '.lock')
+
+    def _path(self, group_id):
+        return self.group_dir / f'{group_id}{GROUP_SUFFIX}'
+
+    def _save(self, group):
+        atomic_write(self._path(group.meta['id']), group.to_columnar().to_bytes())
+
+    def list_groups(self):
+        """Group summaries, read from file headers only"""
+        groups = []
+        for path in sorted(self.group_dir.glob(f'*{GROUP_SUFFIX}')):
+            header = load_header(path)
+            groups.append(dict(header['meta'], points=header['n_rows']))
+        return sorted(groups, key=lambda g: g.get('created_at') or '')
+
+    def get(self, group_id):
+        path = self._path(group_id)
+        if not path.exists():
+            return None
+        return SweepGroup.from_columnar(ColumnarExperiment.load(path))
+
+    def create(self, name, created_by=None):
+        group = SweepGroup({
+            'id': str(uuid.uuid4()),
+            'name': name,
+            'created_by': created_by,
+            'created_at': datetime.now().isoformat(),
+            'sweeps': 0,
+        })
+        with self._lock:
+            self._save(group)
+        return group
+
+    def add_sweep(self, group_id, experiment):
+        """Fold a sweep into a group; returns the updated group or None"""
+        with self._lock:
+            group = self.get(group_id)
+            if group is None:
+                return None
+            group.add(experiment)
+            self._save(group)
+        return group
+
+    def delete(self, group_id):
+        with self._lock:
+            try:
+                os.remove(self._path(group_id))
+            except FileNotFoundError:
+                return False
+        return True
@@ -0,0 +1,41 @@
+import importlib
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+AUTH = ('admin', 'admin123')
+
+
+@pytest.fixture(scope='session')
+def server(tmp_path_factory):
+    """The FastAPI module, on a data directory of its own"""
+    data_dir = tmp_path_factory.mktemp('server')
+    (data_dir / 'creds.json').write_text(json.dumps({AUTH[0]: AUTH[1]}))
+    os.environ['SHIELD_ANALYSER_DATA_DIR'] = str(data_dir)
+    return importlib.import_module('server')
+
+
+@pytest.fixture
+def client(server):
+    from fastapi.testclient import TestClient
+    with TestClient(server.app) as client:
+        client.auth = AUTH
+        yield client
+
+
+@pytest.fixture
+def create(client):
+    """create(columns, rows) -> the new experiment's entry"""
+    def create(columns, rows, name='test'):
+        response = client.post('/api/experiments/create', json={
+            'name': name, 'columns': columns,
+            'data': [dict(zip(columns, row)) for row in rows],
+        })
+        assert response.status_code == 200, response.text
+        return response.json()['experiment']
+    return create
@@ -0,0 +1,31 @@
+import numpy as np
+
+import anomalies
+from anomalies import rolling_median
+
+
+def reference_median(block, window):
+    half = window // 2
+    padded = np.pad(block, ((0, 0), (half, half)), constant_values=np.nan)
+    out = np.full(block.shape, np.nan)
+    for r in range(block.shape[0]):
+        for c in range(block.shape[1]):
+            values = padded[r, c:c + window]
+            if not np.isnan(values).all():
+                out[r, c] = np.nanmedian(values)
+    return out
+
+
+def test_rolling_median_in_chunks_matches_whole_windows(monkeypatch):
+    rng = np.random.default_rng(0)
+    block = rng.normal(size=(3, 40))
+    block[0, 5:30] = np.nan
+    block[2, ::4] = np.nan
+    expected = reference_median(block, 7)
+    assert np.allclose(rolling_median(block, 7), expected, equal_nan=True)
+
+    # A chunk of a single position per location
+    monkeypatch.setattr(anomalies, 'ROLLING_CHUNK_CELLS', 1)
+    assert np.allclose(rolling_median(block, 7), expected, equal_nan=True)
+    monkeypatch.setattr(anomalies, 'ROLLING_CHUNK_CELLS', 3 * 7 * 6)
+    assert np.allclose(rolling_median(block, 7), expected, equal_nan=True)
@@ -0,0 +1,98 @@
+import pytest
+
+from calibration import CalibrationStore, CalibrationTable, apply_calibration, table_names
+from columnar import ColumnarExperiment
+from derived import DependencyGraph
+from experiment_store import open_store
+from import_cache import ImportCache
+
+COLUMNS = ['Frequency', 'Reference', 'L1', 'L1-Shielding']
+
+
+@pytest.fixture
+def calibrations(tmp_path):
+    calibrations = CalibrationStore(tmp_path)
+    calibrations.save(CalibrationTable('gain', [(1.0, 10.0), (1000.0, 10.0)]))
+    # 0 dB at 1 MHz rising to 20 dB at 100 MHz, so 10 dB at 10 MHz
+    calibrations.save(CalibrationTable('slope', [(1.0, 0.0), (100.0, 20.0)]))
+    return calibrations
+
+
+def experiment():
+    return ColumnarExperiment.from_rows(
+        [dict(zip(COLUMNS, row)) for row in [[1.0, 0.0, -50.0, 50.0], [10.0, 0.0, -40.0, 40.0]]],
+        COLUMNS,
+    )
+
+
+def test_calibration_keeps_raw_values(calibrations):
+    exp = experiment()
+    assert apply_calibration(exp, {'L1': ['gain']}, calibrations) == ['L1']
+    assert exp.columns == ['Frequency', 'Reference', 'L1', 'L1-Raw', 'L1-Shielding']
+    assert exp.column('L1-Raw').tolist() == [-50.0, -40.0]
+    assert exp.column('L1').tolist() == [-40.0, -30.0]
+    assert exp.column('L1-Shielding').tolist() == [40.0, 30.0]
+
+    calibrations.save(CalibrationTable('gain', [(1.0, 5.0), (1000.0, 5.0)]))
+    assert apply_calibration(exp, {'L1': ['gain']}, calibrations) == ['L1']
+    assert exp.column('L1-Raw').tolist() == [-50.0, -40.0]
+    assert exp.column('L1').tolist() == [-45.0, -35.0]
+
+    assert apply_calibration(exp, {'L1': []}, calibrations) == ['L1']
+    assert exp.columns == COLUMNS
+    assert exp.column('L1').tolist() == [-50.0, -40.0]
+    assert exp.meta['calibration'] == {}
+
+
+def test_frequency_edit_rederives_correction(calibrations):
+    exp = experiment()
+    apply_calibration(exp, {'L1': ['slope']}, calibrations)
+    assert exp.column('L1').tolist() == [-50.0, -30.0]
+
+    exp.set_cells([[0, 'Frequency', 10.0]])
+    DependencyGraph.for_experiment(exp).recompute(exp, {'Frequency': [0]})
+    assert exp.column('L1').tolist() == [-40.0, -30.0]
+    assert exp.column('L1-Shielding').tolist() == [40.0, 30.0]
+
+
+def test_legacy_calibration_recovers_raw_values(calibrations):
+    """Columns corrected in place before raw values were kept"""
+    exp = experiment()
+    exp.column('L1')[:] += 10.0
+    exp.meta['calibration'] = {
+        'L1': [{'table': 'gain', 'revision': calibrations.get('gain').revision}]
+    }
+    assert apply_calibration(exp, {'L1': ['slope']}, calibrations) == ['L1']
+    assert exp.column('L1-Raw').tolist() == [-50.0, -40.0]
+    assert exp.column('L1').tolist() == [-50.0, -30.0]
+
+
+def test_link_uses_the_source_tables(tmp_path, calibrations):
+    store = open_store(tmp_path)
+    exp = experiment()
+    apply_calibration(exp, {'L1': ['gain']}, calibrations)
+    source = store.create_experiment(exp, name='source')
+    calibrations.set_usage(source['id'], table_names(exp))
+
+    link = ImportCache(store, tmp_path).link(source['id'], name='copy')
+    assert sorted(calibrations.used_by('gain')) == sorted([source['id'], link['id']])
+    assert calibrations.used_by('slope') == []
+
+
+def test_patch_raw_cell_rederives_calibrated_column(server, client, create):
+    server.calibrations.save(CalibrationTable('test-gain', [(1.0, 10.0), (1000.0, 10.0)]))
+    entry = create(COLUMNS, [[1.0, 0.0, -50.0, None], [10.0, 0.0, -40.0, None]])
+    response = client.put(f"/api/experiments/{entry['id']}/calibration",
+                          json={'columns': {'L1': ['test-gain']}})
+    assert response.status_code == 200, response.text
+
+    response = client.patch(f"/api/experiments/{entry['id']}", json={
+        'base_version': response.json()['version'],
+        'ops': [{'op': 'set_cells', 'cells': [[0, 'L1-Raw', -60.0], [1, 'L1', 0.0]]}],
+    })
+    assert response.status_code == 200, response.text
+    assert sorted(response.json()['cells']) == [[0, 'L1', -50.0], [0, 'L1-Shielding', 50.0]]
+    rows = client.get(f"/api/experiments/{entry['id']}").json()['data']
+    assert [(r['L1-Raw'], r['L1'], r['L1-Shielding']) for r in rows] == [
+        (-60.0, -50.0, 50.0), (-40.0, -30.0, 30.0)
+    ]
@@ -0,0 +1,103 @@
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from columnar import ColumnarExperiment
+from experiment_store import JOURNAL_NAME, ExperimentStore, open_store
+
+
+def experiment(rows=3):
+    freqs = np.arange(1.0, rows + 1)
+    return ColumnarExperiment(
+        ['Frequency', 'Reference', 'L1', 'L1 - Shielding'],
+        np.vstack([freqs, np.zeros(rows), -freqs, np.zeros(rows)]),
+    )
+
+
+@pytest.fixture(params=['files', 'sqlite'])
+def store(request, tmp_path):
+    return open_store(tmp_path, backend=request.param)
+
+
+def test_create_and_save_normalize(store):
+    entry = store.create_experiment(experiment(), name='e')
+    loaded = store.load(entry['id'])
+    assert loaded.columns == ['Frequency', 'Reference', 'L1', 'L1-Shielding']
+    assert loaded.column('L1-Shielding').tolist() == [1.0, 2.0, 3.0]
+
+    replacement = experiment()
+    replacement.column('L1')[:] = -10.0
+    store.save_experiment(entry['id'], replacement)
+    assert store.load(entry['id']).column('L1-Shielding').tolist() == [10.0, 10.0, 10.0]
+
+
+def test_replay_drops_a_torn_final_journal_line(tmp_path):
+    store = ExperimentStore(tmp_path)
+    entry = store.create_experiment(experiment(), name='e')
+    store.apply(entry['id'], 'set_cells', cells=[[0, 'L1', -10.0]])
+    with open(tmp_path / JOURNAL_NAME, 'ab') as f:
+        f.write(b'{"op":"set_cells","id":"' + entry['id'].encode() + b'","args":{"cel')
+
+    reopened = ExperimentStore(tmp_path)
+    assert reopened.load(entry['id']).column('L1').tolist() == [-10.0, -2.0, -3.0]
+    reopened.apply(entry['id'], 'set_cells', cells=[[1, 'L1', -20.0]])
+    assert ExperimentStore(tmp_path).load(entry['id']).column('L1').tolist() == [-10.0, -20.0, -3.0]
+
+
+def test_compaction_survives_reopen(tmp_path):
+    store = ExperimentStore(tmp_path)
+    entry = store.create_experiment(experiment(), name='e')
+    store.apply(entry['id'], 'set_cells', cells=[[0, 'L1', -10.0]])
+    store.apply(entry['id'], 'add_row', values={'Frequency': 4.0, 'L1': -4.0})
+    store.compact()
+    assert (tmp_path / JOURNAL_NAME).stat().st_size == 0
+
+    reopened = ExperimentStore(tmp_path)
+    loaded = reopened.load(entry['id'])
+    assert loaded.meta['version'] == 3
+    assert loaded.column('L1').tolist() == [-10.0, -2.0, -3.0, -4.0]
+    reopened.apply(entry['id'], 'delete_row', index=0)
+    assert ExperimentStore(tmp_path).load(entry['id']).column('L1').tolist() == [-2.0, -3.0, -4.0]
+
+
+def append_rows(data_dir, backend, experiment_id, start, count):
+    store = open_store(data_dir, backend=backend)
+    for i in range(start, start + count):
+        store.apply(experiment_id, 'add_row', values={'Frequency': float(i)})
+
+
+@pytest.mark.parametrize('backend', ['files', 'sqlite'])
+def test_concurrent_apply_from_two_processes(tmp_path, backend):
+    entry = open_store(tmp_path, backend=backend).create_experiment(experiment(0), name='e')
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=append_rows, args=(tmp_path, backend, entry['id'], start, 25))
+               for start in (100, 200)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=120)
+        assert worker.exitcode == 0
+
+    loaded = open_store(tmp_path, backend=backend).load(entry['id'])
+    assert loaded.meta['version'] == 51
+    assert sorted(loaded.column('Frequency').tolist()) == [float(i) for i in range(100, 125)] + \
+        [float(i) for i in range(200, 225)]
+
+
+def test_apply_many_tracks_rows_across_a_batch(store):
+    entry = store.create_experiment(experiment(), name='e')
+    entry = store.apply_many(entry['id'], [
+        {'op': 'add_row', 'args': {'values': {'Frequency': 4.0, 'L1': -4.0}}},
+        {'op': 'add_column', 'args': {'column': 'L2'}},
+        {'op': 'set_cells', 'args': {'cells': [[3, 'L2', -8.0], [0, 'Frequency', 0.5]]}},
+        {'op': 'delete_row', 'args': {'index': 1}},
+    ])
+    assert (entry['version'], entry['rows']) == (2, 3)
+    loaded = store.load(entry['id'])
+    assert loaded.column('Frequency').tolist() == [0.5, 3.0, 4.0]
+    assert loaded.column('L2').tolist() == [0.0, 0.0, -8.0]
+    assert store.list_experiments()[0]['freq_min'] == 0.5
+
+    entry = store.apply(entry['id'], 'set_cells', cells=[[0, 'L1', -1.5]])
+    assert (entry['version'], entry['rows']) == (3, 3)
@@ -0,0 +1,41 @@
+from experiment_store import open_store
+from import_jobs import ImportJobQueue, JobBoard
+
+
+def sweep(tmp_path):
+    path = tmp_path / 'sweep.csv'
+    path.write_text('Frequency,Reference,L1\n1,-10,-40\n2,-10,-45\n')
+    return path
+
+
+def run_import(tmp_path, **kwargs):
+    queue = ImportJobQueue(open_store(tmp_path / 'store'), workers=1, **kwargs)
+    job = queue.submit(sweep(tmp_path))
+    queue.shutdown(wait=True)
+    return queue.get(job['id'])
+
+
+def test_failing_on_done_leaves_the_import_done(tmp_path):
+    def on_done(entry):
+        raise RuntimeError('listener broke')
+
+    job = run_import(tmp_path, on_done=on_done)
+    assert (job['status'], job['error']) == ('done', None)
+    assert job['experiment_id'] is not None
+
+
+def test_board_is_written_outside_the_queue_lock(tmp_path):
+    held = []
+
+    class Board(JobBoard):
+        def publish(self, job, force=False):
+            held.append(queue_lock.locked())
+            super().publish(job, force)
+
+    board = Board(tmp_path / 'jobs')
+    queue = ImportJobQueue(open_store(tmp_path / 'store'), workers=1, board=board)
+    queue_lock = queue._lock
+    job = queue.submit(sweep(tmp_path))
+    queue.shutdown(wait=True)
+    assert board.get(job['id'])['status'] == 'done'
+    assert held and not any(held)
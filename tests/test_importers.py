@@ -0,0 +1,35 @@
+import numpy as np
+
+import importers
+from importers import readable_suffixes, unsupported_reason
+from trace_import import read_csv
+
+
+def test_workbooks_need_openpyxl(monkeypatch):
+    monkeypatch.setattr(importers, 'EXCEL_SUPPORT', False)
+    assert '.xlsx' not in readable_suffixes()
+    assert 'openpyxl' in unsupported_reason('sweep.XLSX')
+    assert unsupported_reason('sweep.csv') is None
+    assert unsupported_reason('sweep.s2p') is None
+
+    monkeypatch.setattr(importers, 'EXCEL_SUPPORT', True)
+    assert unsupported_reason('sweep.xlsx') is None
+    assert unsupported_reason('sweep.txt') == 'Unsupported file type: .txt'
+
+
+def test_csv_blank_and_quoted_fields(tmp_path):
+    path = tmp_path / 'sweep.csv'
+    path.write_text('Instrument,"Analyser, model 2"\n'
+                    'Frequency (MHz),Ref,L1,L2\n'
+                    '1,-10,,-30\n'
+                    '"2","-10","-40",-35\n'
+                    '\n'
+                    '3,-10,-50\n')
+    experiment = read_csv(path)
+    assert experiment.column('Frequency (MHz)').tolist() == [1.0, 2.0, 3.0]
+    assert experiment.column('Reference').tolist() == [-10.0, -10.0, -10.0]
+    assert np.isnan(experiment.column('L1')[0])
+    assert experiment.column('L1')[1:].tolist() == [-40.0, -50.0]
+    assert experiment.column('L2')[:2].tolist() == [-30.0, -35.0]
+    assert np.isnan(experiment.column('L2')[2])
+    assert experiment.column('L2-Shielding')[:2].tolist() == [20.0, 25.0]
@@ -0,0 +1,56 @@
+import numpy as np
+
+from result_cache import ResultCache, result_size
+
+
+def put(cache, experiment_id, value, kind='xlsx'):
+    return cache.get(experiment_id, 1, kind, (), lambda: value)
+
+
+def test_result_size():
+    assert result_size(b'x' * 1000) == 1000
+    assert result_size(np.zeros(1000)) == 8000
+    assert result_size({'a': np.zeros(1000), 'b': [np.zeros(10)]}) > 8080
+
+
+def cached_ids(cache):
+    return sorted(key[0] for key in cache._entries)
+
+
+def test_evicts_least_recent_against_byte_budget():
+    cache = ResultCache(max_entries=100, max_bytes=2500)
+    for name in ('a', 'b'):
+        put(cache, name, b'x' * 1000)
+    put(cache, 'a', None)  # a hit, which makes 'b' the least recent
+    put(cache, 'c', b'x' * 1000)
+    assert cached_ids(cache) == ['a', 'c']
+    assert cache.bytes == 2000
+    assert cache.evictions == 1
+    assert cache.stats()['bytes'] == 2000
+
+
+def test_oversized_result_is_returned_but_not_kept():
+    cache = ResultCache(max_bytes=1000)
+    put(cache, 'small', b'x' * 100)
+    assert put(cache, 'big', b'x' * 5000) == b'x' * 5000
+    assert cache.stats()['entries'] == 1
+    assert cache.bytes == 100
+
+
+def test_entry_count_still_bounds():
+    cache = ResultCache(max_entries=2, max_bytes=10 ** 9)
+    for name in 'abc':
+        put(cache, name, b'x')
+    assert cache.stats()['entries'] == 2
+    assert cache.evictions == 1
+
+
+def test_invalidate_and_clear_release_bytes():
+    cache = ResultCache(max_bytes=10 ** 6)
+    put(cache, 'a', np.zeros(100))
+    put(cache, 'a', np.zeros(100), kind='chart')
+    put(cache, 'b', np.zeros(100))
+    cache.invalidate('a')
+    assert cache.bytes == 800
+    cache.clear()
+    assert cache.bytes == 0
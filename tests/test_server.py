@@ -0,0 +1,105 @@
+import zipfile
+
+
+def rows_of(client, experiment_id):
+    return client.get(f'/api/experiments/{experiment_id}').json()['data']
+
+
+def test_create_computes_shielding(client, create):
+    entry = create(['Frequency', 'Reference', 'L1', 'L1-Shielding'],
+                   [[f, 0.0, -f, 0.0] for f in (1.0, 2.0, 3.0)])
+    assert [r['L1-Shielding'] for r in rows_of(client, entry['id'])] == [1.0, 2.0, 3.0]
+
+
+def test_create_renames_legacy_shielding(client, create):
+    entry = create(['Frequency', 'Reference', 'L1', 'L1 - Shielding'], [[1.0, -10.0, -40.0, None]])
+    experiment = client.get(f"/api/experiments/{entry['id']}").json()
+    assert experiment['columns'] == ['Frequency', 'Reference', 'L1', 'L1-Shielding']
+    assert experiment['data'][0]['L1-Shielding'] == 30.0
+
+
+def test_replace_renames_legacy_shielding(client, create):
+    entry = create(['Frequency', 'Reference', 'L1'], [[1.0, -10.0, -40.0]])
+    response = client.put(f"/api/experiments/{entry['id']}", json={
+        'columns': ['Frequency', 'Reference', 'L1', 'L1 - Shielding'],
+        'data': [{'Frequency': 1.0, 'Reference': -10.0, 'L1': -50.0, 'L1 - Shielding': 0.0}],
+    })
+    assert response.status_code == 200, response.text
+    assert rows_of(client, entry['id']) == [
+        {'Frequency': 1.0, 'Reference': -10.0, 'L1': -50.0, 'L1-Shielding': 40.0}
+    ]
+
+
+def corrupt_shielding(server, experiment_id, n_rows):
+    """Store wrong derived values, as experiments saved before normalization have"""
+    server.store.apply(experiment_id, 'set_cells', cells=[[r, 'L1-Shielding', 0.0] for r in range(n_rows)])
+
+
+def test_patch_repairs_every_derived_row(server, client, create):
+    entry = create(['Frequency', 'Reference', 'L1', 'L1-Shielding'],
+                   [[f, 0.0, -f, None] for f in (1.0, 2.0, 3.0)])
+    corrupt_shielding(server, entry['id'], 3)
+    version = server.store.get_entry(entry['id'])['version']
+    response = client.patch(f"/api/experiments/{entry['id']}", json={
+        'base_version': version, 'ops': [{'op': 'set_cells', 'cells': [[0, 'L1', -10.0]]}],
+    })
+    assert response.status_code == 200, response.text
+    assert sorted(response.json()['cells']) == [
+        [0, 'L1-Shielding', 10.0], [1, 'L1-Shielding', 2.0], [2, 'L1-Shielding', 3.0]
+    ]
+    assert [r['L1-Shielding'] for r in rows_of(client, entry['id'])] == [10.0, 2.0, 3.0]
+
+
+def test_replace_repairs_every_derived_row(server, client, create):
+    entry = create(['Frequency', 'Reference', 'L1', 'L1-Shielding'],
+                   [[f, 0.0, -f, None] for f in (1.0, 2.0)])
+    corrupt_shielding(server, entry['id'], 2)
+    data = rows_of(client, entry['id'])
+    data[0]['L1'] = -5.0
+    response = client.put(f"/api/experiments/{entry['id']}", json={
+        'columns': ['Frequency', 'Reference', 'L1', 'L1-Shielding'], 'data': data,
+    })
+    assert response.status_code == 200, response.text
+    assert [r['L1-Shielding'] for r in rows_of(client, entry['id'])] == [5.0, 2.0]
+
+
+def test_patch_cells_use_final_row_indexes(server, client, create):
+    entry = create(['Frequency', 'Reference', 'L1', 'L1-Shielding'],
+                   [[float(f), 0.0, -1.0, None] for f in range(1, 7)])
+    response = client.patch(f"/api/experiments/{entry['id']}", json={
+        'base_version': entry['version'], 'ops': [
+            {'op': 'set_cells', 'cells': [[5, 'L1', -100.0]]},
+            {'op': 'delete_row', 'index': 0},
+            {'op': 'add_row', 'index': 0, 'values': {'Frequency': 0.5, 'Reference': 0.0, 'L1': -7.0}},
+            {'op': 'set_cells', 'cells': [[2, 'L1', -20.0]]},
+            {'op': 'delete_row', 'index': 1},
+        ],
+    })
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result['version'] == entry['version'] + 1
+    rows = rows_of(client, entry['id'])
+    assert [r['Frequency'] for r in rows] == [0.5, 3.0, 4.0, 5.0, 6.0]
+    for row, col, value in result['cells']:
+        assert rows[row][col] == value
+    assert sorted(result['cells']) == [
+        [0, 'L1-Shielding', 7.0], [1, 'L1-Shielding', 20.0], [4, 'L1-Shielding', 100.0]
+    ]
+
+
+def test_upload_names_experiment_after_file_stem(client, tmp_path):
+    csv = tmp_path / 'stem_check.csv'
+    csv.write_text('Frequency (MHz),Reference,Loc A\n1,-10,-40\n2,-10,-45\n')
+    with open(csv, 'rb') as f:
+        first = client.post('/api/upload', files={'file': ('stem_check.csv', f)}).json()
+    assert first['experiment']['name'] == 'stem_check'
+
+    archive = tmp_path / 'batch.zip'
+    with zipfile.ZipFile(archive, 'w') as z:
+        z.write(csv, 'stem_check.csv')
+    with open(archive, 'rb') as f:
+        report = client.post('/api/bulk-import', files={'file': ('batch.zip', f)}).json()
+    # Same bytes under the same name: the existing experiment, not a link
+    assert [(i['experiment_id'], i['cached']) for i in report['imported']] == [
+        (first['experiment']['id'], True)
+    ]
@@ -0,0 +1,191 @@
+"""
+Faraday Shield Analyser - Analyzer trace import
+Streaming parsers for Touchstone (.s1p/.s2p) and CSV exports from VNAs and
+spectrum analysers. Text is parsed in fixed-size line chunks straight into
+float64 arrays, so no intermediate Excel round trip is needed.
+"""
+import csv
+from pathlib import Path
+
+import numpy as np
+
+from columnar import ColumnarExperiment, is_frequency_column, is_reference_column
+from shielding import with_shielding
+
+FREQUENCY_COLUMN = 'Frequency (MHz)'
+REFERENCE_COLUMN = 'Reference'
+CHUNK_LINES = 8192
+
+# Multiplier taking each unit to MHz
+FREQ_UNITS = {'hz': 1e-6, 'khz': 1e-3, 'mhz': 1.0, 'ghz': 1e3}
+
+
+def _loadtxt(chunk, width):
+    return np.loadtxt(chunk, ndmin=2, usecols=range(width))
+
+
+def _parse_chunks(lines, width, progress=None, parse=_loadtxt):
+    """Parse numeric lines into a (rows, width) array, CHUNK_LINES at a time
+
+    Lines are whitespace separated text by default; parse(chunk, width)
+    converts a chunk of anything else.
+    """
+    blocks, chunk, done = [], [], 0
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) == CHUNK_LINES:
+            blocks.append(parse(chunk, width))
+            done += len(chunk)
+            chunk = []
+            if progress:
+                progress(done)
+    if chunk:
+        blocks.append(parse(chunk, width))
+        done += len(chunk)
+    if progress:
+        progress(done)
+    return np.concatenate(blocks) if blocks else np.empty((0, width))
+
+
+def _magnitude_db(a, b, fmt):
+    """Convert a Touchstone value pair to dB magnitude"""
+    if fmt == 'db':
+        return a
+    if fmt == 'ri':
+        a = np.hypot(a, b)
+    with np.errstate(divide='ignore'):
+        return 20 * np.log10(a)
+
+
+def read_touchstone(path, progress=None):
+    """Return (frequency_mhz, magnitude_db) for S21 (.s2p) or S11 (.s1p)"""
+    path = Path(path)
+    ports = 2 if path.suffix.lower() == '.s2p' else 1
+    unit, fmt = 'ghz', 'ma'
+
+    def data_lines(f):
+        nonlocal unit, fmt
+        for line in f:
+            line = line.split('!', 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith('#'):
+                for token in line[1:].lower().split():
+                    if token in FREQ_UNITS:
+                        unit = token
+                    elif token in ('db', 'ma', 'ri'):
+                        fmt = token
+                continue
+            if line.startswith('['):
+                # Touchstone 2.0 keyword lines
+                continue
+            yield line
+
+    width = 1 + 2 * ports * ports
+    with open(path, encoding='utf-8', errors='replace') as f:
+        data = _parse_chunks(data_lines(f), width, progress)
+
+    freqs = data[:, 0] * FREQ_UNITS[unit]
+    # .s2p column order is S11, S21, S12, S22; S21 is the transmission through the shield
+    pair = 3 if ports == 2 else 1
+    return freqs, _magnitude_db(data[:, pair], data[:, pair + 1], fmt)
+
+
+def _header_unit(name):
+    lowered = name.lower().replace('[', '(').replace(']', ')')
+    for unit in ('ghz', 'mhz', 'khz', 'hz'):
+        if f'({unit})' in lowered or lowered.endswith(unit):
+            return unit
+    return None
+
+
+def _csv_rows(reader, width):
+    """Data rows as width fields each; blank fields (and missing trailing ones) are NaN"""
+    for fields in reader:
+        fields = [v.strip() for v in fields[:width]]
+        if not any(fields):
+            continue
+        yield [v or 'nan' for v in fields] + ['nan'] * (width - len(fields))
+
+
+def _parse_csv(chunk, width):
+    try:
+        return np.loadtxt(chunk, delimiter=',', quotechar='"', ndmin=2, usecols=range(width))
+    except ValueError:
+        # Blank or missing fields: the csv module path reads them as NaN
+        rows = list(_csv_rows(csv.reader(chunk), width))
+        return np.array(rows, dtype=str).astype(np.float64).reshape(-1, width)
+
+
+def read_csv(path, freq_unit=None, progress=None):
+    """Stream an analyser CSV export into a ColumnarExperiment
+
+    The header row is the first line whose first field names a frequency
+    column; any preamble before it is skipped. A column containing "ref"
+    becomes Reference, the remaining trace columns become locations. The
+    frequency unit comes from the header (e.g. "Frequency (Hz)"), then
+    freq_unit, then defaults to Hz as most analysers export it. Fields may
+    be quoted; blank fields are read as NaN.
+    """
+    with open(path, newline='', encoding='utf-8-sig', errors='replace') as f:
+        header = None
+        for line in f:
+            fields = next(csv.reader([line]))
+            if fields and is_frequency_column(fields[0]):
+                header = [h.strip() for h in fields]
+                break
+        if header is None:
+            raise ValueError('No header row with a frequency column found')
+
+        while header and not header[-1]:
+            header.pop()
+        lines = (line for line in f if line.strip())
+        data = _parse_chunks(lines, len(header), progress, parse=_parse_csv)
+
+    unit = _header_unit(header[0]) or (freq_unit or 'hz').lower()
+    arrays = {FREQUENCY_COLUMN: data[:, 0] * FREQ_UNITS[unit]}
+    for i, name in enumerate(header[1:], start=1):
+        if is_reference_column(name) and REFERENCE_COLUMN not in arrays:
+            arrays[REFERENCE_COLUMN] = data[:, i]
+        else:
+            arrays[name or f'Trace {i}'] = data[:, i]
+    columns, matrix = with_shielding(list(arrays), np.array(list(arrays.values())))
+    return ColumnarExperiment(columns, matrix)
+
+
+def read_trace(path, progress=None):
+    """Return (frequency_mhz, dB) for a single-trace Touchstone or CSV file"""
+    if Path(path).suffix.lower() in ('.s1p', '.s2p'):
+        return read_touchstone(path, progress)
+    experiment = read_csv(path, progress=progress)
+    traces = [c for c in experiment.columns if c != FREQUENCY_COLUMN]
+    return experiment.column(FREQUENCY_COLUMN), experiment.column(traces[0])
+
+
+def read_trace_set(paths, reference=None, names=None):
+    """Combine one trace per file into an experiment
+
+    The file named reference (or the first whose name contains "ref") is the
+    Reference trace; every other file becomes a location column named after
+    its file stem. Traces on a different frequency grid are interpolated
+    onto the reference grid.
+    """
+    paths = [Path(p) for p in paths]
+    names = names or [p.stem for p in paths]
+    if reference is None:
+        reference = next((p for p, n in zip(paths, names) if is_reference_column(n)), None)
+    if reference is None:
+        raise ValueError('No reference trace: name one file "reference" or pass reference=')
+
+    ref_freqs, ref_db = read_trace(reference)
+    arrays = {FREQUENCY_COLUMN: ref_freqs, REFERENCE_COLUMN: ref_db}
+    for path, name in zip(paths, names):
+        if path == Path(reference):
+            continue
+        freqs, values = read_trace(path)
+        if len(freqs) != len(ref_freqs) or not np.allclose(freqs, ref_freqs):
+            order = np.argsort(freqs)
+            values = np.interp(ref_freqs, freqs[order], values[order], left=np.nan, right=np.nan)
+        arrays[name] = values
+    columns, matrix = with_shielding(list(arrays), np.array(list(arrays.values())))
+    return ColumnarExperiment(columns, matrix)